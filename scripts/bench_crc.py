@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+"""
+  Copyright (c) 2018, SunSpec Alliance
+  All Rights Reserved
+
+"""
+
+"""
+  Modbus RTU CRC16 benchmark.
+
+  Reports frames per second for each available CRC implementation using the
+  response frame of a 125 register read (slave id, function code, byte count,
+  and 250 data bytes). The legacy implementation converts the frame to a str
+  one character at a time before computing the CRC as pysunspec 2.1 did.
+"""
+
+import sys
+import timeit
+from optparse import OptionParser
+
+import sunspec.core.modbus.crc as crc
+
+def legacy_crc16(data):
+    crc_value = 0xffff
+    if type(data) == bytes and sys.version_info > (3,):
+        temp = ""
+        for i in data:
+            temp += chr(i)
+        data = temp
+    for a in data:
+        idx = crc.CRC16_TABLE[(crc_value ^ ord(a)) & 0xff]
+        crc_value = ((crc_value >> 8) & 0xff) ^ idx
+    return ((crc_value << 8) & 0xff00) | ((crc_value >> 8) & 0x00ff)
+
+if __name__ == "__main__":
+
+    usage = 'usage: %prog [options]'
+    parser = OptionParser(usage=usage)
+    parser.add_option('-c', metavar=' ', type='int', default=125,
+                      help='register count [default: 125]')
+    parser.add_option('-n', metavar=' ', type='int', default=2000,
+                      help='frames per timing run [default: 2000]')
+    parser.add_option('-r', metavar=' ', type='int', default=5,
+                      help='timing runs, the best is reported [default: 5]')
+
+    options, args = parser.parse_args()
+
+    frame = bytes(bytearray([1, 3, options.c * 2]) + bytearray(i & 0xff for i in range(options.c * 2)))
+
+    funcs = [('legacy', legacy_crc16), ('python', crc.crc16_python)]
+    if crc.crc16_crcmod is not None:
+        funcs.append(('crcmod', crc.crc16_crcmod))
+
+    print('frame length: %d bytes (%d registers), default backend: %s' % (len(frame), options.c, crc.backend))
+    for name, func in funcs:
+        if func(frame) != crc.crc16_python(frame):
+            raise Exception('CRC mismatch for %s implementation' % (name))
+        best = min(timeit.repeat(lambda: func(frame), number=options.n, repeat=options.r))
+        print('%-8s %12.0f frames/s' % (name, options.n / best))
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+
+"""
+  Copyright (c) 2018, SunSpec Alliance
+  All Rights Reserved
+
+"""
+
+"""
+  Modbus map read benchmark.
+
+  Reports reads per second against Modbus maps with a given number of register
+  blocks, as used by mapped devices simulating large devices. Each read is
+  within one randomly chosen block. The legacy read scans the register blocks
+  linearly for every request as pysunspec 2.1 did, the indexed read is
+  ModbusMap.read.
+"""
+
+import random
+import timeit
+from optparse import OptionParser
+
+import sunspec.core.modbus.mbmap as mbmap
+
+def legacy_read(modbus_map, addr, count):
+    data = b''
+    count_remaining = count
+    offset = addr - int(modbus_map.base_addr)
+    for regs in modbus_map.regs:
+        if count_remaining > 0:
+            regs_end_offset = regs.offset + regs.count
+            if offset >= regs.offset and offset < regs_end_offset:
+                read_count = regs_end_offset - offset
+                if count_remaining < read_count:
+                    read_count = count_remaining
+                data += regs.read(offset, read_count)
+                offset += read_count
+                count_remaining -= read_count
+        else:
+            break
+    if len(data) != int(count) * 2:
+        raise mbmap.ModbusMapError('Data read error')
+    return data
+
+def build_map(blocks, block_len):
+    modbus_map = mbmap.ModbusMap(base_addr=0)
+    for i in range(blocks):
+        # leave a gap so each block stays separate
+        modbus_map.regs_add(offset=i * (block_len + 2), count=block_len)
+    return modbus_map
+
+if __name__ == "__main__":
+
+    usage = 'usage: %prog [options]'
+    parser = OptionParser(usage=usage)
+    parser.add_option('-b', metavar=' ', type='int', default=5000,
+                      help='largest register block count [default: 5000]')
+    parser.add_option('-l', metavar=' ', type='int', default=20,
+                      help='registers per block [default: 20]')
+    parser.add_option('-c', metavar=' ', type='int', default=10,
+                      help='registers per read [default: 10]')
+    parser.add_option('-n', metavar=' ', type='int', default=1000,
+                      help='reads per timing run [default: 1000]')
+    parser.add_option('-r', metavar=' ', type='int', default=3,
+                      help='timing runs, the best is reported [default: 3]')
+
+    options, args = parser.parse_args()
+
+    if options.c > options.l:
+        parser.error('registers per read larger than the block')
+
+    blocks_list = [blocks for blocks in (10, 100, 1000, 5000, 10000, 50000) if blocks < options.b] + [options.b]
+    rand = random.Random(1)
+
+    print('%8s %16s %16s' % ('blocks', 'legacy reads/s', 'indexed reads/s'))
+    for blocks in blocks_list:
+        modbus_map = build_map(blocks, options.l)
+        addrs = [rand.randrange(blocks) * (options.l + 2) + rand.randrange(options.l - options.c + 1)
+                 for i in range(options.n)]
+        for addr in addrs[:10]:
+            if legacy_read(modbus_map, addr, options.c) != modbus_map.read(addr, options.c):
+                raise Exception('Read mismatch at %d' % (addr))
+
+        def run_legacy():
+            for addr in addrs:
+                legacy_read(modbus_map, addr, options.c)
+
+        def run_indexed():
+            for addr in addrs:
+                modbus_map.read(addr, options.c)
+
+        legacy = min(timeit.repeat(run_legacy, number=1, repeat=options.r))
+        indexed = min(timeit.repeat(run_indexed, number=1, repeat=options.r))
+        print('%8d %16.0f %16.0f' % (blocks, options.n / legacy, options.n / indexed))
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+"""
+  Copyright (c) 2018, SunSpec Alliance
+  All Rights Reserved
+
+"""
+
+"""
+  Client device memory benchmark.
+
+  Scans a number of mapped client devices and reports the memory allocated
+  per device for the model, block, and point objects. The devices share the
+  same Modbus map so the map and the model definitions are loaded before the
+  measurement starts. Requires Python 3.4 or later for tracemalloc.
+"""
+
+import gc
+import os
+import sys
+from optparse import OptionParser
+
+import sunspec.core.client as client
+import sunspec.core.util as util
+
+if __name__ == "__main__":
+
+    usage = 'usage: %prog [options]'
+    parser = OptionParser(usage=usage)
+    parser.add_option('-m', metavar=' ', default='mbmap_test_inverter_3.xml',
+                      help='Modbus map file [default: mbmap_test_inverter_3.xml]')
+    parser.add_option('-p', metavar=' ',
+                      default=os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'sunspec', 'core', 'test',
+                                           'devices'),
+                      help='Modbus map file path [default: sunspec/core/test/devices]')
+    parser.add_option('-n', metavar=' ', type='int', default=200,
+                      help='number of devices [default: 200]')
+
+    options, args = parser.parse_args()
+
+    try:
+        import tracemalloc
+    except ImportError:
+        print('tracemalloc not available, Python 3.4 or later required')
+        sys.exit(1)
+
+    pathlist = util.PathList(['.', options.p])
+
+    def scan():
+        d = client.ClientDevice(client.MAPPED, slave_id=1, name=options.m, pathlist=pathlist)
+        d.scan()
+        d.read_points()
+        # the map is shared by all devices of a real fleet
+        d.modbus_device = None
+        return d
+
+    # load the model definitions and the map before measuring
+    d = scan()
+    points = sum(len(b.points_sf) + len(b.points_list) for m in d.models_list for b in m.blocks)
+
+    gc.collect()
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    devices = [scan() for i in range(options.n)]
+    gc.collect()
+    end = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    per_device = float(end - start) / options.n
+    print('%d devices, %d models, %d points per device' % (options.n, len(d.models_list), points))
+    print('%.0f bytes per device, %.0f bytes per point' % (per_device, per_device / points))
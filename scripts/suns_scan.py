@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+
+"""
+  Copyright (c) 2018, SunSpec Alliance
+  All Rights Reserved
+
+"""
+
+"""
+  Fleet scan.
+
+  Scans a list of SunSpec devices concurrently and prints the models found on
+  each device. Targets are given as tcp:ipaddr[:ipport[:slave_id]] or
+  rtu:port[:slave_id], on the command line or one per line in a target file.
+  Devices on the same serial port are scanned one at a time.
+"""
+
+import sys
+from optparse import OptionParser
+
+import sunspec.core.client as client
+import sunspec.core.fleet as fleet
+import sunspec.core.scancache as scancache
+
+if __name__ == "__main__":
+
+    usage = 'usage: %prog [options] target ...'
+    parser = OptionParser(usage=usage)
+    parser.add_option('-f', metavar=' ',
+                      help='target file, one target per line')
+    parser.add_option('-w', metavar=' ', type='int',
+                      default=8,
+                      help='maximum number of concurrent scans [default: 8]')
+    parser.add_option('-b', metavar=' ', type='int',
+                      default=9600,
+                      help='baud rate for modbus rtu [default: 9600]')
+    parser.add_option('-T', metavar=' ', type='float',
+                      default=2.0,
+                      help='timeout, in seconds (can be fractional, such as 1.5) [default: 2.0]')
+    parser.add_option('-c', metavar=' ',
+                      help='scan cache file')
+
+    options, args = parser.parse_args()
+
+    names = list(args)
+    if options.f:
+        with open(options.f) as f:
+            names.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+    if not names:
+        parser.error('no targets')
+
+    try:
+        targets = [fleet.parse_target(name, baudrate=options.b, timeout=options.T) for name in names]
+        cache = None
+        if options.c:
+            cache = scancache.ScanCache(options.c)
+    except client.SunSpecClientError as e:
+        print('Error: %s' % (e))
+        sys.exit(1)
+
+    results = fleet.scan(targets, workers=options.w, scan_cache=cache)
+
+    errors = 0
+    for result in results:
+        if result.ok:
+            models = ' '.join(str(model[0]) for model in result.models)
+            print('%s ok %.0f ms models: %s' % (result.target, result.elapsed * 1000, models))
+            result.device.close()
+        else:
+            errors += 1
+            print('%s error %.0f ms: %s' % (result.target, result.elapsed * 1000, result.error))
+
+    print('%d devices, %d errors' % (len(results), errors))
+    sys.exit(1 if errors else 0)
@@ -5,7 +5,10 @@
   All Rights Reserved
 
 """
-from distutils.core import setup
+try:
+    from setuptools import setup
+except ImportError:
+    from distutils.core import setup
 
 setup(name = 'pysunspec',
       version = '2.1.1',
@@ -28,7 +31,8 @@ setup(name = 'pysunspec',
       ],
       packages = ['sunspec', 'sunspec.core', 'sunspec.core.modbus', 'sunspec.core.test', 'sunspec.core.test.fake'],
       package_data = {'sunspec': ['models/smdx/*'], 'sunspec.core.test': ['devices/*']},
-      scripts = ['scripts/suns.py'],
+      scripts = ['scripts/suns.py', 'scripts/suns_scan.py'],
       python_requires='>=2.7,!=3.0.*,!=3.1.*,!=3.2.*,!=3.3.*,!=3.4.*',
       install_requires = ['pyserial'],
+      extras_require = {'crc': ['crcmod'], 'numpy': ['numpy']},
       )
@@ -0,0 +1,361 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+"""
+    Asyncio SunSpec client support for Modbus TCP devices. Requires Python 3.5
+    or later.
+
+    Many devices can be scanned and read from a single event loop:
+
+        devices = [AsyncClientDevice(slave_id=1, ipaddr=ipaddr) for ipaddr in ipaddrs]
+        await asyncio.gather(*[d.scan() for d in devices])
+        await asyncio.gather(*[d.read_points() for d in devices])
+"""
+
+import asyncio
+
+import sunspec.core.modbus.client as modbus
+import sunspec.core.modbus.aioclient as aiomodbus
+from sunspec.core.client import ClientDevice, ClientModel, SunSpecClientError, TCP, READ_OK
+
+
+class AsyncClientDevice(ClientDevice):
+    """A derived class based on :const:`sunspec.core.client.ClientDevice` that
+    accesses a Modbus TCP device using asyncio. The read, write, read_points,
+    and scan methods are coroutines.
+
+    Parameters:
+
+        slave_id :
+            Modbus slave id.
+
+        ipaddr :
+            Device IP address.
+
+        ipport :
+            Device IP port. Defaulted by modbus module to 502.
+
+        tls :
+            Use TLS (Modbus/TCP Security). Defaults to `tls=False`.
+
+        cafile :
+            Path to certificate authority (CA) certificate to use for
+            validating server certificates. Only used if `tls=True`.
+
+        certfile :
+            Path to client TLS certificate to use for client authentication.
+            Only used if `tls=True`.
+
+        keyfile :
+            Path to client TLS key to use for client authentication. Only used
+            if `tls=True`.
+
+        insecure_skip_tls_verify :
+            Skip verification of server TLS certificate. Only used if
+            `tls=True`.
+
+        timeout :
+            Modbus request timeout in seconds. Fractional seconds are permitted
+            such as .5.
+
+        trace :
+            Enable low level trace.
+
+    Raises:
+
+        SunSpecClientError: Raised for any sunspec module error.
+    """
+
+    def __init__(self, slave_id=None, ipaddr=None, ipport=None, tls=False, cafile=None, certfile=None, keyfile=None,
+                 insecure_skip_tls_verify=False, timeout=None, trace=False):
+        self._init_device(TCP, slave_id)
+        self.modbus_device = aiomodbus.AsyncModbusClientDeviceTCP(slave_id, ipaddr, ipport, timeout, self, trace, tls,
+                                                                  cafile, certfile, keyfile, insecure_skip_tls_verify)
+
+    async def _request(self, func, *args):
+
+        policy = self._retry_policy()
+        policy.check(self.breaker)
+        attempts = policy.max_attempts(self.retry_count)
+        attempt = 1
+        while True:
+            try:
+                result = await func(*args)
+            except modbus.ModbusClientError as e:
+                if attempt >= attempts or not policy.retryable(e):
+                    policy.record(self.breaker, e)
+                    raise
+                await asyncio.sleep(policy.delay(attempt))
+                attempt += 1
+            else:
+                policy.record(self.breaker)
+                return result
+
+    async def read(self, addr, count):
+        """Read Modbus device registers.
+
+        Parameters:
+
+            addr :
+                Starting Modbus address.
+
+            count :
+                Register count.
+
+        Returns:
+            Byte string containing register contents.
+        """
+
+        try:
+            return await self._request(self.modbus_device.read, addr, count)
+        except modbus.ModbusClientError as e:
+            raise SunSpecClientError('Modbus read error: %s' % str(e), e)
+
+    async def write(self, addr, data):
+        """Write Modbus device registers.
+
+        Parameters:
+
+            addr :
+                Starting Modbus address.
+
+            data :
+                Byte string containing register contents.
+        """
+
+        try:
+            return await self._request(self.modbus_device.write, addr, data)
+        except modbus.ModbusClientError as e:
+            raise SunSpecClientError('Modbus write error: %s' % str(e), e)
+
+    async def read_spans(self, spans):
+        """Read several Modbus device register ranges.
+
+        Parameters:
+
+            spans :
+                List of (address, count) tuples.
+
+        Returns:
+            List of byte strings containing the register contents of each
+            span.
+        """
+
+        data = []
+        for addr, count in spans:
+            data.append(await self.read(addr, count))
+        return data
+
+    async def read_points(self, partial=False):
+        """Read the points for all models in the device from the physical
+        device. See :meth:`sunspec.core.client.ClientDevice.read_points`.
+        """
+
+        models = [model for model in self.models_list if model.model_type is not None]
+        if not partial:
+            coalesce_failed = False
+            if self.read_coalesce and len(models) > 1:
+                try:
+                    await self.read_models(models)
+                    return
+                except SunSpecClientError:
+                    coalesce_failed = True
+
+            for model in self.models_list:
+                await model.read_points()
+
+            if coalesce_failed:
+                self.read_coalesce = False
+            return
+
+        return await self.read_models_partial(models)
+
+    async def write_points(self):
+        """Write the points of all models in the device that have been
+        modified since the last write operation. See
+        :meth:`sunspec.core.client.ClientDevice.write_points`.
+        """
+
+        models = [model for model in self.models_list if model.model_type is not None]
+        for addr, data in self.write_plan(models):
+            await self.write(addr, data)
+            for model in models:
+                model.data_written(addr, data)
+
+    async def read_changes(self, partial=False):
+        """Read the points for all models in the device and return the points
+        that changed. See :meth:`sunspec.core.client.ClientDevice.read_changes`.
+        """
+
+        models = [model for model in self.models_list if model.model_type is not None]
+        for model in models:
+            model.changed = []
+        await self.read_points(partial=partial)
+        return [point for model in models for point in model.changed]
+
+    async def read_models_partial(self, models):
+        """Read several models, continuing when some of the model reads fail.
+        See :meth:`sunspec.core.client.ClientDevice.read_models_partial`.
+        """
+
+        coalesced = [model for model in models if model.status in (None, READ_OK)]
+        coalesce_failed = False
+        failed = []
+        if self.read_coalesce and len(coalesced) > 1:
+            spans = self.read_plan(coalesced)
+            try:
+                data = await self.read_spans(spans)
+            except SunSpecClientError:
+                coalesce_failed = True
+            else:
+                failed = self.models_from_data(coalesced, spans, data)
+                models = [model for model in models if model.status != READ_OK and model not in failed]
+
+        for model in models:
+            try:
+                await model.read_points()
+            except SunSpecClientError:
+                failed.append(model)
+
+        if coalesce_failed and all(model.status == READ_OK for model in coalesced):
+            self.read_coalesce = False
+
+        return failed
+
+    async def read_models(self, models):
+        """Read the points for several models from the physical device using
+        as few requests as possible.
+
+        Parameters:
+
+            models :
+                List of models.
+        """
+
+        spans = self.read_plan(models)
+        failed = self.models_from_data(models, spans, await self.read_spans(spans))
+        if failed:
+            raise SunSpecClientError(failed[0].error)
+
+    async def read_points_subset(self, points, gap=None):
+        """Read a subset of the model points from the physical device. See
+        :meth:`sunspec.core.client.ClientDevice.read_points_subset`.
+        """
+
+        spans, point_list, requested = self.read_subset_plan(points, gap)
+        self._points_from_data(point_list, spans, await self.read_spans(spans))
+        return requested
+
+    async def scan(self, progress=None, delay=None):
+        """Scan all the models of the physical device and create the
+        corresponding model objects within the device object based on the
+        SunSpec model definitions. See
+        :meth:`sunspec.core.client.ClientDevice.scan`.
+        """
+
+        try:
+            await self.modbus_device.connect()
+        except modbus.ModbusClientError as e:
+            raise SunSpecClientError('Modbus error: %s' % str(e))
+
+        try:
+            if delay is not None:
+                await asyncio.sleep(delay)
+
+            requests = self._scan_requests(AsyncClientModel, progress)
+            data = None
+            while True:
+                try:
+                    request = requests.send(data)
+                except StopIteration:
+                    break
+                data = None
+                if request is None:
+                    if delay is not None:
+                        await asyncio.sleep(delay)
+                    continue
+                addr, count, optional = request
+                try:
+                    data = await self.read(addr, count)
+                except SunSpecClientError as e:
+                    if not optional:
+                        raise
+                    data = e
+        finally:
+            self.modbus_device.disconnect()
+
+
+class AsyncClientModel(ClientModel):
+    """A derived class based on :const:`sunspec.core.client.ClientModel` for
+    models in an :const:`AsyncClientDevice`. The read_points and write_points
+    methods are coroutines.
+    """
+
+    async def read_points(self):
+        """Read all points in the model from the physical device.
+        """
+
+        if self.model_type is not None:
+            try:
+                end_index = len(self.read_blocks)
+                if end_index == 1:
+                    data = await self.device.read(self.addr, self.len)
+                else:
+                    data = b''
+                    index = 0
+                    while index < end_index:
+                        addr = self.read_blocks[index]
+                        index += 1
+                        if index < end_index:
+                            read_len = self.read_blocks[index] - addr
+                        else:
+                            read_len = self.addr + self.len - addr
+                        data += await self.device.read(addr, read_len)
+            except SunSpecClientError as e:
+                self.read_error(e)
+                raise
+            except modbus.ModbusClientError as e:
+                e = SunSpecClientError('Modbus error: %s' % str(e), e)
+                self.read_error(e)
+                raise e
+
+            return self.read_data(data)
+
+        return []
+
+    async def write_points(self, verify=None):
+        """Write all points that have been modified since the last write
+        operation to the physical device. See
+        :meth:`sunspec.core.client.ClientModel.write_points`.
+        """
+
+        points = self.modified_points() if verify else None
+        writes = self.write_data()
+        for addr, data in writes:
+            await self.device.write(addr, data)
+            self.data_written(addr, data)
+
+        if not verify or not writes:
+            return []
+        spans = self.verify_plan(writes)
+        return self.verify_data(points, spans, await self.device.read_spans(spans), verify)
@@ -26,7 +26,12 @@ import time
 import struct
 import sys
 import sunspec.core.modbus.client as modbus
+import sunspec.core.columnar as columnar
+import sunspec.core.decode as decode
 import sunspec.core.device as device
+import sunspec.core.plan as plan
+import sunspec.core.retry as retry
+import sunspec.core.scancache as scancache
 import sunspec.core.util as util
 import sunspec.core.suns as suns
 from sunspec.core.util import SunSpecError
@@ -38,8 +43,33 @@ MAPPED = 'Mapped'
 PARITY_NONE = modbus.PARITY_NONE
 PARITY_EVEN = modbus.PARITY_EVEN
 
+# model read status
+READ_OK = 'ok'
+READ_TIMEOUT = 'timeout'
+READ_EXCEPTION = 'exception'
+READ_SHORT = 'short'
+READ_ERROR = 'error'
+
+# write verification modes
+VERIFY_RAISE = 'raise'
+VERIFY_REPORT = 'report'
+
+# model id and length registers of a model header
+SCAN_HEADER_LEN = 2
+
 class SunSpecClientError(SunSpecError):
-    pass
+    """Raised for client errors.
+
+    Attributes:
+
+        modbus_error
+            The :class:`sunspec.core.modbus.client.ModbusClientError` causing
+            the error, None if the error is not a Modbus error.
+    """
+
+    def __init__(self, message='', modbus_error=None):
+        SunSpecError.__init__(self, message)
+        self.modbus_error = modbus_error
 
 class ClientDevice(device.Device):
 
@@ -109,6 +139,11 @@ class ClientDevice(device.Device):
         trace :
             Enable low level trace.
 
+        pool :
+            For :const:`TCP` devices, share a persistent connection with all
+            other pooled devices using the same IP address, port and TLS
+            settings. Defaults to `pool=False`.
+
     Raises:
 
         SunSpecClientError: Raised for any sunspec module error.
@@ -134,30 +169,69 @@ class ClientDevice(device.Device):
             Modbus device object. Object type is based on the device type.
 
         retry_count
-            Request retry count. Currently not used.
+            Number of times a failed request is retried when the retry policy
+            does not set the number of attempts. Not used without a retry
+            policy.
+
+        retry_policy
+            :class:`sunspec.core.retry.RetryPolicy` applied to each request.
+            If None, each request is sent once.
+
+        breaker
+            :class:`sunspec.core.retry.CircuitBreaker` of the device, created
+            on the first request if the retry policy enables circuit breakers.
 
         base_addr_list
             List of Modbus base addresses to try when scanning a device for the
             first time.
+
+        read_coalesce
+            Read adjacent models with as few requests as possible in
+            read_points(). Set to False if the device rejects a request
+            spanning several models.
+
+        read_gap
+            Maximum number of registers outside of the models that may be read
+            to join models into one request.
+
+        read_subset_gap
+            Maximum number of unrequested registers within a model that may be
+            read to join points into one request in read_points_subset().
+
+        write_gap
+            Maximum number of unmodified registers that may be rewritten with
+            their last read contents to join modified points into one write
+            request. Only writable points are rewritten.
+
+        store
+            :class:`sunspec.core.columnar.FleetStore` holding the point values
+            of the device models in shared columns, None if the values are
+            held by the points. Must be set before the device is scanned.
+            The device models are released from the store by close().
+
+        scan_cache
+            :class:`sunspec.core.scancache.ScanCache` used by scan() to skip
+            the model scan of previously scanned devices, None if not used.
+
+        scan_speculative
+            Read ahead up to the maximum request size when scanning the model
+            chain and take as many model headers as possible from each read.
+            A failed read ahead, such as past the end of the register map,
+            shrinks the later read ahead windows of the scan. Cleared
+            automatically if the device rejects reads of a whole model header.
     """
 
     def __init__(self, device_type, slave_id=None, name=None, pathlist=None, baudrate=None, parity=None, ipaddr=None, ipport=None,
-                 tls=False, cafile=None, certfile=None, keyfile=None, insecure_skip_tls_verify=False, timeout=None, trace=False):
-        device.Device.__init__(self, addr=None)
-
-        self.type = device_type
-        self.name = name
-        self.pathlist = pathlist
-        self.slave_id = slave_id
-        self.modbus_device = None
-        self.retry_count = 2
-        self.base_addr_list = [40000, 0, 50000]
+                 tls=False, cafile=None, certfile=None, keyfile=None, insecure_skip_tls_verify=False, timeout=None, trace=False,
+                 pool=False):
+        self._init_device(device_type, slave_id, name, pathlist)
 
         try:
             if device_type == RTU:
                 self.modbus_device = modbus.ModbusClientDeviceRTU(slave_id, name, baudrate, parity, timeout, self, trace)
             elif device_type == TCP:
-                self.modbus_device = modbus.ModbusClientDeviceTCP(slave_id, ipaddr, ipport, timeout, self, trace, tls, cafile, certfile, keyfile, insecure_skip_tls_verify)
+                self.modbus_device = modbus.ModbusClientDeviceTCP(slave_id, ipaddr, ipport, timeout, self, trace, tls, cafile, certfile, keyfile, insecure_skip_tls_verify,
+                                                                  pool=pool)
             elif device_type == MAPPED:
                 if name is not None:
                     self.modbus_device = modbus.ModbusClientDeviceMapped(slave_id, name, pathlist, self)
@@ -170,13 +244,51 @@ class ClientDevice(device.Device):
                 self.modbus_device.close()
             raise SunSpecClientError('Modbus error: %s' % str(e))
 
+    def _init_device(self, device_type, slave_id=None, name=None, pathlist=None):
+
+        # shared with the asyncio client device
+        device.Device.__init__(self, addr=None)
+
+        self.type = device_type
+        self.name = name
+        self.pathlist = pathlist
+        self.slave_id = slave_id
+        self.modbus_device = None
+        self.retry_count = 2
+        self.retry_policy = None
+        self.breaker = None
+        self.base_addr_list = [40000, 0, 50000]
+        self.read_coalesce = True
+        self.read_gap = 0
+        self.read_subset_gap = 16
+        self.write_gap = 0
+        self.store = None
+        self.scan_cache = None
+        self.scan_speculative = True
+
     def close(self):
 
+        if self.store is not None:
+            self.store.release(self)
         if self.modbus_device is not None:
             self.modbus_device.close()
 
+    def _retry_policy(self):
+
+        policy = self.retry_policy
+        if policy is None:
+            policy = retry.DEFAULT_POLICY
+        elif self.breaker is None:
+            self.breaker = policy.breaker()
+        return policy
+
+    def _request(self, func, *args):
+
+        return self._retry_policy().call(func, args, retries=self.retry_count, breaker=self.breaker)
+
     def read(self, addr, count):
-        """Read Modbus device registers.
+        """Read Modbus device registers. The request is retried according to
+        the device retry policy.
 
         Parameters:
 
@@ -192,14 +304,38 @@ class ClientDevice(device.Device):
 
         try:
             if self.modbus_device is not None:
-                return self.modbus_device.read(addr, count)
+                return self._request(self.modbus_device.read, addr, count)
             else:
                 raise SunSpecClientError('No modbus device set for SunSpec device')
         except modbus.ModbusClientError as e:
-            raise SunSpecClientError('Modbus read error: %s' % str(e))
+            raise SunSpecClientError('Modbus read error: %s' % str(e), e)
+
+    def read_spans(self, spans):
+        """Read several Modbus device register ranges. The requests are
+        pipelined if supported and enabled by the Modbus device.
+
+        Parameters:
+
+            spans :
+                List of (address, count) tuples.
+
+        Returns:
+            List of byte strings containing the register contents of each
+            span.
+        """
+
+        read_spans = getattr(self.modbus_device, 'read_spans', None)
+        if read_spans is None:
+            return [self.read(addr, count) for addr, count in spans]
+
+        try:
+            return self._request(read_spans, spans)
+        except modbus.ModbusClientError as e:
+            raise SunSpecClientError('Modbus read error: %s' % str(e), e)
 
     def write(self, addr, data):
-        """Write Modbus device registers.
+        """Write Modbus device registers. The request is retried according to
+        the device retry policy.
 
         Parameters:
 
@@ -212,99 +348,597 @@ class ClientDevice(device.Device):
 
         try:
             if self.modbus_device is not None:
-                return self.modbus_device.write(addr, data)
+                return self._request(self.modbus_device.write, addr, data)
             else:
                 raise SunSpecClientError('No modbus device set for SunSpec device')
         except modbus.ModbusClientError as e:
-            raise SunSpecClientError('Modbus write error: %s' % str(e))
+            raise SunSpecClientError('Modbus write error: %s' % str(e), e)
 
-    def read_points(self):
+    def read_points(self, partial=False):
         """Read the points for all models in the device from the physical
-        device.
+        device. Adjacent models are read together if read_coalesce is set.
+
+        Parameters:
+
+            partial :
+                Read every model even if some of the model reads fail. The
+                outcome of each model read is recorded in the model status
+                attributes, and a model that can not be read keeps its last
+                good point values flagged stale.
+
+        Returns:
+            List of the models that could not be read in partial mode.
+
+        Raises:
+
+            SunSpecClientError: Raised for the first failed model read if not
+                in partial mode.
         """
 
-        for model in self.models_list:
-            model.read_points()
+        models = [model for model in self.models_list if model.model_type is not None]
+        if not partial:
+            coalesce_failed = False
+            if self.read_coalesce and len(models) > 1:
+                try:
+                    self.read_models(models)
+                    return
+                except SunSpecClientError:
+                    # some devices reject requests spanning several models,
+                    # fall back to reading the models one at a time
+                    coalesce_failed = True
 
-    def scan(self, progress=None, delay=None):
-        """Scan all the models of the physical device and create the
-        corresponding model objects within the device object based on the
-        SunSpec model definitions.
+            for model in self.models_list:
+                model.read_points()
+
+            # the coalesced read failed although each of its models can be
+            # read, a transient error leaves coalescing enabled
+            if coalesce_failed:
+                self.read_coalesce = False
+            return
+
+        return self.read_models_partial(models)
+
+    def read_changes(self, partial=False):
+        """Read the points for all models in the device and return the points
+        whose register contents changed since the last read. Only the changed
+        points are decoded.
+
+        Parameters:
+
+            partial :
+                Read every model even if some of the model reads fail. See
+                read_points().
+
+        Returns:
+            List of the changed points in device order. All the points of a
+            model are returned on its first read.
         """
 
-        error = ''
+        models = [model for model in self.models_list if model.model_type is not None]
+        for model in models:
+            model.changed = []
+        self.read_points(partial=partial)
+        return [point for model in models for point in model.changed]
 
-        connect = False
-        if self.modbus_device and type(self.modbus_device) == modbus.ModbusClientDeviceTCP:
-            self.modbus_device.connect()
-            connect = True
+    def _read_max_count(self):
 
-            if delay is not None:
-                time.sleep(delay)
+        max_count = getattr(self.modbus_device, 'max_count', None)
+        if max_count is None:
+            max_count = modbus.REQ_COUNT_MAX
+        return max_count
 
-        if self.base_addr is None:
-            for addr in self.base_addr_list:
-                # print('trying base address %s' % (addr))
-                try:
-                    data = self.read(addr, 3)
-                    if data[:4] == b'SunS':
-                        self.base_addr = addr
-                        # print('device base address = %d' % self.base_addr)
-                        break
-                    else:
-                        error = 'Device responded - not SunSpec register map'
-                except SunSpecClientError as e:
-                    if not error:
-                        error = str(e)
+    def _write_max_count(self):
+
+        return min(self._read_max_count(), modbus.REQ_WRITE_COUNT_MAX)
+
+    def write_plan(self, models):
+        """Plan the requests to write the points of several models that have
+        been modified since the last write operation. Modified points are
+        merged into a request if they are adjacent, also across blocks, or
+        separated by no more than write_gap writable registers. The points
+        stay modified until data_written() is called for the request covering
+        them.
+
+        Parameters:
 
-                if delay is not None:
-                    time.sleep(delay)
+            models :
+                List of models.
+
+        Returns:
+            List of (address, byte string) tuples.
+        """
+
+        writes = []
+        fill = []
+        for model in models:
+            model_writes, model_fill = model.write_ranges(fill=self.write_gap > 0)
+            writes.extend(model_writes)
+            fill.extend(model_fill)
+
+        return plan.plan_writes(writes, fill, max_count=self._write_max_count(), gap=self.write_gap)
+
+    def write_points(self):
+        """Write the points of all models in the device that have been
+        modified since the last write operation to the physical device using
+        as few requests as possible.
+        """
+
+        models = [model for model in self.models_list if model.model_type is not None]
+        for addr, data in self.write_plan(models):
+            self.write(addr, data)
+            for model in models:
+                model.data_written(addr, data)
+
+    def read_plan(self, models):
+        """Plan the requests to read several models.
+
+        Parameters:
 
-        if self.base_addr is not None:
-            # print('base address = %s' % (self.base_addr))
-            model_id = util.data_to_u16(data[4:6])
-            addr = self.base_addr + 2
+            models :
+                List of models.
 
-            while model_id != suns.SUNS_END_MODEL_ID:
+        Returns:
+            List of (address, count) tuples.
+        """
+
+        return plan.plan_reads([model.read_range() for model in models], max_count=self._read_max_count(),
+                               gap=self.read_gap)
+
+    def read_models(self, models):
+        """Read the points for several models from the physical device using
+        as few requests as possible. Models are merged into a request if they
+        are adjacent or separated by no more than read_gap registers.
+
+        Parameters:
+
+            models :
+                List of models.
+
+        Raises:
+
+            SunSpecClientError: Raised for the first model that can not be
+                read, such as after a short response.
+        """
+
+        spans = self.read_plan(models)
+        failed = self.models_from_data(models, spans, self.read_spans(spans))
+        if failed:
+            raise SunSpecClientError(failed[0].error)
+
+    def models_from_data(self, models, spans, data):
+        """Set the point values of several models from the register contents
+        of a coalesced read and record the read status of each model. A model
+        not fully contained in the contents, such as after a short response,
+        is recorded as :const:`READ_SHORT`.
+
+        Parameters:
+
+            models :
+                List of models.
+
+            spans :
+                List of (address, count) tuples read.
+
+            data :
+                List of byte strings containing the register contents of each
+                span.
+
+        Returns:
+            List of the models whose point values could not be set.
+        """
+
+        data = plan.SpanData(spans, data)
+        failed = []
+        for model in models:
+            try:
+                model_data = data.get(model.addr, model.len)
+            except SunSpecError:
+                model_data = None
+            try:
+                model.read_data(model_data)
+            except SunSpecClientError:
+                failed.append(model)
+        return failed
+
+    def read_models_partial(self, models):
+        """Read several models, continuing when some of the model reads fail.
+        The models are read together if read_coalesce is set, except the
+        models that failed their last read which are read on their own. The
+        outcome of each model read is recorded in the model status
+        attributes.
+
+        Parameters:
+
+            models :
+                List of models.
+
+        Returns:
+            List of the models that could not be read.
+        """
+
+        # models that failed the last read are read on their own so they do
+        # not fail the coalesced read of the others
+        coalesced = [model for model in models if model.status in (None, READ_OK)]
+        coalesce_failed = False
+        failed = []
+        if self.read_coalesce and len(coalesced) > 1:
+            spans = self.read_plan(coalesced)
+            try:
+                data = self.read_spans(spans)
+            except SunSpecClientError:
+                coalesce_failed = True
+            else:
+                failed = self.models_from_data(coalesced, spans, data)
+                models = [model for model in models if model.status != READ_OK and model not in failed]
+
+        for model in models:
+            try:
+                model.read_points()
+            except SunSpecClientError:
+                failed.append(model)
+
+        # the coalesced read failed although each of its models can be read
+        if coalesce_failed and all(model.status == READ_OK for model in coalesced):
+            self.read_coalesce = False
+
+        return failed
+
+    def read_subset_plan(self, points, gap=None):
+        """Plan the requests to read a subset of the model points.
+
+        Parameters:
+
+            points :
+                List of (model id, point ids) tuples. See
+                read_points_subset().
+
+            gap :
+                Maximum number of unrequested registers within a model that
+                may be read to join points into one request. Defaults to
+                read_subset_gap.
+
+        Returns:
+            Tuple of the list of (address, count) tuples to read, the list of
+            points to set from the register contents, scale factor points
+            first, and the list of requested points.
+
+        Raises:
+
+            SunSpecClientError: Raised if a model or point is not present in
+                the device.
+        """
+
+        if gap is None:
+            gap = self.read_subset_gap
+        max_count = self._read_max_count()
+
+        sf_points = []
+        value_points = []
+        requested = []
+        selected = set()
+        ranges = []
+        for model_id, point_ids in points:
+            models = self.models.get(model_id)
+            if not models:
+                raise SunSpecClientError('Model %s not present in device' % (model_id))
+            if isinstance(point_ids, str):
+                point_ids = [point_ids]
+            for model in models:
+                model_points = []
+                for pid in point_ids:
+                    found = False
+                    for block in model.blocks:
+                        point = block.points.get(pid)
+                        if point is None:
+                            point = block.points_sf.get(pid)
+                        if point is not None:
+                            found = True
+                            requested.append(point)
+                            model_points.append(point)
+                            if isinstance(point.sf_point, device.Point):
+                                model_points.append(point.sf_point)
+                    if not found:
+                        raise SunSpecClientError('Point %s not present in model %s' % (pid, model_id))
+
+                model_ranges = []
+                for point in model_points:
+                    if id(point) not in selected:
+                        selected.add(id(point))
+                        if point.point_type.type == suns.SUNS_TYPE_SUNSSF:
+                            sf_points.append(point)
+                        else:
+                            value_points.append(point)
+                        model_ranges.append((point.addr, int(point.point_type.len), None))
+
+                # gaps are only bridged within a model, the spans of different
+                # models are joined using the device read_gap
+                for addr, count in plan.plan_reads(model_ranges, max_count=max_count, gap=gap):
+                    ranges.append((addr, count, [addr]))
+
+        spans = plan.plan_reads(ranges, max_count=max_count, gap=self.read_gap)
+
+        return spans, sf_points + value_points, requested
+
+    def read_points_subset(self, points, gap=None):
+        """Read a subset of the model points from the physical device. Only
+        the registers backing the requested points and their scale factor
+        points are read, and only those points are updated.
+
+        Parameters:
+
+            points :
+                List of (model id, point ids) tuples. Point ids is a list of
+                point ids in the model. Points in repeating blocks are read
+                for every repeating block and if the device contains more than
+                one instance of a model the points are read for each instance.
+
+            gap :
+                Maximum number of unrequested registers within a model that
+                may be read to join points into one request. Defaults to
+                read_subset_gap.
+
+        Returns:
+            List of the requested points. Scale factor points that were only
+            read as a dependency are not included.
+
+        Raises:
+
+            SunSpecClientError: Raised if a model or point is not present in
+                the device or for any read error.
+        """
+
+        spans, point_list, requested = self.read_subset_plan(points, gap)
+        self._points_from_data(point_list, spans, self.read_spans(spans))
+        return requested
+
+    def _points_from_data(self, point_list, spans, data):
+
+        span_data = plan.SpanData(spans, data)
+        try:
+            for point in point_list:
+                point.from_data(span_data.get(point.addr, int(point.point_type.len)))
+        except SunSpecError as e:
+            raise SunSpecClientError(e)
+
+        # keep the register contents of the models in step with the points
+        models = []
+        for point in point_list:
+            model = point.block.model
+            if model not in models:
+                models.append(model)
+        for model in models:
+            for (addr, count), span in zip(spans, data):
+                model.data_update(addr, span)
+
+    def scan_key(self):
+        """Return the key of the device in the scan cache, made up of the
+        transport, the device address, and the slave id.
+        """
+
+        if self.type == TCP:
+            addr = '%s:%s' % (self.modbus_device.ipaddr, self.modbus_device.ipport)
+        else:
+            addr = self.name
+        return '%s:%s:%s' % (self.type, addr, self.slave_id)
+
+    def _scan_cache_request(self, entry):
+
+        # SunS marker, common model id and length, and the common model
+        models = entry['models']
+        if not models or models[0][0] != 1:
+            return None
+        return entry['base_addr'], models[0][2] + 4
+
+    def _scan_cache_apply(self, entry, data, model_class):
+        """Validate a scan cache entry against the common model contents
+        read from the device and create the models if valid.
+
+        Returns:
+            True if the entry is valid.
+        """
+
+        models = entry['models']
+        base_addr, count = self._scan_cache_request(entry)
+        if (data is None or len(data) != count * 2 or data[:4] != b'SunS' or
+                util.data_to_u16(data[4:6]) != 1 or util.data_to_u16(data[6:8]) != models[0][2]):
+            return False
+
+        common = model_class(self, 1, base_addr + 4, models[0][2])
+        try:
+            common.load()
+            common.from_data(data[8:])
+        except Exception:
+            return False
+        if scancache.fingerprint(common) != entry['fingerprint']:
+            return False
+
+        self.base_addr = base_addr
+        self.add_model(common)
+        for model_id, addr, model_len in models[1:]:
+            model = model_class(self, model_id, addr, model_len)
+            try:
+                model.load()
+            except Exception as e:
+                model.load_error = str(e)
+            self.add_model(model)
+
+        return True
+
+    def _scan_cache_update(self, data):
+
+        # data contains the common model contents read as for validation
+        common = self.models_list[0]
+        common.from_data(data[8:])
+        self.scan_cache.put(self.scan_key(), self.base_addr,
+                            [(model.id, model.addr, model.len) for model in self.models_list],
+                            scancache.fingerprint(common))
+
+    def _window_reg(self, window_addr, window, addr):
+
+        # register value at addr if contained in the read ahead window
+        offset = (addr - window_addr) * 2
+        if 0 <= offset and offset + 2 <= len(window):
+            return util.data_to_u16(window[offset:offset + 2])
+
+    def _scan_requests(self, model_class, progress=None):
+        """Generator running the device scan, shared by the blocking and the
+        asyncio clients. Yields (addr, count, optional) read requests, and
+        None where the scan delay applies. The data read is sent back, or for
+        a failed optional read the SunSpecClientError.
+        """
+
+        if self.scan_cache is not None and not self.models_list:
+            key = self.scan_key()
+            entry = self.scan_cache.get(key)
+            if entry is not None:
+                request = self._scan_cache_request(entry)
+                data = None
+                if request is not None:
+                    data = yield request + (True,)
+                    if isinstance(data, SunSpecClientError):
+                        data = None
+                if self._scan_cache_apply(entry, data, model_class):
+                    return
+                self.scan_cache.remove(key)
+
+        model_id = None
+        if self.base_addr is None:
+            error = ''
+            for addr in self.base_addr_list:
+                data = yield (addr, 3, True)
+                if isinstance(data, SunSpecClientError):
+                    if not error:
+                        error = str(data)
+                elif data[:4] == b'SunS':
+                    self.base_addr = addr
+                    model_id = util.data_to_u16(data[4:6])
+                    break
+                else:
+                    error = 'Device responded - not SunSpec register map'
+                yield None
+
+            if self.base_addr is None:
+                if not error:
+                    error = 'Unknown error'
+                raise SunSpecClientError(error)
+
+        addr = self.base_addr + 2
+        speculative = self.scan_speculative
+        size = self._read_max_count()
+        window_addr = addr
+        window = b''
+
+        while True:
+            read = False
+            header_failed = False
+            if model_id is None:
+                model_id = self._window_reg(window_addr, window, addr)
+            model_len = self._window_reg(window_addr, window, addr + 1)
+
+            # read ahead from the model header as far as possible. A read
+            # ahead past the end of the register map fails, the model header
+            # is then read on its own and later windows are shrunk.
+            count = size
+            while speculative and (model_id is None or (model_len is None and model_id != suns.SUNS_END_MODEL_ID)):
+                window_addr = addr
+                window = yield (addr, count, True)
+                read = True
+                if isinstance(window, SunSpecClientError):
+                    window = b''
+                    if count <= SCAN_HEADER_LEN:
+                        header_failed = True
+                        break
+                    size = max(count // 2, SCAN_HEADER_LEN)
+                    count = SCAN_HEADER_LEN
+                    continue
+                if model_id is None:
+                    model_id = self._window_reg(window_addr, window, addr)
+                model_len = self._window_reg(window_addr, window, addr + 1)
+
+            if model_id is None:
                 # read model and model len separately due to some devices not supplying
                 # count for the end model id
-                data = self.read(addr + 1, 1)
+                data = yield (addr, 1, False)
+                read = True
+                if data and len(data) == 2:
+                    model_id = util.data_to_u16(data)
+                else:
+                    break
+            if model_id == suns.SUNS_END_MODEL_ID:
+                break
+            if header_failed:
+                # device rejects reads of a whole model header
+                speculative = self.scan_speculative = False
+
+            if model_len is None:
+                data = yield (addr + 1, 1, False)
+                read = True
                 if data and len(data) == 2:
-                    if progress is not None:
-                        cont = progress('Scanning model %s' % (model_id))
-                        if not cont:
-                            raise SunSpecClientError('Device scan terminated')
                     model_len = util.data_to_u16(data)
-                    # print('model_id = %s  model_len = %s' % (model_id, model_len))
-
-                    # move address past model id and length
-                    model = ClientModel(self, model_id, addr + 2, model_len)
-                    # print('loading model %s at %d' % (model_id, addr + 2))
-                    try:
-                        model.load()
-                    except Exception as e:
-                        model.load_error = str(e)
-                    self.add_model(model)
-
-                    addr += model_len + 2
-                    data = self.read(addr, 1)
-                    if data and len(data) == 2:
-                        model_id = util.data_to_u16(data)
-                    else:
-                        break
                 else:
                     break
 
-                if delay is not None:
-                    time.sleep(delay)
+            if progress is not None:
+                cont = progress('Scanning model %s' % (model_id))
+                if not cont:
+                    raise SunSpecClientError('Device scan terminated')
 
-        else:
-            if not error:
-                error = 'Unknown error'
-            raise SunSpecClientError(error)
+            # move address past model id and length
+            model = model_class(self, model_id, addr + 2, model_len)
+            try:
+                model.load()
+            except Exception as e:
+                model.load_error = str(e)
+            self.add_model(model)
+
+            addr += model_len + 2
+            model_id = None
+            if read:
+                yield None
+
+        if self.scan_cache is not None and self.models_list and self.models_list[0].id == 1:
+            self._scan_cache_update((yield (self.base_addr, self.models_list[0].len + 4, False)))
+
+    def scan(self, progress=None, delay=None):
+        """Scan all the models of the physical device and create the
+        corresponding model objects within the device object based on the
+        SunSpec model definitions. If a scan cache is set, a cached model
+        layout is used if the device common model Mn, Md, SN, and Vr values
+        still match, otherwise the cache entry is replaced by the result of
+        the scan.
+        """
 
-        if connect:
-            self.modbus_device.disconnect()
+        connect = False
+        if self.modbus_device and type(self.modbus_device) == modbus.ModbusClientDeviceTCP:
+            self.modbus_device.connect()
+            connect = True
+
+            if delay is not None:
+                time.sleep(delay)
+
+        try:
+            requests = self._scan_requests(ClientModel, progress)
+            data = None
+            while True:
+                try:
+                    request = requests.send(data)
+                except StopIteration:
+                    break
+                data = None
+                if request is None:
+                    if delay is not None:
+                        time.sleep(delay)
+                    continue
+                addr, count, optional = request
+                try:
+                    data = self.read(addr, count)
+                except SunSpecClientError as e:
+                    if not optional:
+                        raise
+                    data = e
+        finally:
+            if connect:
+                self.modbus_device.disconnect()
 
 class ClientModel(device.Model):
     """A derived class based on :const:`sunspec.core.device.Model`. It adds
@@ -330,21 +964,176 @@ class ClientModel(device.Model):
     Raises:
 
         SunSpecClientError: Raised for any sunspec module error.
+
+    Attributes:
+
+        data
+            Byte string containing the register contents of the model from
+            the last read of the entire model, None if not read.
+
+        columns
+            :class:`sunspec.core.columnar.ModelColumns` holding the point
+            values if the device has a fleet store, None otherwise.
+
+        slot
+            Slot of the model in the fleet store columns.
+
+        status
+            Status of the last read of the entire model, None if not read.
+            Possible values: :const:`READ_OK`, :const:`READ_TIMEOUT`,
+            :const:`READ_EXCEPTION`, :const:`READ_SHORT`, :const:`READ_ERROR`.
+
+        error
+            Error string of the last read, None if successful.
+
+        except_code
+            Modbus exception code of the last read if the status is
+            :const:`READ_EXCEPTION`, None otherwise.
+
+        read_time
+            Time of the last read, as returned by time.time().
+
+        good_time
+            Time of the last successful read.
+
+        changed
+            List of the points whose register contents changed in the last
+            read of the entire model.
     """
 
     def __init__(self, dev=None, mid=None, addr=0, mlen=None, index=1):
 
         device.Model.__init__(self, device=dev, mid=mid, addr=addr, mlen=mlen, index=index)
+        self.data = None
+        self.columns = None
+        self.slot = None
+        self.status = None
+        self.error = None
+        self.except_code = None
+        self.read_time = None
+        self.good_time = None
+        self.changed = []
+
+    @property
+    def stale(self):
+        """True if the last read failed and the point values are from an
+        earlier read.
+        """
+
+        return self.status != READ_OK and self.good_time is not None
+
+    def set_status(self, status, error=None, except_code=None):
+        """Record the outcome of a read of the entire model.
+
+        Parameters:
+
+            status :
+                Read status.
+
+            error :
+                Error string.
+
+            except_code :
+                Modbus exception code.
+        """
+
+        self.status = status
+        self.error = error
+        self.except_code = except_code
+        self.read_time = time.time()
+        if status == READ_OK:
+            self.good_time = self.read_time
+
+    def read_error(self, e):
+        """Record a failed read of the entire model.
+
+        Parameters:
+
+            e :
+                :class:`SunSpecClientError` exception of the read.
+        """
+
+        modbus_error = getattr(e, 'modbus_error', None)
+        if isinstance(modbus_error, modbus.ModbusClientTimeout):
+            self.set_status(READ_TIMEOUT, str(e))
+        elif isinstance(modbus_error, modbus.ModbusClientException):
+            self.set_status(READ_EXCEPTION, str(e), modbus_error.except_code)
+        else:
+            self.set_status(READ_ERROR, str(e))
+
+    def read_data(self, data):
+        """Set the point values from the register contents of a read of the
+        entire model and record the read status. The point values are not
+        changed if the data is short.
+
+        Parameters:
+
+            data :
+                Byte string containing the register contents of the model.
+
+        Returns:
+
+            List of the points whose register contents changed.
+
+        Raises:
+
+            SunSpecClientError: Raised for a short read or if the data can not
+                be decoded.
+        """
+
+        if not data or len(data) != self.len * 2:
+            self.set_status(READ_SHORT, 'Short read of model %s: %d of %d registers' %
+                            (self.id, len(data or b'') // 2, self.len))
+            raise SunSpecClientError(self.error)
+        try:
+            self.changed = self.from_data(data)
+        except SunSpecError as e:
+            self.set_status(READ_ERROR, str(e))
+            raise SunSpecClientError(e)
+        self.set_status(READ_OK)
+        return self.changed
 
     def load(self):
         """Create the block and point objects within the model object based on
-        the corresponding SunSpec model definition.
+        the corresponding SunSpec model definition. If the device has a fleet
+        store, the model is assigned a slot in the store and the points are
+        created as views into the store columns.
         """
 
-        device.Model.load(self, block_class=ClientBlock, point_class=ClientPoint)
+        store = getattr(self.device, 'store', None)
+        if store is None:
+            device.Model.load(self, block_class=ClientBlock, point_class=ClientPoint)
+        else:
+            store.add_model(self)
+            try:
+                device.Model.load(self, block_class=ClientBlock, point_class=ColumnPoint)
+            except:
+                store.remove_model(self)
+                raise
+
+    def read_range(self):
+        """Return the register range of the model for read planning as an
+        (address, count, cuts) tuple. The range includes the model id and
+        length registers preceding the model so adjacent models are
+        contiguous. Requests may only start at the model or a point address.
+        """
+
+        cuts = [self.addr]
+        for block in self.blocks:
+            for point in block.points_sf.values():
+                cuts.append(point.addr)
+            for point in block.points_list:
+                cuts.append(point.addr)
+
+        return (self.addr - 2, self.len + 2, cuts)
 
     def read_points(self):
         """Read all points in the model from the physical device.
+
+        Returns:
+
+            List of the points whose register contents changed since the last
+            read.
         """
 
         if self.model_type is not None:
@@ -354,7 +1143,7 @@ class ClientModel(device.Model):
                 if end_index == 1:
                     data = self.device.read(self.addr, self.len)
                 else:
-                    data = b''
+                    spans = []
                     index = 0
                     while index < end_index:
                         addr = self.read_blocks[index]
@@ -363,82 +1152,320 @@ class ClientModel(device.Model):
                             read_len = self.read_blocks[index] - addr
                         else:
                             read_len = self.addr + self.len - addr
-                        data += self.device.read(addr, read_len)
-                if data:
-                    # print('data len = ', len(data))
-                    data_len = len(data)/2
-                    if data_len != self.len:
-                        raise SunSpecClientError('Error reading model %s' % self.model_type)
-
-                    #  for each repeating block
-                    for block in self.blocks:
-                        # scale factor points
-                        for pname, point in block.points_sf.items():
-                            offset = int(point.addr) - int(self.addr)
-                            if point.point_type.data_to is not None:
-                                byte_offset = offset * 2
-                                # print(pname, point, offset, byte_offset, (byte_offset + (int(point.point_type.len) * 2)), point.point_type.len)
-                                point.value_base = point.point_type.data_to(data[byte_offset:byte_offset + (int(point.point_type.len) * 2)])
-                                if not point.point_type.is_impl(point.value_base):
-                                    point.value_base = None
-                            else:
-                                raise SunSpecClientError('No data_to function set for {} : {}'.format(pname, point.point_type))
-
-                        # non-scale factor points
-                        for pname, point in block.points.items():
-                            offset = int(point.addr) - int(self.addr)
-                            if point.point_type.data_to is not None:
-                                byte_offset = offset * 2
-                                # print(pname, point, offset, byte_offset, (byte_offset + (int(point.point_type.len) * 2)), point.point_type.len)
-                                point.value_base = point.point_type.data_to(data[byte_offset:byte_offset + (int(point.point_type.len) * 2)])
-                                if (type(point.value_base) == bytes and
-                                        sys.version_info > (3,)):
-                                    point.value_base = str(point.value_base, 'latin-1')
-                                if point.point_type.is_impl(point.value_base):
-                                    if point.sf_point is not None:
-                                        point.value_sf = point.sf_point.value_base
-                                else:
-                                    point.value_base = None
-                                    point.value_sf = None
-                            else:
-                                raise SunSpecClientError('No data_to function set for {} : {}'.format(pname, point.point_type))
-
-            except SunSpecError as e:
-                raise SunSpecClientError(e)
-            except modbus.ModbusClientError as e:
-                raise SunSpecClientError('Modbus error: %s' % str(e))
-            except:
+                        spans.append((addr, read_len))
+                    data = b''.join(self.device.read_spans(spans))
+            except SunSpecClientError as e:
+                self.read_error(e)
                 raise
+            except modbus.ModbusClientError as e:
+                e = SunSpecClientError('Modbus error: %s' % str(e), e)
+                self.read_error(e)
+                raise e
 
-    def write_points(self):
+            return self.read_data(data)
+
+        return []
+
+    def from_data(self, data):
+        """Set the point values in the model from the model register contents.
+        If the model holds the register contents of a previous read, only the
+        points whose register contents changed are decoded and set. Scale
+        factor changes update the dependent points, and points modified since
+        the last write are always set.
+
+        Parameters:
+
+            data :
+                Byte string containing the register contents of the entire
+                model starting at the model address.
+
+        Returns:
+
+            List of the points set, all the points on the first read.
+        """
+
+        # print('data len = ', len(data))
+        data_len = len(data)/2
+        if data_len != self.len:
+            raise SunSpecClientError('Error reading model %s' % self.model_type)
+
+        old = self.data
+        if old is not None and len(old) != len(data):
+            old = None
+        changed = []
+        # ids of the scale factor points that changed
+        sf_changed = set()
+
+        #  for each repeating block
+        for block in self.blocks:
+            decoder = decode.block_decoder(block.block_type)
+            points = block.decode_points
+            if points is None:
+                points = block.decode_points = [block.points_sf.get(pid) or block.points[pid] for pid in decoder.ids]
+            offset = (block.addr - self.addr) * 2
+            try:
+                dirty = ()
+                if old is None:
+                    values = decoder.decode(data, offset)
+                    sf_indexes = decoder.sf_indexes
+                    value_indexes = decoder.value_indexes
+                else:
+                    if data[offset:offset + decoder.size] != old[offset:offset + decoder.size]:
+                        indexes = set(decoder.changed(data, old, offset))
+                    else:
+                        indexes = set()
+                    for index in decoder.sf_indexes:
+                        if index in indexes:
+                            sf_changed.add(id(points[index]))
+                    for index, point in enumerate(points):
+                        if index in indexes:
+                            continue
+                        if sf_changed and id(point.sf_point) in sf_changed:
+                            indexes.add(index)
+                        elif point.dirty:
+                            # restore the modified value, only a change if it differs
+                            dirty = dirty or set()
+                            dirty.add(index)
+                            indexes.add(index)
+                    if not indexes:
+                        continue
+                    values = decoder.decode_indexes(data, offset, indexes)
+                    sf_indexes = [index for index in decoder.sf_indexes if index in indexes]
+                    value_indexes = [index for index in decoder.value_indexes if index in indexes]
+            except struct.error as e:
+                raise SunSpecClientError('Error decoding model %s: %s' % (self.id, str(e)))
+
+            # scale factor points
+            for index in sf_indexes:
+                point = points[index]
+                if index in dirty and point.value_base == values[index]:
+                    continue
+                point.value_base = values[index]
+                sf_changed.add(id(point))
+                changed.append(point)
+
+            # non-scale factor points
+            for index in value_indexes:
+                point = points[index]
+                value = values[index]
+                if index in dirty and point.value_base == value:
+                    continue
+                point.value_base = value
+                if value is None:
+                    point.value_sf = None
+                elif point.sf_point is not None:
+                    point.value_sf = point.sf_point.value_base
+                changed.append(point)
+
+        self.data = data
+        return changed
+
+    def data_update(self, addr, data):
+        """Update the register contents held from the last read of the entire
+        model with contents written to or read from the device outside of
+        such a read, so the next read is compared against the contents the
+        points hold. Contents outside the model are ignored.
+
+        Parameters:
+
+            addr :
+                Starting Modbus address of the contents.
+
+            data :
+                Byte string containing the register contents.
+        """
+
+        old = self.data
+        if old is None:
+            return
+        offset = (addr - self.addr) * 2
+        start = max(offset, 0)
+        end = min(offset + len(data), len(old))
+        if start < end:
+            self.data = old[:start] + data[start - offset:end - offset] + old[end:]
+
+    def data_written(self, addr, data):
+        """Update the model after register contents have been written to the
+        device. The held register contents are updated as in data_update() and
+        the modified points entirely covered by the write with their current
+        contents are marked as written. Contents outside the model are
+        ignored.
+
+        Parameters:
+
+            addr :
+                Starting Modbus address of the written contents.
+
+            data :
+                Byte string containing the written register contents.
+        """
+
+        end = addr + len(data) // 2
+        if end <= self.addr or addr >= self.addr + self.len:
+            return
+        self.data_update(addr, data)
+        for block in self.blocks:
+            for point in block.points_list:
+                if point.dirty:
+                    point_type = point.point_type
+                    point_len = int(point_type.len)
+                    if addr <= point.addr and point.addr + point_len <= end:
+                        offset = (point.addr - addr) * 2
+                        if data[offset:offset + point_len * 2] == point_type.to_data(point.value_base, point_len * 2):
+                            point.dirty = False
+
+    def write_points(self, verify=None):
         """Write all points that have been modified since the last write
         operation to the physical device.
+
+        Parameters:
+
+            verify :
+                Read back the written registers, using as few requests as
+                possible, and compare them with the written contents of each
+                modified point. Possible values: None,
+                :const:`VERIFY_RAISE` and :const:`VERIFY_REPORT`.
+
+        Returns:
+
+            List of (point, byte string) tuples of the points read back with
+            different contents and the contents read. Empty if not verified.
+
+        Raises:
+
+            SunSpecClientError: Raised if a point read back differs and verify
+                is :const:`VERIFY_RAISE`.
+        """
+
+        points = self.modified_points() if verify else None
+        writes = self.write_data()
+        for addr, data in writes:
+            self.device.write(addr, data)
+            self.data_written(addr, data)
+
+        if not verify or not writes:
+            return []
+        spans = self.verify_plan(writes)
+        return self.verify_data(points, spans, self.device.read_spans(spans), verify)
+
+    def modified_points(self):
+        """Return the points that have been modified since the last write
+        operation.
+
+        Returns:
+
+            List of points.
         """
 
-        addr = None
-        next_addr = None
-        data = b''
+        return [point for block in self.blocks for point in block.points_list if point.dirty]
+
+    def verify_plan(self, writes):
+        """Plan the requests to read back register writes.
+
+        Parameters:
+
+            writes :
+                List of (address, byte string) tuples.
+
+        Returns:
+
+            List of (address, count) tuples.
+        """
+
+        return plan.plan_reads([(addr, len(data) // 2, None) for addr, data in writes],
+                               max_count=self.device._read_max_count(), gap=self.device.read_subset_gap)
+
+    def verify_data(self, points, spans, data, verify=VERIFY_RAISE):
+        """Compare the register contents read back after a write with the
+        contents of the written points.
+
+        Parameters:
+
+            points :
+                List of the written points.
+
+            spans :
+                List of (address, count) tuples read.
+
+            data :
+                List of byte strings containing the register contents of each
+                span.
+
+            verify :
+                Verification mode, :const:`VERIFY_RAISE` or
+                :const:`VERIFY_REPORT`.
+
+        Returns:
+
+            List of (point, byte string) tuples of the points with different
+            contents and the contents read.
+
+        Raises:
+
+            SunSpecClientError: Raised if a point differs and verify is
+                :const:`VERIFY_RAISE`.
+        """
+
+        data = plan.SpanData(spans, data)
+        mismatches = []
+        for point in points:
+            point_type = point.point_type
+            point_len = int(point_type.len)
+            try:
+                point_data = data.get(point.addr, point_len)
+            except SunSpecError as e:
+                raise SunSpecClientError('Error verifying model %s: %s' % (self.id, str(e)))
+            if point_data != point_type.to_data(point.value_base, (point_len * 2)):
+                mismatches.append((point, point_data))
+
+        if mismatches and verify != VERIFY_REPORT:
+            raise SunSpecClientError('Write verification failed in model %s: %s' %
+                                     (self.id, ', '.join([point.point_type.id for point, point_data in mismatches])))
+        return mismatches
+
+    def write_data(self):
+        """Return the register writes needed to update the physical device with
+        all points that have been modified since the last write operation. The
+        points stay modified until data_written() is called for each write.
+
+        Returns:
+
+            List of (address, byte string) tuples planned by the device
+            write_plan().
+        """
+
+        return self.device.write_plan([self])
+
+    def write_ranges(self, fill=False):
+        """Return the register contents of the points that have been modified
+        since the last write operation.
+
+        Parameters:
+
+            fill :
+                Also return the current contents of the unmodified writable
+                points.
+
+        Returns:
+
+            Tuple of two lists of (address, byte string) tuples, one per
+            point: the modified points and the unmodified writable points.
+        """
+
+        writes = []
+        fill_writes = []
 
         for block in self.blocks:
             for point in block.points_list:
+                point_type = point.point_type
                 if point.dirty:
-                    point_addr = int(point.addr)
-                    point_len = int(point.point_type.len)
-                    point_data = point.point_type.to_data(point.value_base, (point_len * 2))
-                    if addr is None:
-                        addr = point_addr
-                        data = b''
-                    else:
-                        if point_addr != next_addr:
-                            block.model.device.write(addr, data)
-                            addr = point_addr
-                            data = b''
-                    next_addr = point_addr + point_len
-                    data += point_data
-                    point.dirty = False
-            if addr is not None:
-                block.model.device.write(addr, data)
-                addr = None
+                    point_len = int(point_type.len)
+                    writes.append((point.addr, point_type.to_data(point.value_base, (point_len * 2))))
+                elif fill and point_type.access == suns.SUNS_ACCESS_RW and point.value_base is not None:
+                    point_len = int(point_type.len)
+                    fill_writes.append((point.addr, point_type.to_data(point.value_base, (point_len * 2))))
+
+        return writes, fill_writes
 
 class ClientBlock(device.Block):
     """A derived class based on :const:`sunspec.core.device.Block`. It adds
@@ -463,9 +1490,12 @@ class ClientBlock(device.Block):
             Block index.
     """
 
+    __slots__ = ('decode_points',)
+
     def __init__(self, model, addr, blen, block_type, index=1):
 
         device.Block.__init__(self, model, addr, blen, block_type, index)
+        self.decode_points = None
 
 class ClientPoint(device.Point):
     """A derived class based on :const:`sunspec.core.device.Point`. It adds
@@ -493,18 +1523,102 @@ class ClientPoint(device.Point):
         SunSpecClientError: Raised for any sunspec module error.
     """
 
+    __slots__ = ()
+
     def __init__(self, block=None, point_type=None, addr=None, sf_point=None, value=None):
 
         device.Point.__init__(self, block, point_type, addr, sf_point, value)
 
+    def from_data(self, data):
+        """Set the point value from the point register contents. The scale
+        factor point, if any, must already be set.
+
+        Parameters:
+
+            data :
+                Byte string containing the register contents of the point.
+        """
+
+        point_type = self.point_type
+        if point_type.data_to is None:
+            raise SunSpecClientError('No data_to function set for {} : {}'.format(point_type.id, point_type))
+
+        self.value_base = point_type.data_to(data)
+        if point_type.type == suns.SUNS_TYPE_SUNSSF:
+            if not point_type.is_impl(self.value_base):
+                self.value_base = None
+        else:
+            if type(self.value_base) == bytes and sys.version_info > (3,):
+                self.value_base = str(self.value_base, 'latin-1')
+            if point_type.is_impl(self.value_base):
+                if self.sf_point is not None:
+                    self.value_sf = self.sf_point.value_base
+            else:
+                self.value_base = None
+                self.value_sf = None
+
     def write(self):
         """Write the point to the physical device.
         """
 
         data = self.point_type.to_data(self.value_base, (int(self.point_type.len) * 2))
-        self.block.model.device.write(int(self.addr), data)
+        model = self.block.model
+        model.device.write(self.addr, data)
+        model.data_update(self.addr, data)
         self.dirty = False
 
+class ColumnPoint(ClientPoint):
+    """A client point whose value_base and value_sf attributes are stored in
+    the columns of a :class:`sunspec.core.columnar.FleetStore` at the model
+    slot. Used for the models of devices with a fleet store.
+    """
+
+    __slots__ = ('base', 'sf', 'scale', 'integer', 'slot')
+
+    def __init__(self, block=None, point_type=None, addr=None, sf_point=None, value=None):
+
+        model = block.model
+        self.base, self.sf, self.scale, self.integer = model.columns.column(point_type.id, block.index, point_type)
+        self.slot = model.slot
+        ClientPoint.__init__(self, block, point_type, addr, sf_point, value)
+
+    def value_base_getter(self):
+
+        v = self.base[self.slot]
+        if self.integer is None:
+            return v
+        # typed columns hold None as NaN
+        if v != v:
+            return None
+        if self.integer:
+            return int(v)
+        return v
+
+    def value_base_setter(self, v):
+
+        if v is None and self.integer is not None:
+            v = columnar.NAN
+        self.base[self.slot] = v
+
+    value_base = property(value_base_getter, value_base_setter, None)
+
+    def value_sf_getter(self):
+
+        sf = self.sf[self.slot]
+        if sf == columnar.SF_NONE:
+            return None
+        return sf
+
+    def value_sf_setter(self, v):
+
+        if v is None:
+            self.sf[self.slot] = columnar.SF_NONE
+        else:
+            self.sf[self.slot] = v
+        self.scale[self.slot] = columnar.scale(v)
+
+    value_sf = property(value_sf_getter, value_sf_setter, None)
+
 class SunSpecClientModelBase(object):
 
     """This class forms the base class of the dynamically generated model
@@ -784,6 +1898,11 @@ class SunSpecClientDevice(object):
         trace :
             Enable low level trace.
 
+        pool :
+            For :const:`TCP` devices, share a persistent connection with all
+            other pooled devices using the same IP address, port and TLS
+            settings. Defaults to `pool=False`.
+
     Raises:
 
         SunSpecClientError: Raised for any sunspec module error.
@@ -806,10 +1925,12 @@ class SunSpecClientDevice(object):
     """
 
     def __init__(self, device_type, slave_id=None, name=None, pathlist = None, baudrate=None, parity=None, ipaddr=None, ipport=None,
-                 tls=False, cafile=None, certfile=None, keyfile=None, insecure_skip_tls_verify=False, timeout=None, trace=False, scan_progress=None, scan_delay=None):
+                 tls=False, cafile=None, certfile=None, keyfile=None, insecure_skip_tls_verify=False, timeout=None, trace=False, scan_progress=None, scan_delay=None,
+                 pool=False):
 
         # super(self.__class__, self).__init__(device_type, slave_id, name, pathlist, baudrate, parity, ipaddr, ipport)
-        self.device = ClientDevice(device_type, slave_id, name, pathlist, baudrate, parity, ipaddr, ipport, tls, cafile, certfile, keyfile, insecure_skip_tls_verify, timeout, trace)
+        self.device = ClientDevice(device_type, slave_id, name, pathlist, baudrate, parity, ipaddr, ipport, tls, cafile, certfile, keyfile, insecure_skip_tls_verify, timeout, trace,
+                                   pool)
         self.models = []
 
         try:
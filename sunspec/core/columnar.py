@@ -0,0 +1,389 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+"""
+    Columnar fleet point storage.
+
+    In fleet storage mode the point values of all the models of the same model
+    type are kept in shared columns, one for the value and one for the scale
+    factor of each point, indexed by the model slot. The model points are views
+    into the columns. A store is enabled for a client device by setting the
+    device store attribute before the device is scanned.
+
+    The values of the numeric point types up to 32 bits are held in typed
+    double arrays with NaN for None, the scale factors in signed short arrays
+    along with a column of the precomputed scale of each slot, so aggregates
+    need no per value power computation. Other point types use list columns.
+
+    The columns are guarded by a lock per model type so the devices of a fleet
+    can be scanned and released from several threads.
+"""
+
+import array
+import math
+import threading
+
+import sunspec.core.suns as suns
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+NAN = float('nan')
+
+# scale factor column value of an unset scale factor
+SF_NONE = suns.SUNS_UNIMPL_SUNSSF
+
+# point types held in typed columns, True for integer types
+TYPED_COLUMNS = {
+    suns.SUNS_TYPE_INT16: True,
+    suns.SUNS_TYPE_UINT16: True,
+    suns.SUNS_TYPE_COUNT: True,
+    suns.SUNS_TYPE_ACC16: True,
+    suns.SUNS_TYPE_ENUM16: True,
+    suns.SUNS_TYPE_BITFIELD16: True,
+    suns.SUNS_TYPE_INT32: True,
+    suns.SUNS_TYPE_UINT32: True,
+    suns.SUNS_TYPE_ACC32: True,
+    suns.SUNS_TYPE_ENUM32: True,
+    suns.SUNS_TYPE_BITFIELD32: True,
+    suns.SUNS_TYPE_SUNSSF: True,
+    suns.SUNS_TYPE_FLOAT32: False
+}
+
+def scale(sf):
+    """Return the multiplier of a scale factor, 1.0 for None or 0.
+    """
+
+    if sf:
+        return math.pow(10, sf)
+    return 1.0
+
+class ModelColumns(object):
+    """Point value columns for all the models of a model type.
+
+    Parameters:
+
+        model_id :
+            Model id.
+
+    Attributes:
+
+        model_id
+            Model id.
+
+        models
+            List of the model assigned to each slot, None for free slots.
+
+        integer
+            Dictionary of the column kind indexed by (block index, point id):
+            True for typed integer columns, False for typed float columns and
+            None for list columns.
+    """
+
+    def __init__(self, model_id):
+
+        self.model_id = model_id
+        self.models = []
+        self.free = []
+        self.base = {}
+        self.sf = {}
+        self.scale = {}
+        self.integer = {}
+        self.lock = threading.Lock()
+
+    def column(self, pid, index=0, point_type=None):
+        """Return the columns of a point, creating them if not present.
+
+        Parameters:
+
+            pid :
+                Point id.
+
+            index :
+                Block index, 0 for the fixed block and 1 or greater for
+                repeating blocks.
+
+            point_type :
+                Point type of the point, selects a typed value column for the
+                numeric types up to 32 bits. A list column is used if not
+                given.
+
+        Returns:
+
+            Tuple of the value column, the scale factor column, the scale
+            column and the column kind (see the integer attribute).
+        """
+
+        key = (index, pid)
+        with self.lock:
+            base = self.base.get(key)
+            if base is None:
+                count = len(self.models)
+                integer = None
+                if point_type is not None:
+                    integer = TYPED_COLUMNS.get(point_type.type)
+                if integer is None:
+                    base = [None] * count
+                else:
+                    base = array.array('d', [NAN]) * count
+                self.base[key] = base
+                self.sf[key] = array.array('h', [SF_NONE]) * count
+                self.scale[key] = array.array('d', [1.0]) * count
+                self.integer[key] = integer
+            return base, self.sf[key], self.scale[key], self.integer[key]
+
+    def add(self, model):
+        """Assign a slot to a model.
+
+        Parameters:
+
+            model :
+                Model object.
+
+        Returns:
+
+            Slot index.
+        """
+
+        with self.lock:
+            if self.free:
+                slot = self.free.pop()
+                self.models[slot] = model
+            else:
+                slot = len(self.models)
+                self.models.append(model)
+                for key, column in self.base.items():
+                    column.append(None if self.integer[key] is None else NAN)
+                for column in self.sf.values():
+                    column.append(SF_NONE)
+                for column in self.scale.values():
+                    column.append(1.0)
+            return slot
+
+    def remove(self, slot):
+        """Free a model slot and clear its values.
+
+        Parameters:
+
+            slot :
+                Slot index.
+        """
+
+        with self.lock:
+            self.models[slot] = None
+            for key, column in self.base.items():
+                column[slot] = None if self.integer[key] is None else NAN
+            for column in self.sf.values():
+                column[slot] = SF_NONE
+            for column in self.scale.values():
+                column[slot] = 1.0
+            self.free.append(slot)
+
+    def values(self, pid, index=0):
+        """Return the scaled values of a point for all slots.
+
+        Parameters:
+
+            pid :
+                Point id.
+
+            index :
+                Block index.
+
+        Returns:
+
+            List of point values indexed by slot. Unimplemented or unread
+            values and free slots are None.
+        """
+
+        key = (index, pid)
+        with self.lock:
+            base = self.base.get(key)
+            if base is None:
+                return [None] * len(self.models)
+            scale = self.scale[key]
+            integer = self.integer[key]
+            if integer is None:
+                return [v * s if s != 1.0 and v is not None else v for v, s in zip(base, scale)]
+            if integer:
+                return [None if v != v else (v * s if s != 1.0 else int(v)) for v, s in zip(base, scale)]
+            return [None if v != v else v * s for v, s in zip(base, scale)]
+
+    def sum(self, pid, index=0):
+        """Return the sum of the scaled values of a point for all slots.
+        Unimplemented and unread values are skipped. Typed columns are summed
+        with numpy if available.
+
+        Parameters:
+
+            pid :
+                Point id.
+
+            index :
+                Block index.
+
+        Returns:
+
+            Sum of the point values.
+        """
+
+        key = (index, pid)
+        with self.lock:
+            base = self.base.get(key)
+            if base is None:
+                return 0
+            scale = self.scale[key]
+            if self.integer[key] is None:
+                return sum(v * s for v, s in zip(base, scale) if v is not None)
+            if numpy is not None and len(base):
+                return float(numpy.nansum(numpy.frombuffer(base, dtype=numpy.float64) *
+                                          numpy.frombuffer(scale, dtype=numpy.float64)))
+            return sum(v * s for v, s in zip(base, scale) if v == v)
+
+class FleetStore(object):
+    """Columnar point storage shared by a fleet of client devices.
+
+    Attributes:
+
+        models
+            Dictionary of :class:`ModelColumns` objects indexed by model id.
+    """
+
+    def __init__(self):
+
+        self.models = {}
+        self.lock = threading.Lock()
+
+    def columns(self, model_id):
+        """Return the columns of a model type, creating them if not present.
+
+        Parameters:
+
+            model_id :
+                Model id.
+
+        Returns:
+
+            :class:`ModelColumns` object.
+        """
+
+        with self.lock:
+            columns = self.models.get(model_id)
+            if columns is None:
+                columns = self.models[model_id] = ModelColumns(model_id)
+            return columns
+
+    def add_model(self, model):
+        """Assign a slot in the model type columns to a model. Called by
+        ClientModel.load() before the points are created.
+
+        Parameters:
+
+            model :
+                Model object.
+        """
+
+        model.columns = self.columns(model.id)
+        model.slot = model.columns.add(model)
+
+    def remove_model(self, model):
+        """Free the slot of a model.
+
+        Parameters:
+
+            model :
+                Model object.
+        """
+
+        if model.columns is not None:
+            model.columns.remove(model.slot)
+            model.columns = None
+            model.slot = None
+
+    def release(self, device):
+        """Free the slots of all the models of a device. The device points
+        must not be used after the device is released.
+
+        Parameters:
+
+            device :
+                Client device.
+        """
+
+        for model in device.models_list:
+            if getattr(model, 'columns', None) is not None:
+                self.remove_model(model)
+
+    def values(self, model_id, pid, index=0):
+        """Return the scaled values of a point for all the models of a model
+        type.
+
+        Parameters:
+
+            model_id :
+                Model id.
+
+            pid :
+                Point id.
+
+            index :
+                Block index, 0 for the fixed block and 1 or greater for
+                repeating blocks.
+
+        Returns:
+
+            List of point values indexed by model slot. Unimplemented or unread
+            values and free slots are None.
+        """
+
+        columns = self.models.get(model_id)
+        if columns is None:
+            return []
+        return columns.values(pid, index)
+
+    def sum(self, model_id, pid, index=0):
+        """Return the sum of the scaled values of a point for all the models of
+        a model type. Unimplemented and unread values are skipped.
+
+        Parameters:
+
+            model_id :
+                Model id.
+
+            pid :
+                Point id.
+
+            index :
+                Block index.
+
+        Returns:
+
+            Sum of the point values.
+        """
+
+        columns = self.models.get(model_id)
+        if columns is None:
+            return 0
+        return columns.sum(pid, index)
@@ -0,0 +1,251 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+"""
+    Compiled block decoders.
+
+    A block decoder is compiled once for each block type and cached on the
+    block type so it is shared by every model instance of the model type. It
+    decodes all the points of a block with a single struct unpack_from() call.
+"""
+
+import struct
+import sys
+
+import sunspec.core.suns as suns
+
+# struct format character and unimplemented value of the point types that
+# are decoded directly by struct
+POINT_FORMATS = {
+    suns.SUNS_TYPE_INT16: ('h', suns.SUNS_UNIMPL_INT16),
+    suns.SUNS_TYPE_UINT16: ('H', suns.SUNS_UNIMPL_UINT16),
+    suns.SUNS_TYPE_COUNT: ('H', suns.SUNS_UNIMPL_UINT16),
+    suns.SUNS_TYPE_ACC16: ('H', suns.SUNS_UNIMPL_ACC16),
+    suns.SUNS_TYPE_ENUM16: ('H', suns.SUNS_UNIMPL_ENUM16),
+    suns.SUNS_TYPE_BITFIELD16: ('H', suns.SUNS_UNIMPL_BITFIELD16),
+    suns.SUNS_TYPE_INT32: ('i', suns.SUNS_UNIMPL_INT32),
+    suns.SUNS_TYPE_UINT32: ('I', suns.SUNS_UNIMPL_UINT32),
+    suns.SUNS_TYPE_ACC32: ('I', suns.SUNS_UNIMPL_ACC32),
+    suns.SUNS_TYPE_ENUM32: ('I', suns.SUNS_UNIMPL_ENUM32),
+    suns.SUNS_TYPE_BITFIELD32: ('I', suns.SUNS_UNIMPL_BITFIELD32),
+    suns.SUNS_TYPE_IPADDR: ('I', suns.SUNS_UNIMPL_IPADDR),
+    suns.SUNS_TYPE_INT64: ('q', suns.SUNS_UNIMPL_INT64),
+    # uint64 and acc64 are decoded as signed values as util.data_to_s64 does
+    suns.SUNS_TYPE_UINT64: ('q', suns.SUNS_UNIMPL_UINT64),
+    suns.SUNS_TYPE_ACC64: ('q', suns.SUNS_UNIMPL_ACC64),
+    suns.SUNS_TYPE_FLOAT32: ('f', None),
+    suns.SUNS_TYPE_SUNSSF: ('h', suns.SUNS_UNIMPL_SUNSSF)
+}
+
+class BlockDecoder(object):
+    """Decoder for the register contents of a block type.
+
+    Parameters:
+
+        block_type :
+            Block type to compile.
+
+    Attributes:
+
+        ids
+            List of the ids of the decoded points in block offset order. Pad
+            points are not decoded.
+
+        sf_indexes
+            Indexes in ids of the scale factor points.
+
+        value_indexes
+            Indexes in ids of the non-scale factor points.
+
+        struct
+            The compiled struct.Struct object.
+
+        spans
+            List of the (start, end) byte offsets of each point in the block,
+            in ids order.
+
+        size
+            Block length in bytes.
+    """
+
+    def __init__(self, block_type):
+
+        self.ids = []
+        self.sf_indexes = []
+        self.value_indexes = []
+        # unimplemented value for each decoded value, None if not checked by
+        # value comparison
+        self.unimpl = []
+        # indexes of float values, NaN is unimplemented
+        self.float_indexes = []
+        # (index, point type) of values decoded by the point type data_to
+        # function after unpacking the raw bytes
+        self.converts = []
+        self.spans = []
+        self.size = int(block_type.len) * 2
+
+        fmt = '>'
+        offset = 0
+        for point_type in sorted(block_type.points_list, key=lambda pt: int(pt.offset)):
+            if point_type.type == suns.SUNS_TYPE_PAD:
+                continue
+            point_offset = int(point_type.offset)
+            point_len = int(point_type.len)
+            if point_offset > offset:
+                fmt += '%dx' % ((point_offset - offset) * 2)
+            offset = point_offset + point_len
+
+            index = len(self.ids)
+            self.ids.append(point_type.id)
+            self.spans.append((point_offset * 2, (point_offset + point_len) * 2))
+            if point_type.type == suns.SUNS_TYPE_SUNSSF:
+                self.sf_indexes.append(index)
+            else:
+                self.value_indexes.append(index)
+
+            info = suns.suns_point_type_info.get(point_type.type)
+            point_format = POINT_FORMATS.get(point_type.type)
+            if (point_format is not None and info is not None and point_len == info[0] and
+                    point_type.data_to is info[2] and point_type.is_impl is info[1]):
+                fmt += point_format[0]
+                self.unimpl.append(point_format[1])
+                if point_type.type == suns.SUNS_TYPE_FLOAT32:
+                    self.float_indexes.append(index)
+            else:
+                fmt += '%ds' % (point_len * 2)
+                self.unimpl.append(None)
+                self.converts.append((index, point_type))
+
+        self.struct = struct.Struct(fmt)
+        self.float_set = frozenset(self.float_indexes)
+        self.convert_types = dict(self.converts)
+
+    def decode(self, data, offset=0):
+        """Decode the point values of a block.
+
+        Parameters:
+
+            data :
+                Buffer containing the block register contents.
+
+            offset :
+                Byte offset of the block in data.
+
+        Returns:
+
+            List of point values in ids order. Unimplemented values are None.
+        """
+
+        values = [None if v == u else v for v, u in zip(self.struct.unpack_from(data, offset), self.unimpl)]
+
+        for index in self.float_indexes:
+            value = values[index]
+            if value != value:
+                values[index] = None
+
+        for index, point_type in self.converts:
+            value = point_type.data_to(values[index])
+            if type(value) == bytes and sys.version_info > (3,):
+                value = str(value, 'latin-1')
+            if not point_type.is_impl(value):
+                value = None
+            values[index] = value
+
+        return values
+
+    def changed(self, data, old, offset=0):
+        """Return the indexes of the points whose register contents differ
+        between two buffers.
+
+        Parameters:
+
+            data :
+                Buffer containing the block register contents.
+
+            old :
+                Buffer to compare with, at the same offset.
+
+            offset :
+                Byte offset of the block in the buffers.
+
+        Returns:
+
+            List of indexes in ids.
+        """
+
+        return [index for index, (start, end) in enumerate(self.spans)
+                if data[offset + start:offset + end] != old[offset + start:offset + end]]
+
+    def decode_indexes(self, data, offset, indexes):
+        """Decode the values of some of the points of a block.
+
+        Parameters:
+
+            data :
+                Buffer containing the block register contents.
+
+            offset :
+                Byte offset of the block in data.
+
+            indexes :
+                Indexes in ids of the points to decode.
+
+        Returns:
+
+            Dictionary of point values indexed by index. Unimplemented values
+            are None.
+        """
+
+        raw = self.struct.unpack_from(data, offset)
+        values = {}
+        for index in indexes:
+            value = raw[index]
+            point_type = self.convert_types.get(index)
+            if point_type is not None:
+                value = point_type.data_to(value)
+                if type(value) == bytes and sys.version_info > (3,):
+                    value = str(value, 'latin-1')
+                if not point_type.is_impl(value):
+                    value = None
+            elif value == self.unimpl[index] or (index in self.float_set and value != value):
+                value = None
+            values[index] = value
+        return values
+
+def block_decoder(block_type):
+    """Return the decoder for a block type, compiling it on first use.
+
+    Parameters:
+
+        block_type :
+            Block type.
+
+    Returns:
+
+        :class:`BlockDecoder` object.
+    """
+
+    decoder = block_type.decoder
+    if decoder is None:
+        decoder = block_type.decoder = BlockDecoder(block_type)
+    return decoder
@@ -315,6 +315,8 @@ class Block(object):
             Dictionary of scale factor points int the block indexed by point id.
     """
 
+    __slots__ = ('model', 'block_type', 'addr', 'len', 'type', 'index', 'points_list', 'points', 'points_sf')
+
     def __init__(self, model, addr, blen, block_type, index=1):
 
         self.model = model
@@ -465,6 +467,8 @@ class Point(object):
             Value of the point with the scale factor applied.
     """
 
+    __slots__ = ('block', 'point_type', 'addr', 'sf_point', 'impl', 'value_base', 'value_sf', 'dirty')
+
     def __init__(self, block=None, point_type=None, addr=None, sf_point=None, value=None):
 
         self.block = block
@@ -608,6 +612,8 @@ class Point(object):
 
 class ScaleFactor(object):
 
+    __slots__ = ('value_base',)
+
     def __init__(self, value=None):
 
         self.value_base = value
@@ -736,7 +742,7 @@ class Model(object):
                 for point_type in block_type.points_list:
                     if point_type.type != suns.SUNS_TYPE_PAD:
                         point_addr = int(block_addr) + int(point_type.offset)
-                        point = point_class(block=block, point_type=point_type, addr=str(point_addr))
+                        point = point_class(block=block, point_type=point_type, addr=point_addr)
                         if point_addr + point.point_type.len - last_read_addr > MAX_READ_COUNT:
                             last_read_addr = point_addr
                             self.read_blocks.append(last_read_addr)
@@ -892,7 +898,7 @@ def model_type_get(model_id):
     global file_pathlist
     global model_types
 
-    model_type = model_types.get(str(model_id))
+    model_type = model_types.get(int(model_id))
     if model_type is None:
         smdx_data = ''
         # create model file name
@@ -1137,6 +1143,10 @@ class BlockType(object):
 
         points
             Dictionary containg the points in the block indexed by the point id.
+
+        decoder
+            Compiled :class:`sunspec.core.decode.BlockDecoder` for the block
+            type, created on first use.
     """
 
     def __init__(self, btype=None, blen=0, name=None, model_type=None):
@@ -1146,6 +1156,7 @@ class BlockType(object):
         self.name = name
         self.points_list = []
         self.points = {}
+        self.decoder = None
 
     def from_smdx(self, element):
         """ Sets the block type attributes based on an element tree block type
@@ -0,0 +1,488 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+"""
+    Fleet operations.
+
+    Runs operations on many SunSpec devices concurrently using a bounded pool
+    of worker threads. The devices on the same RTU bus share one serial
+    interface, so they are handled one at a time by a single worker instead of
+    holding several workers waiting on the same bus.
+"""
+
+import math
+import threading
+import time
+
+import sunspec.core.client as client
+import sunspec.core.modbus.client as modbus
+import sunspec.core.plan as plan
+
+class Target(object):
+    """A device to access in a fleet operation.
+
+    Parameters:
+
+        device_type :
+            Device type. Possible values: :const:`sunspec.core.client.RTU`,
+            :const:`sunspec.core.client.TCP`,
+            :const:`sunspec.core.client.MAPPED`.
+
+        slave_id :
+            Modbus slave id.
+
+        name :
+            Serial port name for RTU devices, map file name for mapped
+            devices.
+
+        ipaddr :
+            IP address for TCP devices.
+
+        ipport :
+            IP port for TCP devices.
+
+        baudrate :
+            Baud rate for RTU devices.
+
+        parity :
+            Parity for RTU devices.
+
+        timeout :
+            Modbus request timeout in seconds.
+
+        pathlist :
+            Map file search path for mapped devices.
+    """
+
+    def __init__(self, device_type, slave_id=1, name=None, ipaddr=None, ipport=None, baudrate=None, parity=None,
+                 timeout=None, pathlist=None):
+
+        self.type = device_type
+        self.slave_id = slave_id
+        self.name = name
+        self.ipaddr = ipaddr
+        self.ipport = ipport
+        self.baudrate = baudrate
+        self.parity = parity
+        self.timeout = timeout
+        self.pathlist = pathlist
+
+    @property
+    def bus(self):
+        """Serial port name for RTU devices, None otherwise."""
+
+        if self.type == client.RTU:
+            return self.name
+
+    def device(self):
+        """Create the client device for the target.
+
+        Returns:
+
+            :class:`sunspec.core.client.ClientDevice` object.
+        """
+
+        return client.ClientDevice(self.type, self.slave_id, name=self.name, pathlist=self.pathlist,
+                                   baudrate=self.baudrate, parity=self.parity, ipaddr=self.ipaddr,
+                                   ipport=self.ipport, timeout=self.timeout)
+
+    def __str__(self):
+
+        if self.type == client.TCP:
+            return 'tcp:%s:%s:%s' % (self.ipaddr, self.ipport or 502, self.slave_id)
+        return '%s:%s:%s' % (self.type.lower(), self.name, self.slave_id)
+
+def parse_target(target, baudrate=None, parity=None, timeout=None):
+    """Create a target from a target string. The target string formats are
+    tcp:ipaddr[:ipport[:slave_id]] and rtu:port[:slave_id]. The slave id
+    defaults to 1 and the IP port to 502.
+
+    Parameters:
+
+        target :
+            Target string.
+
+        baudrate :
+            Baud rate for RTU targets.
+
+        parity :
+            Parity for RTU targets.
+
+        timeout :
+            Modbus request timeout in seconds.
+
+    Returns:
+
+        :class:`Target` object.
+
+    Raises:
+
+        SunSpecClientError: Raised if the target string is not valid.
+    """
+
+    try:
+        transport, addr = target.split(':', 1)
+        transport = transport.lower()
+        if transport == 'tcp':
+            fields = addr.split(':')
+            if not 1 <= len(fields) <= 3 or not fields[0]:
+                raise ValueError()
+            ipport = int(fields[1]) if len(fields) > 1 else 502
+            slave_id = int(fields[2]) if len(fields) > 2 else 1
+            return Target(client.TCP, slave_id, ipaddr=fields[0], ipport=ipport, timeout=timeout)
+        elif transport == 'rtu':
+            slave_id = 1
+            fields = addr.rsplit(':', 1)
+            if len(fields) == 2 and fields[1].isdigit():
+                addr = fields[0]
+                slave_id = int(fields[1])
+            if not addr:
+                raise ValueError()
+            return Target(client.RTU, slave_id, name=addr, baudrate=baudrate, parity=parity, timeout=timeout)
+    except ValueError:
+        pass
+
+    raise client.SunSpecClientError('Invalid target: %s' % (target))
+
+class Result(object):
+    """Result of a fleet operation for one device.
+
+    Attributes:
+
+        target
+            The :class:`Target` of the device.
+
+        device
+            The :class:`sunspec.core.client.ClientDevice` object, None if the
+            device could not be created.
+
+        error
+            Error string, None if the operation succeeded.
+
+        start
+            Time the operation started, as returned by time.time().
+
+        elapsed
+            Duration of the operation in seconds.
+
+        latency
+            Time in seconds from the start of the fleet operation to the
+            completion of the operation for the device.
+    """
+
+    def __init__(self, target):
+
+        self.target = target
+        self.device = None
+        self.error = None
+        self.start = None
+        self.elapsed = None
+        self.latency = None
+
+    @property
+    def ok(self):
+        """True if the operation succeeded."""
+
+        return self.error is None
+
+    @property
+    def models(self):
+        """List of (model id, address, length) tuples of the device models."""
+
+        if self.device is None:
+            return []
+        return [(model.id, model.addr, model.len) for model in self.device.models_list]
+
+def run(targets, func, workers=8):
+    """Run an operation on each target using a bounded pool of worker threads.
+    The targets on the same RTU bus are run one at a time in target order.
+
+    Parameters:
+
+        targets :
+            List of :class:`Target` objects.
+
+        func :
+            Function called with the :class:`Result` of each target. It sets
+            the result device and raises an exception if the operation fails.
+
+        workers :
+            Maximum number of concurrent worker threads.
+
+    Returns:
+
+        List of :class:`Result` objects in target order.
+    """
+
+    results = [Result(target) for target in targets]
+
+    def run_job(job):
+        for result in job:
+            _call(result, func)
+
+    _run(results, run_job, workers)
+    return results
+
+def _call(result, func):
+
+    result.start = time.time()
+    try:
+        value = func(result)
+    except Exception as e:
+        value = None
+        _fail(result, e)
+    result.elapsed = time.time() - result.start
+    return value
+
+def _fail(result, e):
+
+    result.error = str(e) or e.__class__.__name__
+
+def _run(results, job_func, workers):
+
+    # one job per RTU bus, one job per device otherwise
+    jobs = []
+    buses = {}
+    for result in results:
+        bus = result.target.bus
+        if bus is None:
+            jobs.append([result])
+        elif bus in buses:
+            buses[bus].append(result)
+        else:
+            buses[bus] = [result]
+            jobs.append(buses[bus])
+
+    lock = threading.Lock()
+    pending = iter(jobs)
+    start = time.time()
+
+    def worker():
+        while True:
+            with lock:
+                job = next(pending, None)
+            if job is None:
+                break
+            job_func(job)
+            for result in job:
+                if result.start is not None and result.elapsed is not None:
+                    result.latency = result.start + result.elapsed - start
+
+    threads = [threading.Thread(target=worker) for i in range(max(1, min(workers, len(jobs))))]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+def scan(targets, workers=8, scan_cache=None, delay=None):
+    """Scan a fleet of devices concurrently.
+
+    Parameters:
+
+        targets :
+            List of :class:`Target` objects.
+
+        workers :
+            Maximum number of devices scanned concurrently.
+
+        scan_cache :
+            :class:`sunspec.core.scancache.ScanCache` to use for the scans.
+            The cache is saved once after all the scans.
+
+        delay :
+            Delay in seconds between scan requests to each device.
+
+    Returns:
+
+        List of :class:`Result` objects in target order. The device of each
+        successful result is scanned and ready to read.
+    """
+
+    def scan_device(result):
+        result.device = result.target.device()
+        result.device.scan_cache = scan_cache
+        try:
+            result.device.scan(delay=delay)
+        except Exception:
+            result.device.close()
+            raise
+
+    if scan_cache is None:
+        return run(targets, scan_device, workers)
+    with scan_cache.batch():
+        return run(targets, scan_device, workers)
+
+def write_points(results, model_id, values, workers=8, broadcast=False):
+    """Write the same point values to a model of many devices. The register
+    contents are encoded once for each set of scale factor values found in
+    the devices and written to the devices concurrently, one device at a time
+    on each RTU bus. The scale factors of devices that have not read them yet
+    are read before the write.
+
+    Parameters:
+
+        results :
+            List of :class:`Result` objects of scanned devices, as returned
+            by :func:`scan`.
+
+        model_id :
+            Model id of the model to write. The points are written to the
+            first instance of the model in each device.
+
+        values :
+            Dictionary of point values indexed by point id. Only points in
+            the fixed block of the model can be written.
+
+        workers :
+            Maximum number of concurrent worker threads.
+
+        broadcast :
+            Use a single Modbus broadcast write for the devices of an RTU bus
+            if all of them are prepared for the write and have the model at
+            the same address and the same scale factors. Otherwise the
+            devices of the bus are written one at a time. Broadcast writes
+            are not acknowledged by the devices and are received by every
+            device on the bus, so the results must include all the devices
+            on the bus.
+
+    Returns:
+
+        List of new :class:`Result` objects in results order. The latency of
+        each result is the time to complete the write for the device.
+    """
+
+    point_ids = sorted(values)
+    payloads = {}
+    lock = threading.Lock()
+
+    def prepare(result):
+        device = result.device
+        if device is None:
+            raise client.SunSpecClientError('Device not scanned')
+        models = device.models.get(model_id)
+        if not models:
+            raise client.SunSpecClientError('Model %s not present in device' % (model_id))
+        model = models[0]
+        points = []
+        for pid in point_ids:
+            point = model.points.get(pid)
+            if point is None:
+                raise client.SunSpecClientError('Point %s not present in model %s' % (pid, model_id))
+            points.append(point)
+
+        if [point for point in points if point.sf_point is not None and point.sf_point.value_base is None]:
+            device.read_points_subset([(model_id, point_ids)])
+        sfs = []
+        for point in points:
+            sf = None
+            if point.sf_point is not None:
+                sf = point.sf_point.value_base
+                if sf is None:
+                    raise client.SunSpecClientError('Scale factor for point %s not implemented' % (point.point_type.id))
+            sfs.append(sf)
+        sfs = tuple(sfs)
+
+        with lock:
+            payload = payloads.get(sfs)
+            if payload is None:
+                payload = payloads[sfs] = _encode(model, points, [values[pid] for pid in point_ids], sfs)
+        return model, points, payload
+
+    def write_device(result):
+        model, points, payload = prepare(result)
+        _write(result.device, model, points, payload)
+
+    def write_job(job):
+        if not broadcast or job[0].target.bus is None or len(job) < 2:
+            for result in job:
+                _call(result, write_device)
+            return
+
+        # a broadcast request reaches every device on the bus, so it is only
+        # used if all the devices take the same write
+        prepared = [_call(result, prepare) for result in job]
+        if any(item is None for item in prepared) or \
+                len(set((model.addr, id(payload)) for model, points, payload in prepared)) != 1:
+            for result, item in zip(job, prepared):
+                if item is not None:
+                    try:
+                        _write(result.device, *item)
+                    except Exception as e:
+                        _fail(result, e)
+                    result.elapsed = time.time() - result.start
+            return
+
+        model, points, payload = prepared[0]
+        try:
+            rtu = job[0].device.modbus_device.client
+            for offset, data in payload[1]:
+                rtu.write(modbus.BROADCAST_ID, model.addr + offset, data)
+            for model, points, payload in prepared:
+                _set_points(model, points, payload)
+        except Exception as e:
+            for result in job:
+                _fail(result, e)
+        for result in job:
+            result.elapsed = time.time() - result.start
+
+    results = [_copy_result(result) for result in results]
+    _run(results, write_job, workers)
+    return results
+
+def _copy_result(result):
+
+    copy = Result(result.target)
+    copy.device = result.device
+    return copy
+
+def _encode(model, points, values, sfs):
+
+    # point values are scaled as in the point value setter
+    bases = []
+    writes = []
+    for point, value, sf in zip(points, values, sfs):
+        if sf:
+            value = int(round(float(value) / math.pow(10, sf)))
+        else:
+            value = point.point_type.to_value(value)
+        bases.append((value, sf))
+        point_len = int(point.point_type.len)
+        writes.append((point.addr - model.addr, point.point_type.to_data(value, point_len * 2)))
+
+    return bases, plan.plan_writes(writes)
+
+def _write(device, model, points, payload):
+
+    for offset, data in payload[1]:
+        device.write(model.addr + offset, data)
+    _set_points(model, points, payload)
+
+def _set_points(model, points, payload):
+
+    for point, (value, sf) in zip(points, payload[0]):
+        point.value_base = value
+        point.value_sf = sf
+        point.dirty = False
+    for offset, data in payload[1]:
+        model.data_update(model.addr + offset, data)
@@ -0,0 +1,368 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+"""
+    Asyncio Modbus TCP client support. Requires Python 3.5 or later.
+
+    A single event loop can drive any number of devices concurrently:
+
+        devices = [AsyncModbusClientDeviceTCP(1, ipaddr) for ipaddr in ipaddrs]
+        results = await asyncio.gather(*[d.read(40000, 2) for d in devices])
+"""
+
+import asyncio
+import ssl
+import struct
+
+from sunspec.core.modbus.client import ModbusClientError, ModbusClientTimeout, ModbusClientException
+from sunspec.core.modbus.client import REQ_COUNT_MAX, FUNC_READ_HOLDING, FUNC_WRITE_MULTIPLE
+from sunspec.core.modbus.client import TCP_HDR_LEN
+from sunspec.core.modbus.client import TCP_DEFAULT_PORT, TCP_DEFAULT_TIMEOUT
+
+
+class AsyncModbusClientDeviceTCP(object):
+    """Provides asyncio access to a Modbus TCP device. The connect, read, and
+    write methods are coroutines. Requests from concurrent tasks using the
+    same device are serialized on the device connection.
+
+    Parameters:
+
+        slave_id :
+            Modbus slave id.
+
+        ipaddr :
+            IP address string.
+
+        ipport :
+            IP port.
+
+        timeout :
+            Modbus request timeout in seconds. Fractional seconds are permitted
+            such as .5.
+
+        ctx :
+            Context variable to be used by the object creator. Not used by the
+            modbus module.
+
+        trace_func :
+            Trace function to use for detailed logging. No detailed logging is
+            perform is a trace function is not supplied.
+
+        tls :
+            Use TLS (Modbus/TCP Security). Defaults to `tls=False`.
+
+        cafile :
+            Path to certificate authority (CA) certificate to use for
+            validating server certificates. Only used if `tls=True`.
+
+        certfile :
+            Path to client TLS certificate to use for client authentication.
+            Only used if `tls=True`.
+
+        keyfile :
+            Path to client TLS key to use for client authentication. Only
+            used if `tls=True`.
+
+        insecure_skip_tls_verify :
+            Skip verification of server TLS certificate. Only used if
+            `tls=True`.
+
+        max_count :
+            Maximum register count for a single Modbus request.
+
+    Raises:
+
+        ModbusClientError: Raised for any general modbus client error.
+
+        ModbusClientTimeoutError: Raised for a modbus client request timeout.
+
+        ModbusClientException: Raised for an exception response to a modbus
+            client request.
+
+    Attributes:
+
+        slave_id
+            Modbus slave id.
+
+        ipaddr
+            Destination device IP address string.
+
+        ipport
+            Destination device IP port.
+
+        timeout
+            Modbus request timeout in seconds.
+
+        ctx
+            Context variable to be used by the object creator. Not used by the
+            modbus module.
+
+        reader
+            asyncio StreamReader for the connection. If no connection active,
+            value is None.
+
+        writer
+            asyncio StreamWriter for the connection. If no connection active,
+            value is None.
+
+        max_count
+            Maximum register count for a single Modbus request.
+    """
+
+    def __init__(self, slave_id, ipaddr, ipport=502, timeout=None, ctx=None, trace_func=None, tls=False, cafile=None,
+                 certfile=None, keyfile=None, insecure_skip_tls_verify=False, max_count=REQ_COUNT_MAX):
+        self.slave_id = slave_id
+        self.ipaddr = ipaddr
+        self.ipport = ipport
+        self.timeout = timeout
+        self.ctx = ctx
+        self.reader = None
+        self.writer = None
+        self.trace_func = trace_func
+        self.tls = tls
+        self.cafile = cafile
+        self.certfile = certfile
+        self.keyfile = keyfile
+        self.tls_verify = not insecure_skip_tls_verify
+        self.max_count = max_count
+        self._lock = None
+        self._tid = 0
+        self._reconnect = False
+
+        if ipport is None:
+            self.ipport = TCP_DEFAULT_PORT
+        if timeout is None:
+            self.timeout = TCP_DEFAULT_TIMEOUT
+
+    def _get_lock(self):
+        # created on first use so the lock belongs to the running event loop
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    def close(self):
+
+        self.disconnect()
+
+    async def connect(self, timeout=None):
+        """Connect to TCP destination.
+
+        Parameters:
+
+            timeout :
+                Connection timeout in seconds.
+        """
+
+        if self.writer is not None:
+            self.disconnect()
+
+        if timeout is None:
+            timeout = self.timeout
+
+        context = None
+        server_hostname = None
+        if self.tls:
+            context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=self.cafile)
+            context.load_cert_chain(certfile=self.certfile, keyfile=self.keyfile)
+            context.check_hostname = self.tls_verify
+            server_hostname = self.ipaddr
+
+        try:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.ipaddr, self.ipport, ssl=context, server_hostname=server_hostname),
+                timeout)
+        except asyncio.TimeoutError:
+            raise ModbusClientTimeout('Connection timeout')
+        except Exception as e:
+            raise ModbusClientError('Connection error: %s' % str(e))
+
+    def disconnect(self):
+        """Disconnect from TCP destination.
+        """
+
+        try:
+            if self.writer is not None:
+                self.writer.close()
+        except Exception:
+            pass
+        self.reader = None
+        self.writer = None
+        self._reconnect = False
+
+    def _reset(self):
+        # a response may still be in flight, drop the connection so it can
+        # not be taken as the response to the next request
+        self.disconnect()
+        self._reconnect = True
+
+    async def _open(self):
+        # returns True if the connection is local to the request
+        if self.writer is None:
+            reconnect = self._reconnect
+            await self.connect(self.timeout)
+            return not reconnect
+        return False
+
+    def _trace(self, direction, addr, frame):
+        s = '{}:{}:{}[addr={}] {}'.format(self.ipaddr, str(self.ipport), str(self.slave_id), addr, direction)
+        for c in bytearray(frame):
+            s += '%02X' % (c)
+        self.trace_func(s)
+
+    async def _transact(self, addr, func, req):
+        self._tid = (self._tid + 1) & 0xffff
+        tid = self._tid
+        req = struct.pack('>HHH', tid, 0, len(req)) + req
+
+        if self.trace_func:
+            self._trace('->', addr, req)
+
+        try:
+            self.writer.write(req)
+            await self.writer.drain()
+        except Exception as e:
+            self._reset()
+            raise ModbusClientError('Socket write error: %s' % str(e))
+
+        try:
+            hdr = await asyncio.wait_for(self.reader.readexactly(TCP_HDR_LEN), self.timeout)
+            resp_tid, pid, pdu_len = struct.unpack('>HHH', hdr)
+            pdu = await asyncio.wait_for(self.reader.readexactly(pdu_len), self.timeout)
+        except asyncio.TimeoutError:
+            self._reset()
+            raise ModbusClientTimeout('Response timeout')
+        except asyncio.IncompleteReadError:
+            self._reset()
+            raise ModbusClientError('Response timeout')
+
+        if self.trace_func:
+            self._trace('<--', addr, hdr + pdu)
+
+        if resp_tid != tid or len(pdu) < 3 or pdu[1] & 0x7f != func:
+            self._reset()
+            raise ModbusClientError('Modbus response format error')
+        if pdu[1] & 0x80:
+            raise ModbusClientException('Modbus exception %d' % (pdu[2]), pdu[2])
+
+        return pdu
+
+    async def _read(self, addr, count, op=FUNC_READ_HOLDING):
+
+        req = struct.pack('>BBHH', int(self.slave_id), op, int(addr), int(count))
+        pdu = await self._transact(addr, op, req)
+
+        if pdu[2] != count * 2 or len(pdu) < 3 + pdu[2]:
+            raise ModbusClientError('Modbus response format error')
+        return pdu[3:3 + pdu[2]]
+
+    async def read(self, addr, count, op=FUNC_READ_HOLDING):
+        """Read Modbus device registers. If no connection exists to the
+        destination, one is created and disconnected at the end of the request.
+
+        Parameters:
+
+            addr :
+                Starting Modbus address.
+
+            count :
+                Read length in Modbus registers.
+
+            op :
+                Modbus function code for request.
+
+        Returns:
+
+            Byte string containing register contents.
+        """
+
+        resp = b''
+        read_count = 0
+        read_offset = 0
+
+        async with self._get_lock():
+            local_connect = await self._open()
+
+            try:
+                while (count > 0):
+                    if count > self.max_count:
+                        read_count = self.max_count
+                    else:
+                        read_count = count
+                    data = await self._read(addr + read_offset, read_count, op=op)
+
+                    if data:
+                        resp += data
+                        count -= read_count
+                        read_offset += read_count
+                    else:
+                        break
+            finally:
+                if local_connect:
+                    self.disconnect()
+
+        return resp
+
+    async def _write(self, addr, data):
+
+        write_len = len(data)
+        write_count = int(write_len/2)
+        req = struct.pack('>BBHHB', int(self.slave_id), FUNC_WRITE_MULTIPLE, int(addr), write_count, write_len)
+        if type(data) is not bytes:
+            data = bytes(data, 'latin-1')
+        req += data
+
+        await self._transact(addr, FUNC_WRITE_MULTIPLE, req)
+
+    async def write(self, addr, data):
+        """Write Modbus device registers. If no connection exists to the
+        destination, one is created and disconnected at the end of the request.
+
+        Parameters:
+
+            addr :
+                Starting Modbus address.
+
+            data :
+                Byte string containing register contents.
+        """
+
+        write_offset = 0
+        count = len(data)//2
+
+        async with self._get_lock():
+            local_connect = await self._open()
+
+            try:
+                while (count > 0):
+                    if count > self.max_count:
+                        write_count = self.max_count
+                    else:
+                        write_count = count
+                    start = write_offset * 2
+                    end = (write_offset + write_count) * 2
+                    await self._write(addr + write_offset, data[start:end])
+                    count -= write_count
+                    write_offset += write_count
+            finally:
+                if local_connect:
+                    self.disconnect()
@@ -22,32 +22,64 @@
 """
 
 import os
+import collections
+import math
+import select
 import ssl
 import socket
 import struct
 import serial
 import sys
+import threading
+import time
 
 try:
     import xml.etree.ElementTree as ET
 except:
     import elementtree.ElementTree as ET
 
+import sunspec.core.modbus.crc as crc
 import sunspec.core.modbus.mbmap as mbmap
 
 PARITY_NONE = 'N'
 PARITY_EVEN = 'E'
 
 REQ_COUNT_MAX = 125
+REQ_WRITE_COUNT_MAX = 123
+
+# slave id, function code, byte count, up to 255 data bytes and crc
+RTU_FRAME_MAX_LEN = 260
 
 FUNC_READ_HOLDING = 3
 FUNC_READ_INPUT = 4
 FUNC_WRITE_MULTIPLE = 16
 
+EXCEPT_ILLEGAL_ADDRESS = 2
+EXCEPT_DEVICE_BUSY = 6
+
+# RTU request priority lanes
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+# RTU character length in bits and fixed inter-frame gap above 19200 baud
+RTU_CHAR_BITS = 11
+RTU_FRAME_GAP_MIN = .00175
+
+# minimum adaptive RTU slave response allowance in seconds
+RTU_LATENCY_MIN = .05
+
+# RTU broadcast slave id and default turnaround delay after a broadcast
+BROADCAST_ID = 0
+RTU_BROADCAST_DELAY = .1
+
 TEST_NAME = 'test_name'
 
 modbus_rtu_clients = {}
 
+modbus_tcp_clients = {}
+modbus_tcp_clients_lock = threading.Lock()
+
 class ModbusClientError(Exception):
     pass
 
@@ -55,7 +87,167 @@ class ModbusClientTimeout(ModbusClientError):
     pass
 
 class ModbusClientException(ModbusClientError):
-    pass
+
+    def __init__(self, message, except_code=None):
+        ModbusClientError.__init__(self, message)
+        self.except_code = except_code
+
+class ModbusFuture(object):
+    """Result of a queued Modbus request, completed by the client dispatcher
+    thread.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._result = None
+        self._exception = None
+
+    def done(self):
+        """Return True if the request is complete."""
+
+        return self._event.is_set()
+
+    def set_result(self, result):
+        self._result = result
+        self._event.set()
+
+    def set_exception(self, exception):
+        self._exception = exception
+        self._event.set()
+
+    def exception(self, timeout=None):
+        """Wait for the request to complete and return the exception raised by
+        the request, None if the request succeeded.
+
+        Parameters:
+
+            timeout :
+                Maximum time in seconds to wait. Waits indefinitely if None.
+
+        Raises:
+
+            ModbusClientTimeout: Raised if the request is not complete within
+                the timeout.
+        """
+
+        if not self._event.wait(timeout):
+            raise ModbusClientTimeout('Request not complete')
+        return self._exception
+
+    def result(self, timeout=None):
+        """Wait for the request to complete and return the request result.
+
+        Parameters:
+
+            timeout :
+                Maximum time in seconds to wait. Waits indefinitely if None.
+
+        Returns:
+
+            Request result.
+
+        Raises:
+
+            ModbusClientTimeout: Raised if the request is not complete within
+                the timeout.
+
+            ModbusClientError: Raised if the request failed.
+        """
+
+        exception = self.exception(timeout)
+        if exception is not None:
+            raise exception
+        return self._result
+
+def rtu_frame_gap(baudrate):
+    """Return the RTU 3.5 character inter-frame gap in seconds for a baud
+    rate. The gap is fixed at 1.75 ms above 19200 baud.
+
+    Parameters:
+
+        baudrate :
+            Baud rate.
+    """
+
+    if baudrate > 19200:
+        return RTU_FRAME_GAP_MIN
+    return 3.5 * RTU_CHAR_BITS / baudrate
+
+class SlaveLatency(object):
+    """Response latency statistics of an RTU slave. The latency is the time a
+    slave takes to start responding, excluding the request and response
+    transmission times. The mean and mean deviation are smoothed the same way
+    as the TCP round trip time estimator.
+
+    Attributes:
+
+        mean
+            Smoothed latency in seconds, None until a response is received or
+            after a timeout.
+
+        dev
+            Smoothed mean deviation of the latency in seconds.
+
+        samples
+            Number of responses measured.
+
+        timeouts
+            Number of request timeouts.
+    """
+
+    # smoothing gains for the mean and the deviation
+    alpha = .125
+    beta = .25
+
+    def __init__(self):
+        self.mean = None
+        self.dev = None
+        self.samples = 0
+        self.timeouts = 0
+
+    def update(self, latency):
+        """Add a latency measurement.
+
+        Parameters:
+
+            latency :
+                Measured latency in seconds.
+        """
+
+        if self.mean is None:
+            self.mean = latency
+            self.dev = latency / 2
+        else:
+            self.dev += self.beta * (abs(self.mean - latency) - self.dev)
+            self.mean += self.alpha * (latency - self.mean)
+        self.samples += 1
+
+    def timed_out(self):
+        """Record a request timeout. The statistics are reset so the slave
+        gets the full timeout until it responds again.
+        """
+
+        self.mean = None
+        self.dev = None
+        self.timeouts += 1
+
+    def timeout(self, max_timeout, min_timeout=RTU_LATENCY_MIN):
+        """Return the response allowance for the next request, the smoothed
+        latency plus four deviations bounded by min_timeout and max_timeout.
+
+        Parameters:
+
+            max_timeout :
+                Configured request timeout in seconds, used until the slave
+                latency is known.
+
+            min_timeout :
+                Minimum allowance in seconds.
+        """
+
+        if self.mean is None:
+            return max_timeout
+        return min(max(self.mean + 4 * self.dev, min_timeout), max_timeout)
 
 def modbus_rtu_client(name=None, baudrate=None, parity=None):
 
@@ -87,9 +279,23 @@ def modbus_rtu_client_remove(name=None):
 
 class ModbusClientRTU(object):
     """A Modbus RTU client that multiple devices can use to access devices over
-    the same serial interface. Currently, the implementation does not support
-    concurent device requests so the support of multiple devices must be single
-    threaded.
+    the same serial interface. Requests from any number of devices and threads
+    are queued and sent one at a time by a dispatcher thread owned by the
+    client, with at least the 3.5 character inter-frame gap between the end of
+    a response and the next request. Queued requests are served in priority
+    lane order, :const:`PRIORITY_HIGH` first, and in submit order within a
+    lane. Writes default to the high priority lane so control writes are sent
+    ahead of queued polling reads.
+
+    Request timeouts are adaptive. The response timeout of each request is the
+    request and response transmission time at the client baud rate plus a
+    response allowance learned from the latency of each slave, so a fast
+    slave is not waited on for the timeout configured for a slow one. The
+    configured timeout is used until a slave responds and after a timeout.
+
+    Writes to :const:`BROADCAST_ID` are sent as broadcast requests. Broadcast
+    requests are not answered, the client waits broadcast_delay after the
+    request to let the slaves process it.
 
     Parameters:
 
@@ -137,8 +343,26 @@ class ModbusClientRTU(object):
             Write timeout in seconds. Fractional values are permitted.
 
         devices
-            List of :const:`sunspec.core.modbus.client.ModbusClientDeviceRTU`
-            devices currently using the client.
+            Dictionary of the lists of
+            :const:`sunspec.core.modbus.client.ModbusClientDeviceRTU` devices
+            currently using the client indexed by slave id.
+
+        frame_gap
+            Minimum time in seconds between the end of a response and the next
+            request.
+
+        char_time
+            Transmission time of one character in seconds.
+
+        adaptive_timeout
+            Use the slave latency to compute request timeouts. If False, the
+            configured timeout is used for every request.
+
+        latency
+            Dictionary of :class:`SlaveLatency` objects indexed by slave id.
+
+        broadcast_delay
+            Turnaround delay in seconds after a broadcast request.
     """
 
     def __init__(self, name='/dev/ttyUSB0', baudrate=9600, parity=None):
@@ -149,6 +373,16 @@ class ModbusClientRTU(object):
         self.timeout = .5
         self.write_timeout = .5
         self.devices = {}
+        self.frame = bytearray(RTU_FRAME_MAX_LEN)
+        self.frame_gap = rtu_frame_gap(baudrate)
+        self.char_time = float(RTU_CHAR_BITS) / baudrate
+        self.adaptive_timeout = True
+        self.latency = {}
+        self.broadcast_delay = RTU_BROADCAST_DELAY
+        self.last_frame = 0
+        self.lanes = [collections.deque() for priority in range(PRIORITY_LOW + 1)]
+        self.cond = threading.Condition()
+        self.dispatcher = None
 
         self.open()
 
@@ -180,18 +414,99 @@ class ModbusClientRTU(object):
                 self.serial = None
             raise ModbusClientError('Serial init error: %s' % str(e))
 
+        with self.cond:
+            if self.dispatcher is None:
+                self.dispatcher = threading.Thread(target=self._dispatch, name='modbus-rtu-%s' % (self.name))
+                self.dispatcher.daemon = True
+                self.dispatcher.start()
+
     def close(self):
-        """Close the RTU client serial interface.
+        """Close the RTU client serial interface. Queued requests fail with
+        a :class:`ModbusClientError`.
         """
 
+        with self.cond:
+            dispatcher = self.dispatcher
+            self.dispatcher = None
+            self.cond.notify_all()
+        if dispatcher is not None and dispatcher is not threading.current_thread():
+            dispatcher.join()
+
         try:
             if self.serial is not None:
                 self.serial.close()
         except Exception as e:
             raise ModbusClientError('Serial close error: %s' % str(e))
 
+    def _dispatch(self):
+        me = threading.current_thread()
+        while True:
+            with self.cond:
+                while self.dispatcher is me and not any(self.lanes):
+                    self.cond.wait()
+                if self.dispatcher is not me:
+                    pending = []
+                    for lane in self.lanes:
+                        pending.extend(lane)
+                        lane.clear()
+                    break
+                for lane in self.lanes:
+                    if lane:
+                        future, func, args = lane.popleft()
+                        break
+            try:
+                future.set_result(func(*args))
+            except Exception as e:
+                future.set_exception(e)
+
+        for future, func, args in pending:
+            future.set_exception(ModbusClientError('Client closed: %s' % self.name))
+
+    def submit(self, func, args=(), priority=PRIORITY_NORMAL):
+        """Queue a request to be run by the dispatcher thread. A request
+        submitted from the dispatcher thread, such as from a trace function,
+        is run immediately.
+
+        Parameters:
+
+            func :
+                Function performing the request on the serial interface.
+
+            args :
+                Function arguments.
+
+            priority :
+                Request priority lane. Possible values:
+                    :const:`PRIORITY_HIGH`, :const:`PRIORITY_NORMAL`,
+                    :const:`PRIORITY_LOW`.
+
+        Returns:
+
+            :class:`ModbusFuture` object for the request result.
+        """
+
+        if priority not in (PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW):
+            raise ModbusClientError('Invalid request priority: %s' % (priority))
+
+        future = ModbusFuture()
+        with self.cond:
+            dispatcher = self.dispatcher
+            if dispatcher is None:
+                raise ModbusClientError('Client serial port not open: %s' % self.name)
+            if dispatcher is not threading.current_thread():
+                self.lanes[priority].append((future, func, args))
+                self.cond.notify()
+                return future
+
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
     def add_device(self, slave_id, device):
-        """Add a device to the RTU client.
+        """Add a device to the RTU client. Several devices may be added for
+        the same slave id, the client is in use until all have been removed.
 
         Parameters:
 
@@ -202,84 +517,209 @@ class ModbusClientRTU(object):
                 Device to add to the client.
         """
 
-        self.devices[slave_id] = device
+        self.devices.setdefault(slave_id, []).append(device)
 
-    def remove_device(self, slave_id):
-        """Remove a device from the RTU client.
+    def remove_device(self, slave_id, device=None):
+        """Remove a device from the RTU client. The client is closed and
+        removed once no device uses it.
 
         Parameters:
 
             slave_id :
                 Modbus slave id.
+
+            device :
+                Device to remove. If not given, one of the devices added for
+                the slave id is removed.
         """
 
-        if self.devices.get(slave_id):
-            del self.devices[slave_id]
+        devices = self.devices.get(slave_id)
+        if devices:
+            if device is None:
+                devices.pop()
+            elif device in devices:
+                devices.remove(device)
+            if not devices:
+                del self.devices[slave_id]
 
         # if no more devices using the client interface, close and remove the client
         if len(self.devices) == 0:
             self.close()
             modbus_rtu_client_remove(self.name)
 
-    def _read(self, slave_id, addr, count, op=FUNC_READ_HOLDING, trace_func=None):
-        resp = ''
+    def _trace(self, trace_func, slave_id, direction, addr, frame):
+        s = '{}:{}[addr={}] {}'.format(self.name, str(slave_id), addr, direction)
+        for c in bytearray(frame):
+            s += '%02X' % (c)
+        trace_func(s)
+
+    def response_timeout(self, slave_id, req_len, resp_size, timeout=None):
+        """Return the response timeout of a request.
+
+        Parameters:
+
+            slave_id :
+                Modbus slave id.
+
+            req_len :
+                Request frame length in bytes.
+
+            resp_size :
+                Expected response frame length in bytes.
+
+            timeout :
+                Configured request timeout in seconds. Defaults to the client
+                timeout.
+
+        Returns:
+
+            Time in seconds from the start of the request transmission.
+        """
+
+        if timeout is None:
+            timeout = self.timeout
+        if self.adaptive_timeout:
+            latency = self.latency.get(slave_id)
+            if latency is not None:
+                timeout = latency.timeout(timeout)
+        return (req_len + resp_size) * self.char_time + timeout
+
+    def _recv(self, slave_id, addr, resp_len, deadline, trace_func=None):
+        """Receive a response frame into the client frame buffer.
+
+        Parameters:
+
+            resp_len :
+                Function returning the expected frame length given the first 5
+                bytes of a normal response.
+
+            deadline :
+                Time by which the response must be received. Each read waits
+                for at most the serial port timeout set for the transaction.
+
+        Returns:
+
+            Memoryview of the frame, without the CRC, valid until the next
+            request.
+        """
+
+        frame = self.frame
+        view = memoryview(frame)
+        len_recv = 0
         len_remaining = 5
         len_found = False
         except_code = None
 
-        req = struct.pack('>BBHH', int(slave_id), op, int(addr), int(count))
-        req += struct.pack('>H', computeCRC(req))
+        while len_remaining > 0:
+            if deadline - time.time() <= 0:
+                raise ModbusClientTimeout('Response timeout')
+            len_read = self.serial.readinto(view[len_recv:len_recv + len_remaining])
+            if len_read:
+                len_recv += len_read
+                len_remaining -= len_read
+                if len_found is False and len_recv >= 5:
+                    if not (frame[1] & 0x80):
+                        frame_len = resp_len(frame)
+                        if frame_len > len(frame):
+                            raise ModbusClientError('Modbus response format error')
+                        len_remaining = frame_len - len_recv
+                        len_found = True
+                    else:
+                        except_code = frame[2]
+            else:
+                raise ModbusClientTimeout('Response timeout')
+
+        if trace_func:
+            self._trace(trace_func, slave_id, '<--', addr, view[:len_recv].tobytes())
+
+        resp_crc = (frame[len_recv - 2] << 8) | frame[len_recv - 1]
+        if not checkCRC(view[:len_recv - 2], resp_crc):
+            raise ModbusClientError('CRC error')
+
+        if except_code:
+            raise ModbusClientException('Modbus exception %d' % (except_code), except_code)
+
+        return view[:len_recv - 2]
+
+    def _transaction(self, slave_id, addr, req, resp_len, resp_size, timeout=None, trace_func=None):
 
         if trace_func:
-            s = '{}:{}[addr={}] ->'.format(self.name, str(slave_id), addr)
-            for c in req:
-                s += '%02X' % (ord(c))
-            trace_func(s)
+            self._trace(trace_func, slave_id, '->', addr, req)
+
+        # inter-frame gap since the end of the last response
+        wait = self.last_frame + self.frame_gap - time.time()
+        if wait > 0:
+            time.sleep(min(wait, self.frame_gap))
+
+        latency = self.latency.get(slave_id)
+        if latency is None:
+            latency = self.latency[slave_id] = SlaveLatency()
+
+        # the serial timeout is set once per transaction as each change
+        # reconfigures the port, in whole milliseconds so it rarely changes
+        response_timeout = math.ceil(self.response_timeout(slave_id, len(req), resp_size, timeout) * 1000) / 1000
+        if self.serial.timeout != response_timeout:
+            self.serial.timeout = response_timeout
 
         self.serial.flushInput()
+        start = time.time()
+        deadline = start + response_timeout
         try:
             self.serial.write(req)
         except Exception as e:
+            self.last_frame = time.time()
             raise ModbusClientError('Serial write error: %s' % str(e))
 
-        while len_remaining > 0:
-            c = self.serial.read(len_remaining)
-            if type(c) == bytes and sys.version_info > (3,):
-                temp = ""
-                for i in c:
-                    temp += chr(i)
-                c = temp
-
-            len_read = len(c);
-            if len_read > 0:
-                resp += c
-                len_remaining -= len_read
-                if len_found is False and len(resp) >= 5:
-                    if not (ord(resp[1]) & 0x80):
-                        len_remaining = (ord(resp[2]) + 5) - len(resp)
-                        len_found = True
-                    else:
-                        except_code = ord(resp[2])
-            else:
-                raise ModbusClientTimeout('Response timeout')
+        try:
+            resp = self._recv(slave_id, addr, resp_len, deadline, trace_func=trace_func)
+        except ModbusClientTimeout:
+            latency.timed_out()
+            raise
+        finally:
+            self.last_frame = time.time()
+
+        latency.update(max(self.last_frame - start - (len(req) + len(resp) + 2) * self.char_time, 0))
+        return resp
+
+    def _broadcast(self, addr, req, trace_func=None):
 
         if trace_func:
-            s = '{}:{}[addr={}] <--'.format(self.name, str(slave_id), addr)
-            for c in resp:
-                s += '%02X' % (ord(c))
-            trace_func(s)
+            self._trace(trace_func, BROADCAST_ID, '->', addr, req)
 
-        crc = (ord(resp[-2]) << 8) | ord(resp[-1])
-        if not checkCRC(resp[:-2], crc):
-            raise ModbusClientError('CRC error')
+        wait = self.last_frame + self.frame_gap - time.time()
+        if wait > 0:
+            time.sleep(min(wait, self.frame_gap))
 
-        if except_code:
-            raise ModbusClientException('Modbus exception %d' % (except_code))
+        try:
+            self.serial.write(req)
+        except Exception as e:
+            self.last_frame = time.time()
+            raise ModbusClientError('Serial write error: %s' % str(e))
 
-        return resp[3:-2]
+        # transmission time of the request and the slave turnaround delay
+        time.sleep(len(req) * self.char_time + self.broadcast_delay)
+        self.last_frame = time.time()
+
+    def _read(self, slave_id, addr, count, op=FUNC_READ_HOLDING, trace_func=None, timeout=None):
+
+        req = struct.pack('>BBHH', int(slave_id), op, int(addr), int(count))
+        req += struct.pack('>H', computeCRC(req))
+
+        resp = self._transaction(slave_id, addr, req, lambda frame: frame[2] + 5, count * 2 + 5, timeout=timeout,
+                                 trace_func=trace_func)
+
+        frame = self.frame
+        if frame[0] != int(slave_id) or frame[1] != op:
+            raise ModbusClientError('Modbus response format error')
+        if frame[2] != count * 2:
+            raise ModbusClientError('Modbus response length error')
+
+        return resp[3:]
+
+    def read(self, slave_id, addr, count, op=FUNC_READ_HOLDING, trace_func=None, max_count=REQ_COUNT_MAX,
+             priority=PRIORITY_NORMAL, timeout=None):
+        """Read registers, waiting for the queued request to complete.
 
-    def read(self, slave_id, addr, count, op=FUNC_READ_HOLDING, trace_func=None, max_count=REQ_COUNT_MAX):
-        """
         Parameters:
 
             slave_id :
@@ -302,12 +742,64 @@ class ModbusClientRTU(object):
             max_count :
                 Maximum register count for a single Modbus request.
 
+            priority :
+                Request priority lane.
+
+            timeout :
+                Request timeout in seconds. Defaults to the client timeout.
+
         Returns:
 
             Byte string containing register contents.
         """
 
-        resp = ''
+        return self.submit_read(slave_id, addr, count, op=op, trace_func=trace_func, max_count=max_count,
+                                priority=priority, timeout=timeout).result()
+
+    def submit_read(self, slave_id, addr, count, op=FUNC_READ_HOLDING, trace_func=None, max_count=REQ_COUNT_MAX,
+                    priority=PRIORITY_NORMAL, timeout=None):
+        """Queue a register read. Reads longer than max_count registers are
+        sent as consecutive requests without interleaving other requests.
+
+        Parameters:
+
+            slave_id :
+                Modbus slave id.
+
+            addr :
+                Starting Modbus address.
+
+            count :
+                Read length in Modbus registers.
+
+            op :
+                Modbus function code for request.
+
+            trace_func :
+                Trace function to use for detailed logging.
+
+            max_count :
+                Maximum register count for a single Modbus request.
+
+            priority :
+                Request priority lane.
+
+            timeout :
+                Request timeout in seconds. Defaults to the client timeout.
+
+        Returns:
+
+            :class:`ModbusFuture` object for the byte string containing the
+            register contents.
+        """
+
+        return self.submit(self._read_all, (slave_id, addr, count, op, trace_func, max_count, timeout), priority)
+
+    def _read_all(self, slave_id, addr, count, op=FUNC_READ_HOLDING, trace_func=None, max_count=REQ_COUNT_MAX,
+                  timeout=None):
+
+        resp = bytearray(count * 2)
+        resp_len = 0
         read_count = 0
         read_offset = 0
 
@@ -317,9 +809,11 @@ class ModbusClientRTU(object):
                     read_count = max_count
                 else:
                     read_count = count
-                data = self._read(slave_id, addr + read_offset, read_count, op=op, trace_func=trace_func)
+                data = self._read(slave_id, addr + read_offset, read_count, op=op, trace_func=trace_func,
+                                  timeout=timeout)
                 if data:
-                    resp += data
+                    resp[resp_len:resp_len + len(data)] = data
+                    resp_len += len(data)
                     count -= read_count
                     read_offset += read_count
                 else:
@@ -327,16 +821,10 @@ class ModbusClientRTU(object):
         else:
             raise ModbusClientError('Client serial port not open: %s' % self.name)
 
-        if sys.version_info > (3,):
-            resp = bytes(resp, 'latin-1')
-
-        return resp
+        del resp[resp_len:]
+        return bytes(resp)
 
-    def _write(self, slave_id, addr, data, trace_func=None):
-        resp = ''
-        len_remaining = 5
-        len_found = False
-        except_code = None
+    def _write(self, slave_id, addr, data, trace_func=None, timeout=None):
         func = FUNC_WRITE_MULTIPLE
         len_data = len(data)
         count = int(len_data/2)
@@ -347,68 +835,54 @@ class ModbusClientRTU(object):
                 data = bytes(data, "latin-1")
         req += data
         req += struct.pack('>H', computeCRC(req))
-        if sys.version_info > (3,):
-            temp = ""
-            for i in req:
-                temp += chr(i)
-            req = temp
 
-        if trace_func:
-            s = '{}:{}[addr={}] ->'.format(self.name, str(slave_id), addr)
-            for c in req:
-                s += '%02X' % (ord(c))
-            trace_func(s)
+        if slave_id == BROADCAST_ID:
+            self._broadcast(addr, req, trace_func=trace_func)
+            return
 
-        self.serial.flushInput()
-        try:
-            if sys.version_info > (3,):
-                req = bytes(req, "latin-1")
-            self.serial.write(req)
-        except Exception as e:
-            raise ModbusClientError('Serial write error: %s' % str(e))
+        resp = self._transaction(slave_id, addr, req, lambda frame: 8, 8, timeout=timeout, trace_func=trace_func)
 
-        while len_remaining > 0:
-            c = self.serial.read(len_remaining)
-            if type(c) == bytes and sys.version_info > (3,):
-                temp = ""
-                for i in c:
-                    temp += chr(i)
-                c = temp
-            len_read = len(c);
-            if len_read > 0:
-                resp += c
-                len_remaining -= len_read
-                if len_found is False and len(resp) >= 5:
-                    if not (ord(resp[1]) & 0x80):
-                        len_remaining = 8 - len(resp)
-                        len_found = True
-                    else:
-                        except_code = ord(resp[2])
-            else:
-                raise ModbusClientTimeout('Response timeout')
+        resp_slave_id, resp_func, resp_addr, resp_count = struct.unpack('>BBHH', resp.tobytes())
+        if resp_slave_id != slave_id or resp_func != func or resp_addr != addr or resp_count != count:
+            raise ModbusClientError('Mobus response format error')
 
-        if trace_func:
-            s = '{}:{}[addr={}] <--'.format(self.name, str(slave_id), addr)
-            for c in resp:
-                s += '%02X' % (ord(c))
-            trace_func(s)
+    def write(self, slave_id, addr, data, trace_func=None, max_count=REQ_COUNT_MAX, priority=PRIORITY_HIGH,
+              timeout=None):
+        """Write registers, waiting for the queued request to complete.
 
+        Parameters:
 
-        crc = (ord(resp[-2]) << 8) | ord(resp[-1])
-        if not checkCRC(resp[:-2], crc):
-            raise ModbusClientError('CRC error')
+            slave_id :
+                Modbus slave id.
 
-        if except_code:
-            raise ModbusClientException('Modbus exception: %d' % (except_code))
-        else:
-            if sys.version_info > (3,):
-                resp = bytes(resp, 'latin-1')
-            resp_slave_id, resp_func, resp_addr, resp_count, resp_crc = struct.unpack('>BBHHH', resp)
-            if resp_slave_id != slave_id or resp_func != func or resp_addr != addr or resp_count != count:
-                raise ModbusClientError('Mobus response format error')
+            addr :
+                Starting Modbus address.
+
+            data :
+                Byte string containing register contents.
+
+            trace_func :
+                Trace function to use for detailed logging. No detailed logging
+                is perform is a trace function is not supplied.
+
+            max_count :
+                Maximum register count for a single Modbus request.
 
-    def write(self, slave_id, addr, data, trace_func=None, max_count=REQ_COUNT_MAX):
+            priority :
+                Request priority lane.
+
+            timeout :
+                Request timeout in seconds. Defaults to the client timeout.
         """
+
+        self.submit_write(slave_id, addr, data, trace_func=trace_func, max_count=max_count,
+                          priority=priority, timeout=timeout).result()
+
+    def submit_write(self, slave_id, addr, data, trace_func=None, max_count=REQ_COUNT_MAX, priority=PRIORITY_HIGH,
+                     timeout=None):
+        """Queue a register write. Writes longer than max_count registers are
+        sent as consecutive requests without interleaving other requests.
+
         Parameters:
 
             slave_id :
@@ -421,106 +895,815 @@ class ModbusClientRTU(object):
                 Byte string containing register contents.
 
             trace_func :
-                Trace function to use for detailed logging. No detailed logging
-                is perform is a trace function is not supplied.
+                Trace function to use for detailed logging.
+
+            max_count :
+                Maximum register count for a single Modbus request.
+
+            priority :
+                Request priority lane.
+
+            timeout :
+                Request timeout in seconds. Defaults to the client timeout.
+
+        Returns:
+
+            :class:`ModbusFuture` object for the write completion.
+        """
+
+        return self.submit(self._write_all, (slave_id, addr, data, trace_func, max_count, timeout), priority)
+
+    def _write_all(self, slave_id, addr, data, trace_func=None, max_count=REQ_COUNT_MAX, timeout=None):
+
+        write_count = 0
+        write_offset = 0
+        count = len(data)/2
+
+        if self.serial is not None:
+            while (count > 0):
+                if count > max_count:
+                    write_count = max_count
+                else:
+                    write_count = count
+                start = int(write_offset * 2)
+                end = int((write_offset + write_count) * 2)
+                self._write(slave_id, addr + write_offset, data[start:end],
+                            trace_func=trace_func, timeout=timeout)
+                count -= write_count
+                write_offset += write_count
+        else:
+            raise ModbusClientError('Client serial port not open: %s' % self.name)
+
+class ModbusClientDeviceRTU(object):
+    """Provides access to a Modbus RTU device.
+
+    Parameters:
+
+        slave_id :
+            Modbus slave id.
+
+        name :
+            Name of the serial port such as 'com4' or '/dev/ttyUSB0'.
+
+        baudrate :
+            Baud rate such as 9600 or 19200. Default is 9600 if not specified.
+
+        parity :
+            Parity. Possible values:
+                :const:`sunspec.core.modbus.client.PARITY_NONE`,
+                :const:`sunspec.core.modbus.client.PARITY_EVEN` Defaulted to
+                :const:`PARITY_NONE`.
+
+        timeout :
+            Modbus request timeout in seconds. Fractional seconds are permitted
+            such as .5. The timeout applies to this slave only and is reduced
+            to fit the measured slave latency when the client uses adaptive
+            timeouts.
+
+        ctx :
+            Context variable to be used by the object creator. Not used by the
+            modbus module.
+
+        trace_func :
+            Trace function to use for detailed logging. No detailed logging is
+            perform is a trace function is not supplied.
+
+        max_count :
+            Maximum register count for a single Modbus request.
+
+    Raises:
+
+        ModbusClientError: Raised for any general modbus client error.
+
+        ModbusClientTimeoutError: Raised for a modbus client request timeout.
+
+        ModbusClientException: Raised for an exception response to a modbus
+            client request.
+    """
+
+    def __init__(self, slave_id, name, baudrate=None, parity=None, timeout=None, ctx=None, trace_func=None, max_count=REQ_COUNT_MAX):
+        self.slave_id = slave_id
+        self.name = name
+        self.client = None
+        self.ctx = ctx
+        self.trace_func = trace_func
+        self.max_count = max_count
+        self.timeout = timeout
+
+        self.client = modbus_rtu_client(name, baudrate, parity)
+        if self.client is None:
+            raise ModbusClientError('No modbus rtu client set for device')
+        self.client.add_device(self.slave_id, self)
+
+        if timeout is not None and self.client.serial is not None:
+            self.client.serial.writeTimeout = timeout
+
+    def close(self):
+        """Close the device. Called when device is not longer in use.
+        """
+
+        if self.client:
+            self.client.remove_device(self.slave_id, self)
+
+    def read(self, addr, count, op=FUNC_READ_HOLDING, priority=PRIORITY_NORMAL):
+        """Read Modbus device registers.
+
+        Parameters:
+
+            addr :
+                Starting Modbus address.
+
+            count :
+                Read length in Modbus registers.
+
+            op :
+                Modbus function code for request.
+
+            priority :
+                Request priority lane.
+
+        Returns:
+
+            Byte string containing register contents.
+        """
+
+        return self.client.read(self.slave_id, addr, count, op=op, trace_func=self.trace_func, max_count=self.max_count,
+                                priority=priority, timeout=self.timeout)
+
+    def submit_read(self, addr, count, op=FUNC_READ_HOLDING, priority=PRIORITY_NORMAL):
+        """Queue a read of Modbus device registers.
+
+        Parameters:
+
+            addr :
+                Starting Modbus address.
+
+            count :
+                Read length in Modbus registers.
+
+            op :
+                Modbus function code for request.
+
+            priority :
+                Request priority lane.
+
+        Returns:
+
+            :class:`ModbusFuture` object for the byte string containing the
+            register contents.
+        """
+
+        return self.client.submit_read(self.slave_id, addr, count, op=op, trace_func=self.trace_func,
+                                       max_count=self.max_count, priority=priority, timeout=self.timeout)
+
+    def write(self, addr, data, priority=PRIORITY_HIGH):
+        """Write Modbus device registers.
+
+        Parameters:
+
+            addr :
+                Starting Modbus address.
+
+            count :
+                Byte string containing register contents.
+
+            priority :
+                Request priority lane.
+        """
+
+        return self.client.write(self.slave_id, addr, data, trace_func=self.trace_func, max_count=self.max_count,
+                                 priority=priority, timeout=self.timeout)
+
+    def submit_write(self, addr, data, priority=PRIORITY_HIGH):
+        """Queue a write of Modbus device registers.
+
+        Parameters:
+
+            addr :
+                Starting Modbus address.
+
+            data :
+                Byte string containing register contents.
+
+            priority :
+                Request priority lane.
+
+        Returns:
+
+            :class:`ModbusFuture` object for the write completion.
+        """
+
+        return self.client.submit_write(self.slave_id, addr, data, trace_func=self.trace_func,
+                                        max_count=self.max_count, priority=priority, timeout=self.timeout)
+
+TCP_HDR_LEN = 6
+TCP_RESP_MIN_LEN = 3
+TCP_HDR_O_LEN = 4
+TCP_READ_REQ_LEN = 6
+TCP_WRITE_MULT_REQ_LEN = 7
+# MBAP header, slave id, function code, byte count and up to 255 data bytes
+TCP_FRAME_MAX_LEN = 264
+
+TCP_DEFAULT_PORT = 502
+TCP_DEFAULT_TIMEOUT = 2
+TCP_DEFAULT_PIPELINE_WINDOW = 4
+TCP_DEFAULT_IDLE_TIMEOUT = 30
+
+def modbus_tcp_client(ipaddr, ipport=None, tls=False, cafile=None, certfile=None, keyfile=None, tls_verify=True):
+
+    global modbus_tcp_clients
+
+    if ipport is None:
+        ipport = TCP_DEFAULT_PORT
+
+    key = (ipaddr, ipport, tls, cafile, certfile, keyfile, tls_verify)
+    with modbus_tcp_clients_lock:
+        client = modbus_tcp_clients.get(key)
+        if client is None:
+            client = ModbusClientTCP(ipaddr, ipport, tls, cafile, certfile, keyfile, tls_verify)
+            modbus_tcp_clients[key] = client
+
+    return client
+
+def modbus_tcp_client_remove(client):
+
+    global modbus_tcp_clients
+
+    with modbus_tcp_clients_lock:
+        if modbus_tcp_clients.get(client.key) is client:
+            del modbus_tcp_clients[client.key]
+
+class ModbusTCPConnection(object):
+    """A persistent TCP connection. Users acquire exclusive use of the
+    connection for the duration of a request so requests from different
+    devices and threads are serialized on the connection.
+
+    The connection is established on first use and kept open between
+    requests. Before each use it is reestablished if it has been idle longer
+    than the idle timeout or the destination has closed it.
+
+    Parameters:
+
+        ipaddr :
+            IP address string.
+
+        ipport :
+            IP port.
+
+        tls :
+            Use TLS (Modbus/TCP Security).
+
+        cafile :
+            Path to certificate authority (CA) certificate to use for
+            validating server certificates. Only used if `tls=True`.
+
+        certfile :
+            Path to client TLS certificate to use for client authentication.
+            Only used if `tls=True`.
+
+        keyfile :
+            Path to client TLS key to use for client authentication. Only
+            used if `tls=True`.
+
+        tls_verify :
+            Verify the server TLS certificate. Only used if `tls=True`.
+
+        test :
+            Use test socket. If True use the fake socket module for network
+            communications.
+
+    Attributes:
+
+        socket
+            Socket used for network connection. If no connection active, value
+            is None.
+
+        idle_timeout
+            Time in seconds the connection may be idle before it is
+            reestablished on the next use.
+
+        last_used
+            Time the connection was last released.
+    """
+
+    def __init__(self, ipaddr, ipport=TCP_DEFAULT_PORT, tls=False, cafile=None, certfile=None, keyfile=None,
+                 tls_verify=True, test=False):
+        self.ipaddr = ipaddr
+        self.ipport = ipport
+        self.tls = tls
+        self.cafile = cafile
+        self.certfile = certfile
+        self.keyfile = keyfile
+        self.tls_verify = tls_verify
+        self.test = test
+        self.socket = None
+        self.idle_timeout = TCP_DEFAULT_IDLE_TIMEOUT
+        self.last_used = None
+        self.lock = threading.RLock()
+
+    def connect(self, timeout=None):
+        """Connect to TCP destination.
+
+        Parameters:
+
+            timeout :
+                Connection timeout in seconds.
+        """
+
+        self.close()
+
+        if timeout is None:
+            timeout = TCP_DEFAULT_TIMEOUT
+
+        if self.test:
+            import sunspec.core.test.fake.socket as fake
+            self.socket = fake.socket()
+            return
+
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.settimeout(timeout)
+
+            if self.tls:
+                context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=self.cafile)
+                context.load_cert_chain(certfile=self.certfile, keyfile=self.keyfile)
+                context.check_hostname = self.tls_verify
+
+                sock = context.wrap_socket(sock, server_side=False, server_hostname=self.ipaddr)
+
+            sock.connect((self.ipaddr, self.ipport))
+            self.socket = sock
+        except Exception as e:
+            raise ModbusClientError('Connection error: %s' % str(e))
+
+    def close(self):
+        """Close the connection.
+        """
+
+        try:
+            if self.socket:
+                self.socket.close()
+        except Exception:
+            pass
+        self.socket = None
+
+    def healthy(self):
+        """Check that the connection is still usable. No data is expected
+        between requests, so a readable socket means the destination has
+        closed the connection or sent a stale response.
+        """
+
+        if self.socket is None:
+            return False
+        if self.test:
+            return True
+        if self.idle_timeout is not None and self.last_used is not None and \
+                time.time() - self.last_used > self.idle_timeout:
+            return False
+        try:
+            readable, writable, errored = select.select([self.socket], [], [], 0)
+        except Exception:
+            return False
+        return not readable
+
+    def acquire(self, timeout=None):
+        """Acquire exclusive use of the connection, connecting if required.
+
+        Parameters:
+
+            timeout :
+                Request timeout in seconds for the socket.
+
+        Returns:
+
+            The connected socket.
+        """
+
+        self.lock.acquire()
+        try:
+            if not self.healthy():
+                self.connect(timeout)
+            elif timeout is not None:
+                self.socket.settimeout(timeout)
+        except Exception:
+            self.lock.release()
+            raise
+
+        return self.socket
+
+    def release(self, error=False):
+        """Release the connection acquired with acquire().
+
+        Parameters:
+
+            error :
+                If True, the connection is in an unknown state and is closed.
+        """
+
+        if error:
+            self.close()
+        self.last_used = time.time()
+        self.lock.release()
+
+class ModbusClientTCP(object):
+    """A Modbus TCP client that multiple devices can use to access the devices
+    behind the same TCP destination, such as the slave ids of a Modbus TCP
+    gateway, over a single connection. Requests from the devices are
+    serialized on the connection or, if pipelining is enabled, sent with
+    unique transaction ids without waiting for each response.
+
+    Shared clients are obtained with
+    :const:`sunspec.core.modbus.client.modbus_tcp_client` which returns the
+    same client for all devices with the same destination and TLS settings.
+
+    Parameters:
+
+        ipaddr :
+            IP address string.
+
+        ipport :
+            IP port.
+
+        tls :
+            Use TLS (Modbus/TCP Security). Defaults to `tls=False`.
+
+        cafile :
+            Path to certificate authority (CA) certificate to use for
+            validating server certificates. Only used if `tls=True`.
+
+        certfile :
+            Path to client TLS certificate to use for client authentication.
+            Only used if `tls=True`.
+
+        keyfile :
+            Path to client TLS key to use for client authentication. Only
+            used if `tls=True`.
+
+        tls_verify :
+            Verify the server TLS certificate. Only used if `tls=True`.
+
+        test :
+            Use test socket. If True use the fake socket module for network
+            communications.
+
+    Raises:
+
+        ModbusClientError: Raised for any general modbus client error.
+
+        ModbusClientTimeoutError: Raised for a modbus client request timeout.
+
+        ModbusClientException: Raised for an exception response to a modbus
+            client request.
+
+    Attributes:
+
+        ipaddr
+            Destination IP address string.
+
+        ipport
+            Destination IP port.
+
+        key
+            Key of the client in the shared client table.
+
+        connection
+            The :const:`ModbusTCPConnection` used by the client.
+
+        devices
+            Dictionary of the lists of devices currently using the client
+            indexed by slave id.
+
+        pipeline
+            Pipeline multi-request reads. Set to False if the destination
+            rejects pipelined requests: it responds busy, does not echo the
+            transaction ids or drops the connection.
+
+        pipeline_window
+            Maximum number of outstanding requests when pipelining.
+
+        outstanding
+            Number of requests sent in the current transaction whose
+            responses have not been received.
+    """
+
+    def __init__(self, ipaddr, ipport=TCP_DEFAULT_PORT, tls=False, cafile=None, certfile=None, keyfile=None,
+                 tls_verify=True, test=False):
+        self.ipaddr = ipaddr
+        self.ipport = ipport
+        self.key = (ipaddr, ipport, tls, cafile, certfile, keyfile, tls_verify)
+        self.connection = ModbusTCPConnection(ipaddr, ipport, tls, cafile, certfile, keyfile, tls_verify, test)
+        self.devices = {}
+        self.frame = bytearray(TCP_FRAME_MAX_LEN)
+        self.pipeline = False
+        self.pipeline_window = TCP_DEFAULT_PIPELINE_WINDOW
+        self.transaction_id = 0
+        self.outstanding = 0
+
+    def connect(self, timeout=None):
+        """Connect to TCP destination.
+
+        Parameters:
+
+            timeout :
+                Connection timeout in seconds.
+        """
+
+        with self.connection.lock:
+            self.connection.connect(timeout)
+
+    def close(self):
+        """Close the connection to the TCP destination.
+        """
+
+        with self.connection.lock:
+            self.connection.close()
+
+    def add_device(self, slave_id, device):
+        """Add a device to the TCP client. Several devices may be added for
+        the same slave id, the client is in use until all have been removed.
+
+        Parameters:
+
+            slave_id :
+                Modbus slave id.
+
+            device :
+                Device to add to the client.
+        """
+
+        self.devices.setdefault(slave_id, []).append(device)
+
+    def remove_device(self, slave_id, device=None):
+        """Remove a device from the TCP client. The client is closed and
+        removed once no device uses it.
+
+        Parameters:
+
+            slave_id :
+                Modbus slave id.
+
+            device :
+                Device to remove. If not given, one of the devices added for
+                the slave id is removed.
+        """
+
+        devices = self.devices.get(slave_id)
+        if devices:
+            if device is None:
+                devices.pop()
+            elif device in devices:
+                devices.remove(device)
+            if not devices:
+                del self.devices[slave_id]
+
+        # if no more devices using the client, close and remove the client
+        if len(self.devices) == 0:
+            self.close()
+            modbus_tcp_client_remove(self)
+
+    def _next_transaction_id(self):
+        # 0 is left for destinations that do not echo transaction ids
+        self.transaction_id = (self.transaction_id % 0xffff) + 1
+        return self.transaction_id
+
+    def _trace(self, trace_func, slave_id, direction, addr, frame):
+        s = '{}:{}:{}[addr={}] {}'.format(self.ipaddr, str(self.ipport), str(slave_id), addr, direction)
+        for c in bytearray(frame):
+            s += '%02X' % (c)
+        trace_func(s)
+
+    def _send(self, slave_id, addr, req, trace_func=None):
+
+        if trace_func:
+            self._trace(trace_func, slave_id, '->', addr, req)
+
+        self.outstanding += 1
+        try:
+            self.connection.socket.sendall(req)
+        except Exception as e:
+            raise ModbusClientError('Socket write error: %s' % str(e))
+
+    def _recv(self, slave_id, addr, trace_func=None):
+        """Receive a single response frame into the client frame buffer.
+        Exception responses are returned like any other response, see
+        _check().
+
+        Returns:
+
+            Tuple of the transaction id and a memoryview of the response PDU
+            valid until the next request.
+        """
+
+        frame = self.frame
+        view = memoryview(frame)
+        len_recv = 0
+        len_remaining = TCP_HDR_LEN + TCP_RESP_MIN_LEN
+        len_found = False
+
+        while len_remaining > 0:
+            try:
+                len_read = self.connection.socket.recv_into(view[len_recv:len_recv + len_remaining])
+            except socket.timeout:
+                raise ModbusClientTimeout('Response timeout')
+            except Exception as e:
+                raise ModbusClientError('Socket read error: %s' % str(e))
+            if len_read:
+                len_recv += len_read
+                len_remaining -= len_read
+                if len_found is False and len_recv >= TCP_HDR_LEN + TCP_RESP_MIN_LEN:
+                    frame_len = TCP_HDR_LEN + ((frame[TCP_HDR_O_LEN] << 8) | frame[TCP_HDR_O_LEN + 1])
+                    if frame_len > len(frame):
+                        raise ModbusClientError('Modbus response format error')
+                    len_remaining = frame_len - len_recv
+                    len_found = True
+            else:
+                raise ModbusClientError('Connection closed by device')
+
+        self.outstanding -= 1
+        if trace_func:
+            self._trace(trace_func, slave_id, '<--', addr, view[:len_recv].tobytes())
+
+        tid = (frame[0] << 8) | frame[1]
+        return tid, view[TCP_HDR_LEN:len_recv]
 
-            max_count :
-                Maximum register count for a single Modbus request.
-        """
+    def _check(self, func, count=None):
+        """Check the response in the client frame buffer.
 
-        write_count = 0
-        write_offset = 0
-        count = len(data)/2
+        Parameters:
 
-        if self.serial is not None:
-            while (count > 0):
-                if count > max_count:
-                    write_count = max_count
-                else:
-                    write_count = count
-                start = int(write_offset * 2)
-                end = int((write_offset + write_count) * 2)
-                self._write(slave_id, addr + write_offset, data[start:end],
-                            trace_func=trace_func)
-                count -= write_count
-                write_offset += write_count
-        else:
-            raise ModbusClientError('Client serial port not open: %s' % self.name)
+            func :
+                Function code of the request.
 
-class ModbusClientDeviceRTU(object):
-    """Provides access to a Modbus RTU device.
+            count :
+                Register count of a read request.
 
-    Parameters:
+        Raises:
 
-        slave_id :
-            Modbus slave id.
+            ModbusClientException: Raised for an exception response.
 
-        name :
-            Name of the serial port such as 'com4' or '/dev/ttyUSB0'.
+            ModbusClientError: Raised if the function code or, for reads, the
+                byte count does not match the request.
+        """
 
-        baudrate :
-            Baud rate such as 9600 or 19200. Default is 9600 if not specified.
+        frame = self.frame
+        resp_func = frame[TCP_HDR_LEN + 1]
+        if resp_func == func | 0x80:
+            except_code = frame[TCP_HDR_LEN + 2]
+            raise ModbusClientException('Modbus exception %d' % (except_code), except_code)
+        if resp_func != func:
+            raise ModbusClientError('Modbus response format error')
+        if count is not None:
+            pdu_len = ((frame[TCP_HDR_O_LEN] << 8) | frame[TCP_HDR_O_LEN + 1]) - 3
+            if frame[TCP_HDR_LEN + 2] != count * 2 or pdu_len != count * 2:
+                raise ModbusClientError('Modbus response length error')
+
+    def _recv_reply(self, slave_id, addr, tid, func, count=None, trace_func=None):
+        # a destination that does not echo transaction ids replies with 0
+        resp_tid, pdu = self._recv(slave_id, addr, trace_func)
+        if resp_tid != tid and resp_tid != 0:
+            raise ModbusClientError('Unexpected transaction id in response: %d' % (resp_tid))
+        self._check(func, count)
+        return pdu
+
+    def _transaction(self, timeout, func, *args, **kwargs):
+        """Run a request holding the connection. If the connection turns out
+        to have been dropped, it is reestablished and the request is sent
+        once more.
+        """
 
-        parity :
-            Parity. Possible values:
-                :const:`sunspec.core.modbus.client.PARITY_NONE`,
-                :const:`sunspec.core.modbus.client.PARITY_EVEN` Defaulted to
-                :const:`PARITY_NONE`.
+        attempts = 2
+        while True:
+            attempts -= 1
+            self.connection.acquire(timeout)
+            self.outstanding = 0
+            error = True
+            try:
+                result = func(*args, **kwargs)
+                error = False
+                return result
+            except ModbusClientException:
+                # the connection, shared by all slaves, is only still in sync
+                # after an exception response if no other response is in
+                # flight, otherwise it is reset
+                error = self.outstanding != 0
+                raise
+            except ModbusClientTimeout:
+                raise
+            except ModbusClientError:
+                if attempts <= 0:
+                    raise
+            finally:
+                self.connection.release(error)
 
-        timeout :
-            Modbus request timeout in seconds. Fractional seconds are permitted
-            such as .5.
+    def _read(self, slave_id, addr, count, op=FUNC_READ_HOLDING, trace_func=None):
 
-        ctx :
-            Context variable to be used by the object creator. Not used by the
-            modbus module.
+        tid = self._next_transaction_id()
+        req = struct.pack('>HHHBBHH', tid, 0, TCP_READ_REQ_LEN, int(slave_id), op, int(addr), int(count))
+        self._send(slave_id, addr, req, trace_func)
 
-        trace_func :
-            Trace function to use for detailed logging. No detailed logging is
-            perform is a trace function is not supplied.
+        pdu = self._recv_reply(slave_id, addr, tid, op, count, trace_func)
 
-        max_count :
-            Maximum register count for a single Modbus request.
+        return pdu[3:].tobytes()
 
-    Raises:
+    def _read_pipelined(self, requests, op=FUNC_READ_HOLDING, trace_func=None):
+        """Read requests with up to pipeline_window requests outstanding at a
+        time. Responses are matched to requests by transaction id.
+        """
 
-        ModbusClientError: Raised for any general modbus client error.
+        results = [None] * len(requests)
+        pending = {}
+        next_index = 0
+        exception = None
+
+        while next_index < len(requests) or pending:
+            # no more requests are sent after an exception response
+            while exception is None and next_index < len(requests) and len(pending) < self.pipeline_window:
+                slave_id, addr, count = requests[next_index]
+                tid = self._next_transaction_id()
+                req = struct.pack('>HHHBBHH', tid, 0, TCP_READ_REQ_LEN, int(slave_id), op, int(addr), int(count))
+                self._send(slave_id, addr, req, trace_func)
+                pending[tid] = next_index
+                next_index += 1
+            if not pending:
+                break
+
+            tid, pdu = self._recv(None, None, trace_func)
+            index = pending.pop(tid, None)
+            if index is None:
+                raise ModbusClientError('Unexpected transaction id in response: %d' % (tid))
+            try:
+                self._check(op, requests[index][2])
+            except ModbusClientException as e:
+                # drain the outstanding responses so the connection stays in
+                # sync, any other error closes the connection
+                if exception is None:
+                    exception = e
+                continue
+            results[index] = pdu[3:].tobytes()
+
+        if exception is not None:
+            raise exception
+        return results
+
+    def _read_requests(self, requests, op=FUNC_READ_HOLDING, trace_func=None, timeout=None):
+
+        if self.pipeline and len(requests) > 1:
+            try:
+                return self._read_pipelined(requests, op=op, trace_func=trace_func)
+            except ModbusClientError as e:
+                # a destination that rejects concurrent requests refuses them
+                # as busy, does not echo the transaction ids or drops the
+                # connection - fall back to one request at a time from now on.
+                # After a timeout only this call falls back. Either way the
+                # requests are sent again on a fresh connection.
+                if isinstance(e, ModbusClientException) and e.except_code != EXCEPT_DEVICE_BUSY:
+                    raise
+                if not isinstance(e, ModbusClientTimeout):
+                    self.pipeline = False
+                self.connection.connect(timeout)
+
+        results = []
+        for slave_id, addr, count in requests:
+            results.append(self._read(slave_id, addr, count, op=op, trace_func=trace_func))
+        return results
+
+    def read_requests(self, requests, op=FUNC_READ_HOLDING, trace_func=None, timeout=None):
+        """Read several register ranges, possibly from different slave ids.
+        If pipelining is enabled, the requests are pipelined on the
+        connection.
 
-        ModbusClientTimeoutError: Raised for a modbus client request timeout.
+        Parameters:
 
-        ModbusClientException: Raised for an exception response to a modbus
-            client request.
-    """
+            requests :
+                List of (slave id, address, count) tuples. Each count must not
+                exceed the maximum register count for a single Modbus request.
 
-    def __init__(self, slave_id, name, baudrate=None, parity=None, timeout=None, ctx=None, trace_func=None, max_count=REQ_COUNT_MAX):
-        self.slave_id = slave_id
-        self.name = name
-        self.client = None
-        self.ctx = ctx
-        self.trace_func = trace_func
-        self.max_count = max_count
+            op :
+                Modbus function code for request.
 
-        self.client = modbus_rtu_client(name, baudrate, parity)
-        if self.client is None:
-            raise ModbusClientError('No modbus rtu client set for device')
-        self.client.add_device(self.slave_id, self)
+            trace_func :
+                Trace function to use for detailed logging.
 
-        if timeout is not None and self.client.serial is not None:
-            self.client.serial.timeout = timeout
-            self.client.serial.writeTimeout = timeout
+            timeout :
+                Request timeout in seconds.
 
-    def close(self):
-        """Close the device. Called when device is not longer in use.
+        Returns:
+
+            List of byte strings containing the register contents of each
+            request.
         """
 
-        if self.client:
-            self.client.remove_device(self.slave_id)
+        return self._transaction(timeout, self._read_requests, requests, op, trace_func, timeout)
 
-    def read(self, addr, count, op=FUNC_READ_HOLDING):
+    def read(self, slave_id, addr, count, op=FUNC_READ_HOLDING, trace_func=None, max_count=REQ_COUNT_MAX,
+             timeout=None):
         """Read Modbus device registers.
 
         Parameters:
 
+            slave_id :
+                Modbus slave id.
+
             addr :
                 Starting Modbus address.
 
@@ -530,35 +1713,95 @@ class ModbusClientDeviceRTU(object):
             op :
                 Modbus function code for request.
 
+            trace_func :
+                Trace function to use for detailed logging.
+
+            max_count :
+                Maximum register count for a single Modbus request.
+
+            timeout :
+                Request timeout in seconds.
+
         Returns:
 
             Byte string containing register contents.
         """
 
-        return self.client.read(self.slave_id, addr, count, op=op, trace_func=self.trace_func, max_count=self.max_count)
+        requests = []
+        read_offset = 0
 
-    def write(self, addr, data):
+        while (count > 0):
+            if count > max_count:
+                read_count = max_count
+            else:
+                read_count = count
+            requests.append((slave_id, addr + read_offset, read_count))
+            count -= read_count
+            read_offset += read_count
+
+        return b''.join(self.read_requests(requests, op=op, trace_func=trace_func, timeout=timeout))
+
+    def _write(self, slave_id, addr, data, trace_func=None):
+
+        func = FUNC_WRITE_MULTIPLE
+
+        write_len = len(data)
+        write_count = int(write_len/2)
+        tid = self._next_transaction_id()
+        req = struct.pack('>HHHBBHHB', tid, 0, TCP_WRITE_MULT_REQ_LEN + write_len, int(slave_id), func, int(addr),
+                          write_count, write_len)
+        if sys.version_info > (3,):
+            if type(data) is not bytes:
+                data = bytes(data, "latin-1")
+        req += data
+
+        self._send(slave_id, addr, req, trace_func)
+
+        self._recv_reply(slave_id, addr, tid, func, trace_func=trace_func)
+
+    def _write_all(self, slave_id, addr, data, trace_func=None, max_count=REQ_COUNT_MAX):
+
+        write_count = 0
+        write_offset = 0
+        count = len(data)/2
+
+        while (count > 0):
+            if count > max_count:
+                write_count = max_count
+            else:
+                write_count = count
+            start = int(write_offset * 2)
+            end = int((write_offset + write_count) * 2)
+            self._write(slave_id, addr + write_offset, data[start:end], trace_func=trace_func)
+            count -= write_count
+            write_offset += write_count
+
+    def write(self, slave_id, addr, data, trace_func=None, max_count=REQ_COUNT_MAX, timeout=None):
         """Write Modbus device registers.
 
         Parameters:
 
+            slave_id :
+                Modbus slave id.
+
             addr :
                 Starting Modbus address.
 
-            count :
+            data :
                 Byte string containing register contents.
-        """
 
-        return self.client.write(self.slave_id, addr, data, trace_func=self.trace_func, max_count=self.max_count)
+            trace_func :
+                Trace function to use for detailed logging.
 
-TCP_HDR_LEN = 6
-TCP_RESP_MIN_LEN = 3
-TCP_HDR_O_LEN = 4
-TCP_READ_REQ_LEN = 6
-TCP_WRITE_MULT_REQ_LEN = 7
+            max_count :
+                Maximum register count for a single Modbus request.
 
-TCP_DEFAULT_PORT = 502
-TCP_DEFAULT_TIMEOUT = 2
+            timeout :
+                Request timeout in seconds.
+        """
+
+        return self._transaction(timeout, self._write_all, slave_id, addr, data, trace_func=trace_func,
+                                 max_count=max_count)
 
 class ModbusClientDeviceTCP(object):
     """Provides access to a Modbus TCP device.
@@ -608,14 +1851,32 @@ class ModbusClientDeviceTCP(object):
         max_count :
             Maximum register count for a single Modbus request.
 
+        pipeline :
+            Pipeline multi-request reads, sending requests with unique
+            transaction ids without waiting for each response. Pipelining is
+            disabled automatically if the device does not support it. For
+            pooled devices the setting applies to all devices sharing the
+            client. Defaults to `pipeline=False`.
+
+        pipeline_window :
+            Maximum number of outstanding requests when pipelining.
+
+        pool :
+            Use the shared :const:`ModbusClientTCP` client for the destination
+            and TLS settings, so all pooled devices behind the same
+            destination, such as the slave ids of a gateway, use a single
+            connection. The connection is kept open between requests and
+            reestablished if it is dropped. Defaults to `pool=False`.
+
         test :
             Use test socket. If True use the fake socket module for network
-            communications.
+            communications. Can not be combined with `pool=True`.
 
 
     Raises:
 
-        ModbusClientError: Raised for any general modbus client error.
+        ModbusClientError: Raised for any general modbus client error, and if
+            both `pool` and `test` are set.
 
         ModbusClientTimeoutError: Raised for a modbus client request timeout.
 
@@ -641,6 +1902,10 @@ class ModbusClientDeviceTCP(object):
             Context variable to be used by the object creator. Not used by the
             modbus module.
 
+        client
+            The :const:`ModbusClientTCP` used to access the device. Shared
+            with other devices if the device is pooled.
+
         socket
             Socket used for network connection. If no connection active, value
             is None.
@@ -669,15 +1934,25 @@ class ModbusClientDeviceTCP(object):
 
         max_count
             Maximum register count for a single Modbus request.
+
+        pipeline
+            Pipeline multi-request reads. Set to False if the device rejects
+            pipelined requests.
+
+        pipeline_window
+            Maximum number of outstanding requests when pipelining.
+
+        pool
+            The device uses the shared client for the destination.
     """
 
-    def __init__(self, slave_id, ipaddr, ipport=502, timeout=None, ctx=None, trace_func=None, tls=False, cafile=None, certfile=None, keyfile=None, insecure_skip_tls_verify=False, max_count=REQ_COUNT_MAX, test=False):
+    def __init__(self, slave_id, ipaddr, ipport=502, timeout=None, ctx=None, trace_func=None, tls=False, cafile=None, certfile=None, keyfile=None, insecure_skip_tls_verify=False, max_count=REQ_COUNT_MAX, test=False,
+                 pipeline=False, pipeline_window=TCP_DEFAULT_PIPELINE_WINDOW, pool=False):
         self.slave_id = slave_id
         self.ipaddr = ipaddr
         self.ipport = ipport
         self.timeout = timeout
         self.ctx = ctx
-        self.socket = None
         self.trace_func = trace_func
         self.tls = tls
         self.cafile = cafile
@@ -685,22 +1960,57 @@ class ModbusClientDeviceTCP(object):
         self.keyfile = keyfile
         self.tls_verify = not insecure_skip_tls_verify
         self.max_count = max_count
+        self.pool = pool
 
         if ipport is None:
             self.ipport = TCP_DEFAULT_PORT
         if timeout is None:
             self.timeout = TCP_DEFAULT_TIMEOUT
 
+        if pool and test:
+            raise ModbusClientError('Pooled devices can not use the test socket')
+
+        if pool:
+            self.client = modbus_tcp_client(self.ipaddr, self.ipport, tls, cafile, certfile, keyfile, self.tls_verify)
+        else:
+            self.client = ModbusClientTCP(self.ipaddr, self.ipport, tls, cafile, certfile, keyfile, self.tls_verify,
+                                          test=test)
+        self.client.add_device(self.slave_id, self)
+
+        if pipeline:
+            self.client.pipeline = True
+            self.client.pipeline_window = pipeline_window
+
         if test:
-            import sunspec.core.test.fake.socket as fake
-            self.socket = fake.socket()
+            self.client.connect()
+
+    @property
+    def socket(self):
+        return self.client.connection.socket
+
+    @property
+    def pipeline(self):
+        return self.client.pipeline
+
+    @pipeline.setter
+    def pipeline(self, value):
+        self.client.pipeline = value
+
+    @property
+    def pipeline_window(self):
+        return self.client.pipeline_window
+
+    @pipeline_window.setter
+    def pipeline_window(self, value):
+        self.client.pipeline_window = value
 
     def close(self):
 
-        self.disconnect()
+        self.client.remove_device(self.slave_id, self)
 
     def connect(self, timeout=None):
-        """Connect to TCP destination.
+        """Connect to TCP destination. Pooled devices connect on demand so
+        this has no effect for them.
 
         Parameters:
 
@@ -708,93 +2018,52 @@ class ModbusClientDeviceTCP(object):
                 Connection timeout in seconds.
         """
 
-        if self.socket:
-            self.disconnect()
+        if self.pool:
+            return
 
         if timeout is None:
             timeout = self.timeout
 
-        try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.settimeout(timeout)
-
-            if self.tls:
-                context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cafile=self.cafile)
-                context.load_cert_chain(certfile=self.certfile, keyfile=self.keyfile)
-                context.check_hostname = self.tls_verify
-
-                self.socket = context.wrap_socket(self.socket, server_side=False, server_hostname=self.ipaddr)
-
-            self.socket.connect((self.ipaddr, self.ipport))
-        except Exception as e:
-            raise ModbusClientError('Connection error: %s' % str(e))
+        self.client.connect(timeout)
 
     def disconnect(self):
-        """Disconnect from TCP destination.
+        """Disconnect from TCP destination. The connection of a pooled device
+        stays open for use by the next request.
         """
 
-        try:
-            if self.socket:
-                self.socket.close()
-            self.socket = None
-        except Exception:
-            pass
-
-    def _read(self, addr, count, op=FUNC_READ_HOLDING):
+        if self.pool:
+            return
 
-        resp = b''
-        len_remaining = TCP_HDR_LEN + TCP_RESP_MIN_LEN
-        len_found = False
-        except_code = None
+        self.client.close()
 
-        req = struct.pack('>HHHBBHH', 0, 0, TCP_READ_REQ_LEN, int(self.slave_id), op, int(addr), int(count))
+    def read_spans(self, spans, op=FUNC_READ_HOLDING):
+        """Read several register ranges. If pipelining is enabled, the requests
+        are pipelined on the connection. If no connection exists to the
+        destination, one is created and disconnected at the end of the request.
 
-        if self.trace_func:
-            s = '{}:{}:{}[addr={}] ->'.format(self.ipaddr, str(self.ipport), str(self.slave_id), addr)
-            for c in req:
-                s += '%02X' % (ord(c))
-            self.trace_func(s)
+        Parameters:
 
-        try:
-            self.socket.sendall(req)
-        except Exception as e:
-            raise ModbusClientError('Socket write error: %s' % str(e))
+            spans :
+                List of (address, count) tuples. Each count must not exceed
+                the maximum register count for a single Modbus request.
 
-        while len_remaining > 0:
-            c = self.socket.recv(len_remaining)
-            # print('c = {0}'.format(c))
-            len_read = len(c);
-            if len_read > 0:
-                resp += c
-                len_remaining -= len_read
-                if len_found is False and len(resp) >= TCP_HDR_LEN + TCP_RESP_MIN_LEN:
-                    data_len = struct.unpack('>H', resp[TCP_HDR_O_LEN:TCP_HDR_O_LEN + 2])
-                    len_remaining = data_len[0] - (len(resp) - TCP_HDR_LEN)
-            else:
-                raise ModbusClientError('Response timeout')
+            op :
+                Modbus function code for request.
 
-        if sys.version_info > (3,):
-            temp = ""
-            for i in resp:
-                temp += chr(i)
-            resp = temp
-
-        if not (ord(resp[TCP_HDR_LEN + 1]) & 0x80):
-            len_remaining = (ord(resp[TCP_HDR_LEN + 2]) + TCP_HDR_LEN) - len(resp)
-            len_found = True
-        else:
-            except_code = ord(resp[TCP_HDR_LEN + 2])
+        Returns:
 
-        if self.trace_func:
-            s = '{}:{}:{}[addr={}] <--'.format(self.ipaddr, str(self.ipport), str(self.slave_id), addr)
-            for c in resp:
-                s += '%02X' % (ord(c))
-            self.trace_func(s)
+            List of byte strings containing the register contents of each
+            span.
+        """
 
-        if except_code:
-            raise ModbusClientException('Modbus exception %d' % (except_code))
+        local_connect = not self.pool and self.socket is None
 
-        return resp[(TCP_HDR_LEN + 3):]
+        try:
+            return self.client.read_requests([(self.slave_id, addr, count) for addr, count in spans], op=op,
+                                             trace_func=self.trace_func, timeout=self.timeout)
+        finally:
+            if local_connect:
+                self.disconnect()
 
     def read(self, addr, count, op=FUNC_READ_HOLDING):
         """ Read Modbus device registers. If no connection exists to the
@@ -816,104 +2085,19 @@ class ModbusClientDeviceTCP(object):
             Byte string containing register contents.
         """
 
-        resp = ''
-        read_count = 0
+        spans = []
         read_offset = 0
-        local_connect = False
-
-        if self.socket is None:
-            local_connect = True
-            self.connect(self.timeout)
-
-        try:
-            while (count > 0):
-                if count > self.max_count:
-                    read_count = self.max_count
-                else:
-                    read_count = count
-                data = self._read(addr + read_offset, read_count, op=op)
-
-                if data:
-                    resp += data
-                    count -= read_count
-                    read_offset += read_count
-                else:
-                    break
-        finally:
-            if local_connect:
-                self.disconnect()
-
-        if sys.version_info > (3,):
-            resp = bytes(resp, 'latin-1')
-
-        return resp
-
-    def _write(self, addr, data):
-
-        resp = ''
-        len_remaining = TCP_HDR_LEN + TCP_RESP_MIN_LEN
-        len_found = False
-        except_code = None
-        func = FUNC_WRITE_MULTIPLE
-
-        write_len = len(data)
-        write_count = int(write_len/2)
-        req = struct.pack('>HHHBBHHB', 0, 0, TCP_WRITE_MULT_REQ_LEN + write_len, int(self.slave_id), func, int(addr), write_count, write_len)
-        if sys.version_info > (3,):
-            if type(data) is not bytes:
-                data = bytes(data, "latin-1")
-        req += data
-
-        if self.trace_func:
-            s = '{}:{}:{}[addr={}] ->'.format(self.ipaddr, str(self.ipport), str(self.slave_id), addr)
-            for c in req:
-                s += '%02X' % (ord(c))
-            self.trace_func(s)
-
-        try:
-            self.socket.sendall(req)
-        except Exception as e:
-            raise ModbusClientError('Socket write error: %s' % str(e))
 
-        while len_remaining > 0:
-            c = self.socket.recv(len_remaining)
-            # print('c = {0}'.format(c))
-            len_read = len(c);
-            if len_read > 0:
-                if type(c) == bytes and sys.version_info > (3,):
-                    temp = ""
-                    for i in c:
-                        temp += chr(i)
-                    c = temp
-                resp += c
-                len_remaining -= len_read
-                if len_found is False and len(resp) >= TCP_HDR_LEN + TCP_RESP_MIN_LEN:
-                    if sys.version_info > (3,):
-                        resp = bytes(resp, "latin-1")
-                    data_len = struct.unpack('>H', resp[TCP_HDR_O_LEN:TCP_HDR_O_LEN + 2])
-                    len_remaining = data_len[0] - (len(resp) - TCP_HDR_LEN)
-                if type(resp) == bytes and sys.version_info > (3,):
-                    temp = ""
-                    for i in resp:
-                        temp += chr(i)
-                    resp = temp
+        while (count > 0):
+            if count > self.max_count:
+                read_count = self.max_count
             else:
-                raise ModbusClientTimeout('Response timeout')
+                read_count = count
+            spans.append((addr + read_offset, read_count))
+            count -= read_count
+            read_offset += read_count
 
-        if not (ord(resp[TCP_HDR_LEN + 1]) & 0x80):
-            len_remaining = (ord(resp[TCP_HDR_LEN + 2]) + TCP_HDR_LEN) - len(resp)
-            len_found = True
-        else:
-            except_code = ord(resp[TCP_HDR_LEN + 2])
-
-        if self.trace_func:
-            s = '{}:{}:{}[addr={}] <--'.format(self.ipaddr, str(self.ipport), str(self.slave_id), addr)
-            for c in resp:
-                s += '%02X' % (ord(c))
-            self.trace_func(s)
-
-        if except_code:
-            raise ModbusClientException('Modbus exception: %d' % (except_code))
+        return b''.join(self.read_spans(spans, op=op))
 
     def write(self, addr, data):
         """ Write Modbus device registers. If no connection exists to the
@@ -928,26 +2112,11 @@ class ModbusClientDeviceTCP(object):
                 Byte string containing register contents.
         """
 
-        write_count = 0
-        write_offset = 0
-        local_connect = False
-        count = len(data)/2
-
-        if self.socket is None:
-            local_connect = True
-            self.connect(self.timeout)
+        local_connect = not self.pool and self.socket is None
 
         try:
-            while (count > 0):
-                if count > self.max_count:
-                    write_count = self.max_count
-                else:
-                    write_count = count
-                    start = (write_offset * 2)
-                    end = int((write_offset + write_count) * 2)
-                self._write(addr + write_offset, data[start:end])
-                count -= write_count
-                write_offset += write_count
+            self.client.write(self.slave_id, addr, data, trace_func=self.trace_func, max_count=self.max_count,
+                              timeout=self.timeout)
         finally:
             if local_connect:
                 self.disconnect()
@@ -1034,10 +2203,18 @@ class ModbusClientDeviceMapped(object):
         Returns:
 
             Byte string containing register contents.
+
+        Raises:
+
+            ModbusClientException: Raised with the illegal data address
+                exception code if the registers are not in the map.
         """
 
         if self.modbus_map is not None:
-            return self.modbus_map.read(addr, count, op)
+            try:
+                return self.modbus_map.read(addr, count, op)
+            except mbmap.ModbusMapError as e:
+                raise ModbusClientException(str(e), EXCEPT_ILLEGAL_ADDRESS)
         else:
             raise ModbusClientError('No modbus map set for device')
 
@@ -1059,26 +2236,8 @@ class ModbusClientDeviceMapped(object):
         else:
             raise ModbusClientError('No modbus map set for device')
 
-def __generate_crc16_table():
-    ''' Generates a crc16 lookup table
-
-    .. note:: This will only be generated once
-    '''
-    result = []
-    for byte in range(256):
-        crc = 0x0000
-        for bit in range(8):
-            if (byte ^ crc) & 0x0001:
-                crc = (crc >> 1) ^ 0xa001
-            else: crc >>= 1
-            byte >>= 1
-        result.append(crc)
-    return result
-
-__crc16_table = __generate_crc16_table()
-
 def computeCRC(data):
-    ''' Computes a crc16 on the passed in string. For modbus,
+    ''' Computes a crc16 on the passed in data. For modbus,
     this is only used on the binary serial protocols (in this
     case RTU).
 
@@ -1088,17 +2247,7 @@ def computeCRC(data):
     :param data: The data to create a crc16 of
     :returns: The calculated CRC
     '''
-    crc = 0xffff
-    if type(data) == bytes and sys.version_info > (3,):
-        temp = ""
-        for i in data:
-            temp += chr(i)
-        data = temp
-    for a in data:
-        idx = __crc16_table[(crc ^ ord(a)) & 0xff];
-        crc = ((crc >> 8) & 0xff) ^ idx
-    swapped = ((crc << 8) & 0xff00) | ((crc >> 8) & 0x00ff)
-    return swapped
+    return crc.crc16(data)
 
 def checkCRC(data, check):
     ''' Checks if the data matches the passed in CRC
@@ -1107,5 +2256,4 @@ def checkCRC(data, check):
     :param check: The CRC to validate
     :returns: True if matched, False otherwise
     '''
-    return computeCRC(data) == check
-
+    return crc.crc16(data) == check
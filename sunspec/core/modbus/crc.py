@@ -0,0 +1,123 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+"""
+    Modbus RTU CRC16 support.
+
+    The CRC functions accept bytes, bytearray, or memoryview objects (str on
+    Python 2). If the crcmod package is installed, its C extension is used to
+    compute the CRC. Otherwise a table driven pure Python implementation is
+    used.
+"""
+
+import sys
+
+try:
+    import crcmod
+except ImportError:
+    crcmod = None
+
+CRC16_POLY = 0x18005
+CRC16_INIT = 0xffff
+
+def _generate_table():
+    table = []
+    for byte in range(256):
+        crc = 0x0000
+        for bit in range(8):
+            if (byte ^ crc) & 0x0001:
+                crc = (crc >> 1) ^ 0xa001
+            else:
+                crc >>= 1
+            byte >>= 1
+        table.append(crc)
+    return tuple(table)
+
+CRC16_TABLE = _generate_table()
+
+def crc16_python(data):
+    """Compute the Modbus CRC16 of data using the pure Python implementation.
+
+    Parameters:
+
+        data :
+            Bytes-like object.
+
+    Returns:
+
+        CRC16 value as transmitted, low order byte first.
+    """
+
+    table = CRC16_TABLE
+    crc = CRC16_INIT
+    for b in bytearray(data):
+        crc = (crc >> 8) ^ table[(crc ^ b) & 0xff]
+    return ((crc << 8) & 0xff00) | (crc >> 8)
+
+crc16_crcmod = None
+if crcmod is not None:
+    _crcmod_fun = crcmod.mkCrcFun(CRC16_POLY, initCrc=CRC16_INIT, rev=True, xorOut=0)
+
+    def crc16_crcmod(data):
+        """Compute the Modbus CRC16 of data using crcmod.
+
+        Parameters:
+
+            data :
+                Bytes-like object.
+
+        Returns:
+
+            CRC16 value as transmitted, low order byte first.
+        """
+
+        # the Python 2 extension only accepts old style buffers
+        if sys.version_info < (3,) and not isinstance(data, bytes):
+            data = bytes(bytearray(data))
+        crc = _crcmod_fun(data)
+        return ((crc << 8) & 0xff00) | (crc >> 8)
+
+if crc16_crcmod is not None:
+    crc16 = crc16_crcmod
+    backend = 'crcmod'
+else:
+    crc16 = crc16_python
+    backend = 'python'
+
+def check(data, crc):
+    """Check if the CRC16 of data matches crc.
+
+    Parameters:
+
+        data :
+            Bytes-like object.
+
+        crc :
+            CRC16 value as transmitted, low order byte first.
+
+    Returns:
+
+        True if matched, False otherwise.
+    """
+
+    return crc16(data) == crc
@@ -21,6 +21,7 @@
     IN THE SOFTWARE.
 """
 
+import bisect
 import struct
 import sys
 
@@ -101,7 +102,11 @@ class ModbusMap(object):
 
         regs
             List of :const:`sunspec.core.modbus.mbmap.ModbusMapRegs` blocks that
-            comprise the Modbus register map.
+            comprise the Modbus register map, in ascending offset order.
+
+        offsets
+            Sorted list of the start offsets of the register blocks, used to
+            find the register blocks of a request with a binary search.
     """
 
     def __init__(self, slave_id=None, func=MBMAP_FUNC_HOLDING, base_addr=MBMAP_BASE_ADDR_DEFAULT, ns=None, lid=None,
@@ -114,6 +119,7 @@ class ModbusMap(object):
         self.mapid = mapid
         self.time = time
         self.regs = []
+        self.offsets = []
 
         value = func_value.get(func)
         if value is None:
@@ -141,7 +147,7 @@ class ModbusMap(object):
                                 data += c
 
             mmr = ModbusMapRegs(offset, len(data)/2, data, MBMAP_REGS_ACCESS_RW)
-            self.regs.append(mmr)
+            self.regs_append(mmr)
             f.close()
         except Exception as e:
             try:
@@ -286,7 +292,7 @@ class ModbusMap(object):
                 # if not contiguous, create a new register block
                 if last_regs is None or offset > last_regs_next:
                     mmr = ModbusMapRegs(offset, rlen, data, access)
-                    self.regs.append(mmr)
+                    self.regs_append(mmr)
                 # append to last register block
                 else:
                     last_regs.append(offset, rlen, data, access)
@@ -350,7 +356,7 @@ class ModbusMap(object):
 
         if last_regs is None or offset > last_regs_next:
             mmr = ModbusMapRegs(offset, count, data, access)
-            self.regs.append(mmr)
+            self.regs_append(mmr)
         # append to last register block
         else:
             mmr = last_regs
@@ -358,6 +364,27 @@ class ModbusMap(object):
 
         return mmr
 
+    def regs_append(self, regs):
+        """Add a register block at the end of the map and to the offset index.
+        Appending registers to an existing block does not change the index.
+
+        Parameters:
+
+            regs :
+                :const:`sunspec.core.modbus.mbmap.ModbusMapRegs` block starting
+                after the last block of the map.
+        """
+
+        self.regs.append(regs)
+        self.offsets.append(regs.offset)
+
+    def _regs_index(self, offset):
+
+        # rebuild the index if blocks were added to regs directly
+        if len(self.offsets) != len(self.regs):
+            self.offsets = [regs.offset for regs in self.regs]
+        return bisect.bisect_right(self.offsets, offset) - 1
+
     def read(self, addr, count, op=None):
         """Read Modbus map registers.
 
@@ -374,27 +401,28 @@ class ModbusMap(object):
             Byte string containing register contents.
         """
 
-        data = b''
+        chunks = []
         count_remaining = count
 
         if op and op != self.func:
             raise ModbusMapError('Data read error - function mismatch: request func = {} map func = {}'.format(str(op), str(self.func)))
 
         offset = addr - int(self.base_addr)
-        for regs in self.regs:
-            if count_remaining > 0:
-                regs_end_offset = regs.offset + regs.count
-                if offset >= regs.offset and offset < regs_end_offset:
-                    read_count = regs_end_offset - offset
-                    if count_remaining < read_count:
-                        read_count = count_remaining
-                    data += regs.read(offset, read_count)
-                    offset += read_count
-                    count_remaining -= read_count
-                else:
-                    continue
-            else:
+        index = self._regs_index(offset)
+        regs_list = self.regs
+        while count_remaining > 0 and 0 <= index < len(regs_list):
+            regs = regs_list[index]
+            regs_end_offset = regs.offset + regs.count
+            if offset < regs.offset or offset >= regs_end_offset:
                 break
+            read_count = regs_end_offset - offset
+            if count_remaining < read_count:
+                read_count = count_remaining
+            chunks.append(regs.read(offset, read_count))
+            offset += read_count
+            count_remaining -= read_count
+            index += 1
+        data = b''.join(chunks)
 
         # must have all requested data for success
         if len(data) != int(count) * 2:
@@ -423,25 +451,23 @@ class ModbusMap(object):
 
         data_offset = 0
         offset = addr - int(self.base_addr)
-        for regs in self.regs:
-            if count_remaining > 0:
-                regs_end_offset = regs.offset + regs.count
-                if offset >= regs.offset and offset < regs_end_offset:
-                    write_count = regs_end_offset - offset
-                    if count_remaining < write_count:
-                        write_count = count_remaining
-                    # regs
-                    # data += regs.read(offset, read_count)
-                    start = data_offset
-                    end = int(data_offset + (write_count * 2))
-                    regs.write(offset, data[start:end])
-                    offset += write_count
-                    data_offset += write_count
-                    count_remaining -= write_count
-                else:
-                    continue
-            else:
+        index = self._regs_index(offset)
+        regs_list = self.regs
+        while count_remaining > 0 and 0 <= index < len(regs_list):
+            regs = regs_list[index]
+            regs_end_offset = regs.offset + regs.count
+            if offset < regs.offset or offset >= regs_end_offset:
                 break
+            write_count = regs_end_offset - offset
+            if count_remaining < write_count:
+                write_count = count_remaining
+            start = data_offset
+            end = int(data_offset + (write_count * 2))
+            regs.write(offset, data[start:end])
+            offset += write_count
+            data_offset = end
+            count_remaining -= write_count
+            index += 1
 
         # must have written all data for success
         if count_remaining > 0:
@@ -0,0 +1,354 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+"""
+    NumPy batch decoding of scaled point values.
+
+    Decodes the numeric points of one or more models of the same model type
+    from the model register contents into a NumPy array of engineering values
+    with the scale factors applied. Unimplemented values, and values with an
+    unimplemented scale factor, are NaN. Requires the optional numpy package
+    (pip install pysunspec[numpy]).
+"""
+
+import sunspec.core.decode as decode
+import sunspec.core.suns as suns
+from sunspec.core.util import SunSpecError
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# numpy dtype of the numeric point types
+POINT_DTYPES = {
+    suns.SUNS_TYPE_INT16: '>i2',
+    suns.SUNS_TYPE_UINT16: '>u2',
+    suns.SUNS_TYPE_COUNT: '>u2',
+    suns.SUNS_TYPE_ACC16: '>u2',
+    suns.SUNS_TYPE_ENUM16: '>u2',
+    suns.SUNS_TYPE_BITFIELD16: '>u2',
+    suns.SUNS_TYPE_INT32: '>i4',
+    suns.SUNS_TYPE_UINT32: '>u4',
+    suns.SUNS_TYPE_ACC32: '>u4',
+    suns.SUNS_TYPE_ENUM32: '>u4',
+    suns.SUNS_TYPE_BITFIELD32: '>u4',
+    suns.SUNS_TYPE_INT64: '>i8',
+    suns.SUNS_TYPE_UINT64: '>i8',
+    suns.SUNS_TYPE_ACC64: '>i8',
+    suns.SUNS_TYPE_FLOAT32: '>f4',
+    suns.SUNS_TYPE_SUNSSF: '>i2'
+}
+
+# supported scale factor range
+SF_MAX = 10
+
+class BlockArrayDecoder(object):
+    """Batch decoder for the numeric points of a block type.
+
+    Parameters:
+
+        block_type :
+            Block type to compile.
+
+        sf_block_type :
+            Fixed block type of the model when block_type is a repeating block,
+            used to resolve scale factors defined in the fixed block.
+
+    Attributes:
+
+        ids
+            List of the ids of the decoded points in block offset order.
+            Scale factor points and non-numeric points are not included.
+    """
+
+    def __init__(self, block_type, sf_block_type=None):
+
+        if numpy is None:
+            raise SunSpecError('numpy package required for batch decoding')
+
+        self.ids = []
+        self.len = int(block_type.len)
+        # (field, unimplemented value) of each decoded point
+        self.fields = []
+        # scale factor of each decoded point: None, an int constant, or a
+        # (block, field) tuple with block 0 for this block and 1 for the fixed
+        # block
+        self.sfs = []
+
+        names = []
+        formats = []
+        offsets = []
+        sf_fields = {}
+        for point_type in block_type.points_list:
+            dtype = POINT_DTYPES.get(point_type.type)
+            info = suns.suns_point_type_info.get(point_type.type)
+            if dtype is None or int(point_type.len) != info[0] or point_type.is_impl is not info[1]:
+                continue
+            names.append(point_type.id)
+            formats.append(dtype)
+            offsets.append(int(point_type.offset) * 2)
+            if point_type.type == suns.SUNS_TYPE_SUNSSF:
+                sf_fields[point_type.id] = point_type.id
+
+        for point_type in block_type.points_list:
+            if point_type.id not in names or point_type.type == suns.SUNS_TYPE_SUNSSF:
+                continue
+            unimpl = decode.POINT_FORMATS[point_type.type][1]
+            if unimpl is not None:
+                limits = numpy.iinfo(POINT_DTYPES[point_type.type])
+                if not limits.min <= unimpl <= limits.max:
+                    unimpl = None
+            self.ids.append(point_type.id)
+            self.fields.append((point_type.id, unimpl))
+
+            sf = point_type.sf
+            if sf is not None:
+                try:
+                    sf = int(sf)
+                except ValueError:
+                    if sf in sf_fields:
+                        sf = (0, sf)
+                    elif sf_block_type is not None and sf in sf_block_type.points:
+                        sf = (1, sf)
+                    else:
+                        raise SunSpecError('Unable to resolve scale factor point %s for point %s' %
+                                           (sf, point_type.id))
+            self.sfs.append(sf)
+
+        self.dtype = numpy.dtype({'names': names, 'formats': formats, 'offsets': offsets,
+                                  'itemsize': self.len * 2})
+
+    def records(self, blocks):
+        """Return the block register contents as a numpy record array.
+
+        Parameters:
+
+            blocks :
+                Byte string containing the register contents of one or more
+                blocks.
+        """
+
+        return numpy.frombuffer(blocks, dtype=self.dtype)
+
+    def decode(self, blocks, sf_records=None):
+        """Decode the scaled point values of a set of blocks.
+
+        Parameters:
+
+            blocks :
+                Byte string containing the register contents of one or more
+                blocks.
+
+            sf_records :
+                Record array of the fixed block of each block when decoding
+                repeating blocks with fixed block scale factors.
+
+        Returns:
+
+            Array of shape (blocks, len(ids)) of point values. Unimplemented
+            values are NaN.
+        """
+
+        records = self.records(blocks)
+        values = numpy.empty((len(records), len(self.ids)))
+        for index, (field, unimpl) in enumerate(self.fields):
+            column = records[field]
+            values[:, index] = column
+            if unimpl is not None:
+                values[column == unimpl, index] = numpy.nan
+
+            sf = self.sfs[index]
+            if sf is not None:
+                if isinstance(sf, int):
+                    values[:, index] *= 10.0 ** sf
+                else:
+                    if sf[0] == 0:
+                        exps = records[sf[1]]
+                    else:
+                        exps = sf_records[sf[1]]
+                    values[:, index] *= scale(exps)
+
+        return values
+
+def scale(exps):
+    """Return the multipliers for an array of scale factors using a power of
+    ten lookup table. Unimplemented and out of range scale factors are NaN.
+
+    Parameters:
+
+        exps :
+            Integer array of scale factors.
+    """
+
+    exps = exps.astype(numpy.int32)
+    valid = (exps >= -SF_MAX) & (exps <= SF_MAX)
+    multipliers = POW10[numpy.where(valid, exps + SF_MAX, 0)]
+    multipliers[~valid] = numpy.nan
+    return multipliers
+
+if numpy is not None:
+    POW10 = 10.0 ** numpy.arange(-SF_MAX, SF_MAX + 1)
+
+class ValueTable(object):
+    """Scaled point values of a set of blocks.
+
+    Attributes:
+
+        ids
+            List of point ids, one per column.
+
+        values
+            Array of shape (rows, len(ids)) of point values. Unimplemented
+            values are NaN.
+
+        rows
+            Array of the index of the model of each row in the list of models
+            decoded.
+    """
+
+    def __init__(self, ids, values, rows):
+
+        self.ids = ids
+        self.values = values
+        self.rows = rows
+
+    def column(self, pid):
+        """Return the values of a point.
+
+        Parameters:
+
+            pid :
+                Point id.
+        """
+
+        return self.values[:, self.ids.index(pid)]
+
+def model_type_decoders(model_type):
+    """Return the fixed and repeating block batch decoders of a model type,
+    compiling them on first use. The decoders are cached on the model type.
+
+    Parameters:
+
+        model_type :
+            Model type.
+
+    Returns:
+
+        Tuple of the fixed and repeating block decoders. The repeating block
+        decoder is None if the model type has no repeating block.
+    """
+
+    decoders = getattr(model_type, 'array_decoders', None)
+    if decoders is None:
+        fixed = BlockArrayDecoder(model_type.fixed_block)
+        repeating = None
+        if model_type.repeating_block is not None:
+            repeating = BlockArrayDecoder(model_type.repeating_block, model_type.fixed_block)
+        decoders = model_type.array_decoders = (fixed, repeating)
+    return decoders
+
+def decode_models(model_type, data, repeating=False):
+    """Decode the scaled point values of several models of the same model
+    type.
+
+    Parameters:
+
+        model_type :
+            Model type.
+
+        data :
+            List of byte strings containing the register contents of each
+            model starting at the model address. Models without data (None
+            or too short) have NaN values.
+
+        repeating :
+            Decode the repeating block points, one row per repeating block,
+            instead of the fixed block points, one row per model.
+
+    Returns:
+
+        :class:`ValueTable` object.
+    """
+
+    fixed, rep = model_type_decoders(model_type)
+    fixed_size = fixed.len * 2
+    empty = b'\xff\xff' * fixed.len
+
+    fixed_data = []
+    for d in data:
+        if d is not None and len(d) >= fixed_size:
+            fixed_data.append(d[:fixed_size])
+        else:
+            fixed_data.append(empty)
+
+    if not repeating:
+        values = fixed.decode(b''.join(fixed_data))
+        for index, d in enumerate(data):
+            if d is None or len(d) < fixed_size:
+                values[index, :] = numpy.nan
+        return ValueTable(fixed.ids, values, numpy.arange(len(data)))
+
+    if rep is None:
+        raise SunSpecError('Model %s has no repeating block' % (model_type.id))
+
+    rep_size = rep.len * 2
+    rows = []
+    blocks = []
+    for index, d in enumerate(data):
+        if d is not None and len(d) >= fixed_size:
+            count = (len(d) - fixed_size) // rep_size
+            blocks.append(d[fixed_size:fixed_size + count * rep_size])
+            rows.extend([index] * count)
+    rows = numpy.array(rows, dtype=numpy.intp)
+    sf_records = fixed.records(b''.join(fixed_data))[rows]
+
+    return ValueTable(rep.ids, rep.decode(b''.join(blocks), sf_records), rows)
+
+def model_values(models, repeating=False):
+    """Decode the scaled point values of several models of the same model type
+    from the register contents of the last read of each model.
+
+    Parameters:
+
+        models :
+            List of :class:`sunspec.core.client.ClientModel` objects of the
+            same model type.
+
+        repeating :
+            Decode the repeating block points instead of the fixed block
+            points.
+
+    Returns:
+
+        :class:`ValueTable` object.
+    """
+
+    if not models:
+        raise SunSpecError('No models to decode')
+    model_type = models[0].model_type
+    for model in models:
+        if model.model_type is not model_type:
+            raise SunSpecError('Models are not the same model type: %s %s' % (model_type.id, model.id))
+
+    return decode_models(model_type, [model.data for model in models], repeating)
@@ -0,0 +1,211 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+"""
+    Modbus request planning.
+
+    Register ranges are planned into as few Modbus requests as possible. A
+    range can only be split between requests at its cut addresses, typically
+    the start of each point, so multi-register point values are never read
+    in two separate requests.
+
+    Register writes are planned the same way. Writes separated by a small gap
+    are joined by rewriting the registers in between with their current
+    contents, which is only done when all of those registers are writable.
+"""
+
+import bisect
+
+from sunspec.core.modbus.client import REQ_COUNT_MAX, REQ_WRITE_COUNT_MAX
+from sunspec.core.util import SunSpecError
+
+def plan_reads(ranges, max_count=REQ_COUNT_MAX, gap=0):
+    """Plan the read requests for a set of register ranges. Ranges closer
+    than the gap tolerance are merged into the same request as long as the
+    request does not exceed max_count registers.
+
+    Parameters:
+
+        ranges :
+            Iterable of (address, count, cuts) tuples. Cuts is an iterable of
+            the addresses within the range where a request may start or None
+            if the range can only be split at max_count boundaries.
+
+        max_count :
+            Maximum register count for a single Modbus request.
+
+        gap :
+            Maximum number of unrequested registers that may be read to join
+            two ranges into one request.
+
+    Returns:
+
+        List of (address, count) tuples ordered by address.
+    """
+
+    atoms = []
+    for addr, count, cuts in ranges:
+        end = addr + count
+        start = addr
+        if cuts is not None:
+            for cut in sorted(set(cuts)):
+                if start < cut < end:
+                    atoms.append((start, cut))
+                    start = cut
+        atoms.append((start, end))
+    atoms.sort()
+
+    spans = []
+    span_start = span_end = None
+    for start, end in atoms:
+        if span_start is not None:
+            if start <= span_end + gap and max(span_end, end) - span_start <= max_count:
+                span_end = max(span_end, end)
+                continue
+            spans.append((span_start, span_end - span_start))
+        while end - start > max_count:
+            spans.append((start, max_count))
+            start += max_count
+        span_start, span_end = start, end
+    if span_start is not None:
+        spans.append((span_start, span_end - span_start))
+
+    return spans
+
+def plan_writes(writes, fill=(), max_count=REQ_WRITE_COUNT_MAX, gap=0):
+    """Plan the write requests for a set of register writes. Adjacent writes
+    are merged into one request, and writes closer than the gap tolerance are
+    merged if every register between them is covered by fill, as long as the
+    request does not exceed max_count registers.
+
+    Parameters:
+
+        writes :
+            Iterable of (address, byte string) tuples, typically one per
+            modified point. A write is never split between requests.
+
+        fill :
+            Iterable of (address, byte string) tuples containing the current
+            contents of registers that may be rewritten to join two writes.
+
+        max_count :
+            Maximum register count for a single Modbus request.
+
+        gap :
+            Maximum number of registers that may be rewritten to join two
+            writes into one request.
+
+    Returns:
+
+        List of (address, byte string) tuples ordered by address.
+    """
+
+    fill = dict(fill)
+    requests = []
+    start = end = None
+    chunks = []
+    for addr, data in sorted(writes, key=lambda write: write[0]):
+        count = len(data) // 2
+        if start is not None:
+            if end <= addr <= end + gap and addr + count - start <= max_count:
+                bridge = _fill_chunks(fill, end, addr)
+                if bridge is not None:
+                    chunks.extend(bridge)
+                    chunks.append(data)
+                    end = addr + count
+                    continue
+            requests.append((start, b''.join(chunks)))
+        start, end, chunks = addr, addr + count, [data]
+    if start is not None:
+        requests.append((start, b''.join(chunks)))
+
+    return requests
+
+def _fill_chunks(fill, addr, end):
+
+    chunks = []
+    while addr < end:
+        data = fill.get(addr)
+        if data is None:
+            return None
+        chunks.append(data)
+        addr += len(data) // 2
+    if addr != end:
+        return None
+    return chunks
+
+class SpanData(object):
+    """Register contents read for a list of spans.
+
+    Parameters:
+
+        spans :
+            List of (address, count) tuples ordered by address.
+
+        data :
+            List of byte strings containing the register contents of each
+            span.
+    """
+
+    def __init__(self, spans, data):
+        self.spans = spans
+        self.data = data
+        self.addrs = [addr for addr, count in spans]
+
+    def get(self, addr, count):
+        """Get the contents of a register range.
+
+        Parameters:
+
+            addr :
+                Starting Modbus address.
+
+            count :
+                Register count.
+
+        Returns:
+
+            Byte string containing the register contents.
+
+        Raises:
+
+            SunSpecError: Raised if the range was not read.
+        """
+
+        chunks = []
+        end = addr + count
+        while addr < end:
+            index = bisect.bisect_right(self.addrs, addr) - 1
+            if index < 0:
+                raise SunSpecError('Registers %d-%d not read' % (addr, end - 1))
+            span_addr, span_count = self.spans[index]
+            span_end = min(span_addr + span_count, end)
+            data = self.data[index]
+            if addr >= span_end or len(data) < (span_end - span_addr) * 2:
+                raise SunSpecError('Registers %d-%d not read' % (addr, end - 1))
+            chunks.append(data[(addr - span_addr) * 2:(span_end - span_addr) * 2])
+            addr = span_end
+
+        if len(chunks) == 1:
+            return chunks[0]
+        return b''.join(chunks)
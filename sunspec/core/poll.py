@@ -0,0 +1,356 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+"""
+    Poll scheduler.
+
+    Polls the models of many client devices at per model id intervals, so
+    measurement models can be read every second while nameplate and settings
+    models are read rarely. The models of a device that are due at the same
+    time are read together with as few requests as possible, and a model due
+    shortly is read early to join them. The scheduler keeps the read statistics
+    of each model id of each device, including the deadline misses and the
+    drift of the reads from their scheduled times.
+"""
+
+import threading
+import time
+
+import sunspec.core.client as client
+
+class ModelSchedule(object):
+    """Schedule and read statistics of a model id of a device.
+
+    Attributes:
+
+        model_id
+            Model id.
+
+        interval
+            Poll interval in seconds.
+
+        due
+            Time the next read is due.
+
+        reads
+            Number of reads.
+
+        failures
+            Number of reads in which at least one instance of the model could
+            not be read.
+
+        misses
+            Number of poll intervals skipped because a read started after the
+            next read was due.
+
+        drift
+            Delay in seconds of the last read from its due time. Negative if
+            the read was early.
+
+        max_drift
+            Largest drift.
+
+        total_drift
+            Sum of the drift of all reads.
+    """
+
+    def __init__(self, model_id, interval, due):
+
+        self.model_id = model_id
+        self.interval = interval
+        self.due = due
+        self.reads = 0
+        self.failures = 0
+        self.misses = 0
+        self.drift = None
+        self.max_drift = None
+        self.total_drift = 0.
+
+    @property
+    def mean_drift(self):
+        """Mean drift of the reads, None if not read."""
+
+        if self.reads:
+            return self.total_drift / self.reads
+
+    def update(self, start, failed=False):
+        """Record a read and schedule the next one.
+
+        Parameters:
+
+            start :
+                Time the read started.
+
+            failed :
+                True if the read failed.
+        """
+
+        drift = start - self.due
+        self.reads += 1
+        if failed:
+            self.failures += 1
+        self.drift = drift
+        self.total_drift += drift
+        if self.max_drift is None or drift > self.max_drift:
+            self.max_drift = drift
+
+        # keep the schedule phase, skipping the intervals already missed
+        missed = 0
+        if drift >= self.interval:
+            missed = int(drift // self.interval)
+        self.misses += missed
+        self.due += self.interval * (missed + 1)
+
+class PollScheduler(object):
+    """Poll scheduler for client devices.
+
+    Parameters:
+
+        intervals :
+            Dictionary of poll intervals in seconds indexed by model id.
+
+        default_interval :
+            Poll interval of the models not in intervals. Models not in
+            intervals are not polled if None.
+
+        early :
+            Fraction of its interval a model may be read before it is due to
+            join the read of the other models of the device that are due.
+
+        workers :
+            Maximum number of devices polled concurrently.
+
+        on_read :
+            Function called after each device read with the device, the list
+            of models read, and the list of the models that could not be read.
+            Called from the worker threads if workers is greater than 1.
+
+    Attributes:
+
+        devices
+            List of the devices polled.
+
+        schedules
+            Dictionary indexed by device of dictionaries of
+            :class:`ModelSchedule` objects indexed by model id.
+    """
+
+    def __init__(self, intervals, default_interval=None, early=.1, workers=1, on_read=None):
+
+        self.intervals = dict(intervals)
+        self.default_interval = default_interval
+        self.early = early
+        self.workers = workers
+        self.on_read = on_read
+        self.devices = []
+        self.schedules = {}
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+
+    def add_device(self, device, now=None):
+        """Add a scanned device. All the polled models of the device are due
+        immediately.
+
+        Parameters:
+
+            device :
+                :class:`sunspec.core.client.ClientDevice` object.
+
+            now :
+                Current time. Defaults to time.time().
+        """
+
+        if now is None:
+            now = time.time()
+        schedules = {}
+        for model in device.models_list:
+            if model.model_type is None or model.id in schedules:
+                continue
+            interval = self.intervals.get(model.id, self.default_interval)
+            if interval is not None:
+                schedules[model.id] = ModelSchedule(model.id, interval, now)
+        with self.lock:
+            if device not in self.schedules:
+                self.devices.append(device)
+            self.schedules[device] = schedules
+
+    def remove_device(self, device):
+        """Remove a device.
+
+        Parameters:
+
+            device :
+                Device object.
+        """
+
+        with self.lock:
+            if self.schedules.pop(device, None) is not None:
+                self.devices.remove(device)
+
+    def next_due(self):
+        """Return the time the next read is due, None if there are no models
+        to poll.
+        """
+
+        with self.lock:
+            due = [s.due for schedules in self.schedules.values() for s in schedules.values()]
+        if due:
+            return min(due)
+
+    def due(self, device, now):
+        """Return the schedules of a device to read at a time. A schedule due
+        within its early window is included if another schedule of the device
+        is due.
+
+        Parameters:
+
+            device :
+                Device object.
+
+            now :
+                Time.
+
+        Returns:
+
+            List of :class:`ModelSchedule` objects.
+        """
+
+        schedules = list(self.schedules.get(device, {}).values())
+        if not [s for s in schedules if s.due <= now]:
+            return []
+        return [s for s in schedules if s.due - s.interval * self.early <= now]
+
+    def poll_device(self, device, now=None):
+        """Read the models of a device that are due.
+
+        Parameters:
+
+            device :
+                Device object.
+
+            now :
+                Current time. Defaults to time.time().
+
+        Returns:
+
+            List of the models read.
+        """
+
+        if now is None:
+            now = time.time()
+        with self.lock:
+            schedules = self.due(device, now)
+        if not schedules:
+            return []
+
+        model_ids = set(s.model_id for s in schedules)
+        models = [model for model in device.models_list if model.id in model_ids and model.model_type is not None]
+        try:
+            failed = device.read_models_partial(models)
+        except client.SunSpecClientError:
+            failed = models
+
+        failed_ids = set(model.id for model in failed)
+        with self.lock:
+            for s in schedules:
+                s.update(now, s.model_id in failed_ids)
+
+        if self.on_read is not None:
+            self.on_read(device, models, failed)
+        return models
+
+    def poll(self, now=None):
+        """Read the models of all devices that are due.
+
+        Parameters:
+
+            now :
+                Current time. Defaults to time.time(), taken again when each
+                device read starts.
+
+        Returns:
+
+            Number of devices read.
+        """
+
+        start = now
+        if start is None:
+            start = time.time()
+        with self.lock:
+            devices = [device for device in self.devices if self.due(device, start)]
+
+        if self.workers <= 1 or len(devices) <= 1:
+            for device in devices:
+                self.poll_device(device, now)
+            return len(devices)
+
+        lock = threading.Lock()
+        pending = iter(devices)
+
+        def worker():
+            while True:
+                with lock:
+                    device = next(pending, None)
+                if device is None:
+                    break
+                self.poll_device(device, now)
+
+        threads = [threading.Thread(target=worker) for i in range(min(self.workers, len(devices)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return len(devices)
+
+    def run(self, duration=None):
+        """Poll the devices until stop() is called.
+
+        Parameters:
+
+            duration :
+                Maximum time in seconds to run. Runs until stopped if None.
+        """
+
+        self.stopped.clear()
+        end = None
+        if duration is not None:
+            end = time.time() + duration
+        while not self.stopped.is_set():
+            now = time.time()
+            if end is not None and now >= end:
+                break
+            due = self.next_due()
+            if due is None or due > now:
+                wait = 1. if due is None else due - now
+                if end is not None:
+                    wait = min(wait, end - now)
+                self.stopped.wait(wait)
+                continue
+            # each device read takes its own start time
+            self.poll()
+
+    def stop(self):
+        """Stop run()."""
+
+        self.stopped.set()
@@ -0,0 +1,287 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+"""
+    Request retry policy.
+
+    A retry policy decides which failed device requests are retried, how many
+    times, and how long to wait between attempts. Timeouts and communication
+    errors are retried, as are exception responses with a retryable exception
+    code such as device busy. A policy may also enable a circuit breaker for
+    each device. The breaker opens after a number of consecutive failed
+    requests and fails further requests immediately until a cooldown period
+    has passed, so an unresponsive device does not delay the requests to the
+    other devices.
+"""
+
+import random
+import time
+
+import sunspec.core.modbus.client as modbus
+
+# circuit breaker states
+BREAKER_CLOSED = 'closed'
+BREAKER_OPEN = 'open'
+BREAKER_HALF_OPEN = 'half-open'
+
+class CircuitOpenError(modbus.ModbusClientError):
+    """Raised for a request to a device with an open circuit breaker."""
+    pass
+
+class CircuitBreaker(object):
+    """Circuit breaker of a device.
+
+    Parameters:
+
+        failures :
+            Number of consecutive failed requests opening the breaker.
+
+        cooldown :
+            Time in seconds the breaker stays open before a trial request is
+            allowed.
+
+    Attributes:
+
+        count
+            Number of consecutive failed requests.
+
+        opened
+            Time the breaker was last opened, None if closed.
+    """
+
+    def __init__(self, failures=3, cooldown=30.):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.count = 0
+        self.opened = None
+
+    @property
+    def state(self):
+        """Breaker state: :const:`BREAKER_CLOSED`, :const:`BREAKER_OPEN`, or
+        :const:`BREAKER_HALF_OPEN` once the cooldown has passed.
+        """
+
+        if self.opened is None:
+            return BREAKER_CLOSED
+        if time.time() - self.opened < self.cooldown:
+            return BREAKER_OPEN
+        return BREAKER_HALF_OPEN
+
+    def allow(self):
+        """Return True if a request may be sent. A half open breaker allows a
+        single trial request and opens again for another cooldown period
+        unless the trial succeeds.
+        """
+
+        state = self.state
+        if state == BREAKER_HALF_OPEN:
+            self.opened = time.time()
+            return True
+        return state == BREAKER_CLOSED
+
+    def success(self):
+        """Record a request answered by the device and close the breaker."""
+
+        self.count = 0
+        self.opened = None
+
+    def failure(self):
+        """Record a failed request, opening the breaker after the configured
+        number of consecutive failures.
+        """
+
+        self.count += 1
+        if self.count >= self.failures:
+            self.opened = time.time()
+
+class RetryPolicy(object):
+    """Request retry policy. A policy holds no per device state and may be
+    shared by several devices.
+
+    Parameters:
+
+        attempts :
+            Maximum number of attempts per request. Defaults to the device
+            retry_count plus one.
+
+        backoff :
+            Delay in seconds before the first retry. The delay doubles with
+            each further retry.
+
+        backoff_max :
+            Maximum delay in seconds between attempts.
+
+        jitter :
+            Fraction of the delay randomly added or removed to spread the
+            retries of several devices.
+
+        retry_codes :
+            Modbus exception codes retried. Other exception responses fail the
+            request immediately.
+
+        breaker_failures :
+            Number of consecutive failed requests opening the device circuit
+            breaker. The circuit breaker is disabled if None.
+
+        breaker_cooldown :
+            Time in seconds the circuit breaker stays open.
+    """
+
+    def __init__(self, attempts=None, backoff=.1, backoff_max=2., jitter=.5,
+                 retry_codes=(modbus.EXCEPT_DEVICE_BUSY,), breaker_failures=None, breaker_cooldown=30.):
+        self.attempts = attempts
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.retry_codes = frozenset(retry_codes)
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+
+    def breaker(self):
+        """Return a new circuit breaker for a device, None if the policy does
+        not use circuit breakers.
+        """
+
+        if self.breaker_failures is not None:
+            return CircuitBreaker(self.breaker_failures, self.breaker_cooldown)
+
+    def max_attempts(self, retries=0):
+        """Return the maximum number of attempts per request.
+
+        Parameters:
+
+            retries :
+                Device retry count used if the policy attempts is not set.
+        """
+
+        if self.attempts is not None:
+            return self.attempts
+        return retries + 1
+
+    def retryable(self, e):
+        """Return True if a request failing with an exception may be retried.
+
+        Parameters:
+
+            e :
+                :class:`sunspec.core.modbus.client.ModbusClientError`
+                exception.
+        """
+
+        if isinstance(e, CircuitOpenError):
+            return False
+        if isinstance(e, modbus.ModbusClientException):
+            return e.except_code in self.retry_codes
+        return True
+
+    def delay(self, attempt):
+        """Return the delay in seconds before the next attempt.
+
+        Parameters:
+
+            attempt :
+                Number of the failed attempt, starting at 1.
+        """
+
+        delay = min(self.backoff * (2 ** (attempt - 1)), self.backoff_max)
+        if self.jitter:
+            delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        return delay
+
+    def check(self, breaker):
+        """Raise CircuitOpenError if the breaker does not allow a request.
+
+        Parameters:
+
+            breaker :
+                Device circuit breaker or None.
+        """
+
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpenError('Device unavailable, retry in %.1f seconds' %
+                                   (breaker.cooldown - (time.time() - breaker.opened)))
+
+    def record(self, breaker, e=None):
+        """Record the outcome of a request in the device circuit breaker. An
+        exception response counts as a success as the device answered.
+
+        Parameters:
+
+            breaker :
+                Device circuit breaker or None.
+
+            e :
+                Exception of the failed request, None if successful.
+        """
+
+        if breaker is not None:
+            if e is None or isinstance(e, modbus.ModbusClientException):
+                breaker.success()
+            elif not isinstance(e, CircuitOpenError):
+                breaker.failure()
+
+    def call(self, func, args=(), retries=0, breaker=None):
+        """Call a request function, retrying it according to the policy.
+
+        Parameters:
+
+            func :
+                Request function.
+
+            args :
+                Request function arguments.
+
+            retries :
+                Device retry count used if the policy attempts is not set.
+
+            breaker :
+                Device circuit breaker or None.
+
+        Returns:
+
+            Request function result.
+
+        Raises:
+
+            ModbusClientError: The exception of the last attempt, or
+                CircuitOpenError if the device circuit breaker is open.
+        """
+
+        self.check(breaker)
+        attempts = self.max_attempts(retries)
+        attempt = 1
+        while True:
+            try:
+                result = func(*args)
+            except modbus.ModbusClientError as e:
+                if attempt >= attempts or not self.retryable(e):
+                    self.record(breaker, e)
+                    raise
+                time.sleep(self.delay(attempt))
+                attempt += 1
+            else:
+                self.record(breaker)
+                return result
+
+# policy used by devices without a retry policy, each request is sent once
+DEFAULT_POLICY = RetryPolicy(attempts=1, backoff=0, jitter=0)
@@ -0,0 +1,209 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+"""
+    Persistent device scan cache.
+
+    The scan cache holds the model layout found by a device scan, indexed by
+    the device transport, address, and slave id. Each entry records the
+    common model Mn, Md, SN, and Vr point values of the scanned device so a
+    reconnecting client can validate the entry with a single read of the
+    common model and rebuild the device models without rescanning. An entry
+    is discarded when the values do not match, such as after a firmware
+    update changes Vr.
+"""
+
+import contextlib
+import json
+import os
+import threading
+
+from sunspec.core.util import SunSpecError
+
+# common model points identifying a device
+FINGERPRINT_POINTS = ('Mn', 'Md', 'SN', 'Vr')
+
+def fingerprint(model):
+    """Return the fingerprint of a device from its common model.
+
+    Parameters:
+
+        model :
+            Common model object with the point values set.
+
+    Returns:
+
+        Dictionary of the Mn, Md, SN, and Vr point values.
+    """
+
+    values = {}
+    for pid in FINGERPRINT_POINTS:
+        point = model.points.get(pid)
+        values[pid] = point.value_base if point is not None else None
+    return values
+
+class ScanCache(object):
+    """Scan cache, optionally persisted in a JSON file.
+
+    Parameters:
+
+        filename :
+            Cache file name. The cache is loaded from the file if it exists
+            and saved to the file each time it is updated, or once at the end
+            of a batch (see batch()). If None, the cache is only held in
+            memory.
+
+    Raises:
+
+        SunSpecError: Raised if the cache file can not be loaded.
+
+    Attributes:
+
+        filename
+            Cache file name.
+
+        entries
+            Dictionary of cache entries indexed by device key. Each entry is a
+            dictionary with the 'base_addr', 'models' list of [model id,
+            address, length] lists, and 'fingerprint' values.
+    """
+
+    def __init__(self, filename=None):
+
+        self.filename = filename
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.save_lock = threading.Lock()
+        self.dirty = False
+        self.batching = 0
+
+        if filename is not None and os.path.exists(filename):
+            try:
+                with open(filename, 'r') as f:
+                    self.entries = json.load(f)
+            except (IOError, OSError, ValueError) as e:
+                raise SunSpecError('Error loading scan cache %s: %s' % (filename, str(e)))
+
+    def get(self, key):
+        """Return the cache entry of a device, None if not present.
+
+        Parameters:
+
+            key :
+                Device key.
+        """
+
+        with self.lock:
+            return self.entries.get(key)
+
+    def put(self, key, base_addr, models, fingerprint):
+        """Add or replace the cache entry of a device.
+
+        Parameters:
+
+            key :
+                Device key.
+
+            base_addr :
+                SunSpec base address of the device.
+
+            models :
+                List of (model id, address, length) tuples in device order.
+                The address is the address of the first point of the model.
+
+            fingerprint :
+                Dictionary of the common model Mn, Md, SN, and Vr values.
+        """
+
+        with self.lock:
+            self.entries[key] = {'base_addr': base_addr,
+                                 'models': [list(m) for m in models],
+                                 'fingerprint': fingerprint}
+            self.dirty = True
+            batching = self.batching
+        if not batching:
+            self.save()
+
+    def remove(self, key):
+        """Remove the cache entry of a device if present.
+
+        Parameters:
+
+            key :
+                Device key.
+        """
+
+        with self.lock:
+            if self.entries.pop(key, None) is None:
+                return
+            self.dirty = True
+            batching = self.batching
+        if not batching:
+            self.save()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Context manager deferring the saves of the cache updates made
+        within it to a single save at its end, such as for the scans of a
+        fleet of devices. Batches may be nested and used from several threads.
+        """
+
+        with self.lock:
+            self.batching += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.batching -= 1
+                batching = self.batching
+            if not batching:
+                self.save()
+
+    def save(self):
+        """Save the cache to the cache file if it has been updated since the
+        last save.
+
+        Raises:
+
+            IOError, OSError: Raised if the cache file can not be written.
+        """
+
+        if self.filename is None:
+            return
+        # the cache file is written without holding the cache lock
+        with self.save_lock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                text = json.dumps(self.entries, indent=1, sort_keys=True)
+                self.dirty = False
+            tmp = '%s.tmp' % (self.filename)
+            with open(tmp, 'w') as f:
+                f.write(text)
+            try:
+                os.replace(tmp, self.filename)
+            except AttributeError:
+                # Python 2
+                if os.path.exists(self.filename):
+                    os.remove(self.filename)
+                os.rename(tmp, self.filename)
@@ -68,6 +68,13 @@ class Serial(object):
                 self.in_buf = self.in_buf[read_len:]
         return data
 
+    def readinto(self, b):
+        data = self.read(len(b))
+        n = len(data)
+        if n > 0:
+            b[:n] = data
+        return n
+
     def write(self, data):
         self.out_buf += data
 
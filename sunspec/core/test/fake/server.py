@@ -0,0 +1,154 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+from __future__ import absolute_import
+
+import socket
+import struct
+import threading
+import time
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+import sunspec.core.modbus.mbmap as mbmap
+
+FUNC_WRITE_MULTIPLE = 16
+
+
+class ModbusTCPHandler(socketserver.BaseRequestHandler):
+
+    def recv_exact(self, size):
+        data = b''
+        while len(data) < size:
+            try:
+                c = self.request.recv(size - len(data))
+            except socket.error:
+                return None
+            if not c:
+                return None
+            data += c
+        return data
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        server.clients.append(self.request)
+        while True:
+            hdr = self.recv_exact(6)
+            if hdr is None:
+                break
+            tid, pid, pdu_len = struct.unpack('>HHH', hdr)
+            pdu = self.recv_exact(pdu_len)
+            if pdu is None:
+                break
+            slave_id, func = struct.unpack('>BB', pdu[:2])
+            addr, count = struct.unpack('>HH', pdu[2:6])
+            server.requests.append((slave_id, func, addr, count))
+
+            modbus_map = server.maps.get(slave_id)
+            except_code = server.except_code
+            if modbus_map is None:
+                except_code = 11
+            resp = None
+            if not except_code and server.max_count is not None and count > server.max_count:
+                except_code = 3
+            if not except_code:
+                try:
+                    if func == FUNC_WRITE_MULTIPLE:
+                        modbus_map.write(addr, pdu[7:])
+                        resp = struct.pack('>BBHH', slave_id, func, addr, count)
+                    else:
+                        data = modbus_map.read(addr, count, func)
+                        resp = struct.pack('>BBB', slave_id, func, len(data)) + data
+                except mbmap.ModbusMapError:
+                    except_code = 2
+            if except_code:
+                resp = struct.pack('>BBB', slave_id, func | 0x80, except_code)
+            if not server.echo_tid:
+                tid = 0
+            if server.delay:
+                time.sleep(server.delay)
+            self.request.sendall(struct.pack('>HHH', tid, 0, len(resp)) + resp)
+
+
+class ModbusTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    """Modbus TCP server for tests serving Modbus maps on the loopback
+    interface. Each slave id is served from its own Modbus map.
+
+    Parameters:
+
+        maps :
+            Dictionary of :const:`sunspec.core.modbus.mbmap.ModbusMap` objects
+            indexed by slave id.
+
+    The except_code attribute can be set to return an exception response to
+    every request and echo_tid can be cleared to always respond with a
+    transaction id of 0. If max_count is set, requests for more registers
+    get an illegal data value exception response. Responses are sent after
+    delay seconds if delay is set.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, maps):
+        socketserver.TCPServer.__init__(self, ('127.0.0.1', 0), ModbusTCPHandler)
+        self.maps = maps
+        self.connections = 0
+        self.requests = []
+        self.except_code = None
+        self.echo_tid = True
+        self.max_count = None
+        self.delay = None
+        self.clients = []
+        self.thread = threading.Thread(target=self.serve_forever)
+        self.thread.daemon = True
+
+    @property
+    def ipaddr(self):
+        return self.server_address[0]
+
+    @property
+    def ipport(self):
+        return self.server_address[1]
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def drop_connections(self):
+        """Close all client connections from the server side."""
+
+        for client in self.clients:
+            try:
+                client.shutdown(socket.SHUT_RDWR)
+            except Exception:
+                pass
+        self.clients = []
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
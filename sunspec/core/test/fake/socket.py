@@ -56,6 +56,15 @@ class socket(object):
                 self.in_buf = self.in_buf[read_len:]
         return data
 
+    def recv_into(self, buffer, nbytes=0):
+        if not nbytes:
+            nbytes = len(buffer)
+        data = self.recv(nbytes)
+        n = len(data)
+        if n > 0:
+            buffer[:n] = data
+        return n
+
     def send(self, data):
         self.out_buf += data
 
@@ -0,0 +1,180 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+import sys
+import os
+import unittest
+
+import sunspec.core.client as client
+import sunspec.core.device as device
+import sunspec.core.retry as retry
+import sunspec.core.util as util
+import sunspec.core.modbus.client as modbus
+import sunspec.core.modbus.mbmap as mbmap
+import sunspec.core.test.fake.server as server
+
+if sys.version_info >= (3, 5):
+    import asyncio
+    import sunspec.core.aioclient as aioclient
+    import sunspec.core.modbus.aioclient as aiomodbus
+
+
+@unittest.skipIf(sys.version_info < (3, 5), 'asyncio client requires Python 3.5 or later')
+class TestAsyncClient(unittest.TestCase):
+    def setUp(self):
+        path = os.path.abspath(__file__)
+        self.pathlist = util.PathList(['.',
+                                       os.path.join(os.path.dirname(path),
+                                                    'devices')])
+
+        device.check_for_models(pathlist=self.pathlist)
+
+        self.servers = []
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        for s in self.servers:
+            s.stop()
+        self.loop.close()
+
+    def server(self, filename='mbmap_test_device_1.xml', slave_ids=(1,)):
+        maps = {}
+        for slave_id in slave_ids:
+            m = mbmap.ModbusMap(slave_id)
+            m.from_xml(filename, self.pathlist)
+            maps[slave_id] = m
+        s = server.ModbusTCPServer(maps).start()
+        self.servers.append(s)
+        return s
+
+    def run_coroutine(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def run_tasks(self, coros):
+        tasks = [self.loop.create_task(coro) for coro in coros]
+        self.loop.run_until_complete(asyncio.wait(tasks))
+        return [task.result() for task in tasks]
+
+    def test_modbus_client_device_tcp_async_read_write(self):
+        s = self.server()
+        d = aiomodbus.AsyncModbusClientDeviceTCP(1, s.ipaddr, s.ipport, max_count=50)
+
+        data = self.run_coroutine(d.read(40000, 2))
+        if data != b'SunS':
+            raise Exception("Read data mismatch - expected: 'SunS' received: %s" % (data))
+
+        # read spanning several requests
+        data = self.run_coroutine(d.read(40000, 180))
+        if data != s.maps[1].read(40000, 180):
+            raise Exception('Read data mismatch for chunked read')
+        if s.requests[-4:] != [(1, 3, 40000, 50), (1, 3, 40050, 50), (1, 3, 40100, 50), (1, 3, 40150, 30)]:
+            raise Exception('Unexpected chunked requests: %s' % (s.requests[-4:]))
+
+        self.run_coroutine(d.write(40004, b'ABCD'))
+        if s.maps[1].read(40004, 2) != b'ABCD':
+            raise Exception('Write data mismatch')
+
+        with self.assertRaises(modbus.ModbusClientException):
+            self.run_coroutine(d.read(45000, 2))
+
+        d.close()
+
+    def test_modbus_client_device_tcp_async_stale_reply(self):
+        s = self.server()
+        d = aiomodbus.AsyncModbusClientDeviceTCP(1, s.ipaddr, s.ipport, timeout=.2)
+        self.run_coroutine(d.connect())
+
+        # the late reply to a timed out request is not taken as the reply to
+        # the next request
+        s.delay = .4
+        with self.assertRaises(modbus.ModbusClientTimeout):
+            self.run_coroutine(d.read(40000, 2))
+        s.delay = None
+        self.run_coroutine(asyncio.sleep(.4))
+        data = self.run_coroutine(d.read(40004, 2))
+        if data != s.maps[1].read(40004, 2):
+            raise Exception('Stale reply returned: %s' % (data))
+        if d.writer is None:
+            raise Exception('Connection not reopened')
+
+        # replies with another transaction id are rejected
+        s.echo_tid = False
+        with self.assertRaises(modbus.ModbusClientError):
+            self.run_coroutine(d.read(40000, 2))
+        s.echo_tid = True
+        if self.run_coroutine(d.read(40000, 2)) != b'SunS':
+            raise Exception('Read data mismatch')
+
+        d.close()
+
+    def test_client_device_async_scan_read_points(self):
+        s = self.server(slave_ids=(1, 2, 3))
+        devices = [aioclient.AsyncClientDevice(slave_id=slave_id, ipaddr=s.ipaddr, ipport=s.ipport)
+                   for slave_id in (1, 2, 3)]
+
+        # drive all devices concurrently from the one event loop
+        self.run_tasks([d.scan() for d in devices])
+        self.run_tasks([d.read_points() for d in devices])
+
+        dp = device.Device()
+        dp.from_pics(filename='pics_test_device_1.xml', pathlist=self.pathlist)
+        for d in devices:
+            not_equal = dp.not_equal(d)
+            if not_equal:
+                raise Exception(not_equal)
+
+        model = devices[0].models[63001][0]
+        model.points['int16_4'].value = 330
+        self.run_coroutine(model.write_points())
+        self.run_coroutine(model.read_points())
+        if model.points['int16_4'].value != 330:
+            raise Exception("'int16_4' write failure: {}".format(model.points['int16_4'].value))
+
+        model.points['int16_4'].value = 331
+        if self.run_coroutine(model.write_points(verify=client.VERIFY_RAISE)) != []:
+            raise Exception("'int16_4' write not verified")
+
+        for d in devices:
+            d.close()
+
+    def test_client_device_async_retry(self):
+        s = self.server()
+        d = aioclient.AsyncClientDevice(slave_id=1, ipaddr=s.ipaddr, ipport=s.ipport)
+        d.retry_policy = retry.RetryPolicy(attempts=3, backoff=0, breaker_failures=1)
+
+        s.except_code = modbus.EXCEPT_DEVICE_BUSY
+        with self.assertRaises(aioclient.SunSpecClientError):
+            self.run_coroutine(d.read(40000, 2))
+        if len(s.requests) != 3:
+            raise Exception('Unexpected requests: %s' % (s.requests))
+        # the device answered so the breaker stays closed
+        s.except_code = None
+        if self.run_coroutine(d.read(40000, 2)) != b'SunS' or d.breaker.state != retry.BREAKER_CLOSED:
+            raise Exception('Read after busy failed')
+
+        d.close()
+
+
+if __name__ == "__main__":
+
+    unittest.main()
@@ -23,11 +23,18 @@
 
 import sys
 import os
+import shutil
+import tempfile
 import unittest
 
 import sunspec.core.client as client
 import sunspec.core.device as device
+import sunspec.core.retry as retry
 import sunspec.core.util as util
+import sunspec.core.modbus.client as modbus
+import sunspec.core.modbus.mbmap as mbmap
+import sunspec.core.scancache as scancache
+import sunspec.core.test.fake.server as server
 
 
 class TestClientDevice(unittest.TestCase):
@@ -54,6 +61,128 @@ class TestClientDevice(unittest.TestCase):
             raise Exception(not_equal)
 
 
+    def test_client_device_write_points(self):
+        d = client.ClientDevice(client.MAPPED, slave_id=1, name='mbmap_test_device_1.xml', pathlist=self.pathlist)
+        d.scan()
+        d.read_points()
+
+        writes = []
+        write = d.modbus_device.write
+        def record_write(addr, data):
+            writes.append((addr, len(data) // 2))
+            return write(addr, data)
+        d.modbus_device.write = record_write
+
+        common = d.models[1][0]
+        model = d.models[63001][0]
+        common.points['DA'].value = 7
+        model.points['int32_3'].value = 140000
+        model.points['ipaddr'].value = 0x0a000001
+        model.points['int64'].value = 240
+        # scaled values set directly
+        for point, value in ((model.blocks[1].points['uint32'], 37), (model.blocks[2].points['int16_11'], 41)):
+            point.value_base = value
+            point.dirty = True
+
+        # the modified points of all models are written in one pass, the read
+        # only registers between them are never rewritten
+        d.write_gap = 20
+        d.write_points()
+        if writes != [(40068, 1), (40098, 2), (40130, 2), (40134, 4), (40218, 2), (40225, 1)]:
+            raise Exception('Unexpected writes: %s' % (writes))
+        if [p for m in d.models_list for b in m.blocks for p in b.points_list if p.dirty]:
+            raise Exception('Points not marked as written')
+
+        d.read_points()
+        if (common.points['DA'].value != 7 or model.points['int64'].value != 240 or
+                model.blocks[2].points['int16_11'].value_base != 41):
+            raise Exception('Points not written')
+
+        # nothing to write
+        del writes[:]
+        model.write_points()
+        if writes:
+            raise Exception('Unexpected writes: %s' % (writes))
+
+        # the points of a failed request and of the requests not sent stay
+        # modified
+        def failing_write(addr, data):
+            if addr == 40130:
+                raise modbus.ModbusClientError('Write failed')
+            return record_write(addr, data)
+        d.modbus_device.write = failing_write
+        common.points['DA'].value = 8
+        model.points['int32_3'].value = 140001
+        model.points['ipaddr'].value = 0x0a000002
+        model.points['int64'].value = 241
+        try:
+            d.write_points()
+            raise Exception('Write error not raised')
+        except client.SunSpecClientError:
+            pass
+        if writes != [(40068, 1), (40098, 2)]:
+            raise Exception('Unexpected writes: %s' % (writes))
+        dirty = [p.point_type.id for m in d.models_list for b in m.blocks for p in b.points_list if p.dirty]
+        if dirty != ['ipaddr', 'int64']:
+            raise Exception('Unexpected modified points: %s' % (dirty))
+        del writes[:]
+        d.modbus_device.write = record_write
+        model.write_points()
+        if writes != [(40130, 2), (40134, 4)]:
+            raise Exception('Unexpected writes: %s' % (writes))
+
+        d.close()
+
+    def test_client_model_write_points_verify(self):
+        d = client.ClientDevice(client.MAPPED, slave_id=1, name='mbmap_test_device_1.xml', pathlist=self.pathlist)
+        d.scan()
+        d.read_points()
+        model = d.models[63001][0]
+
+        reads = []
+        read = d.modbus_device.read
+        def record_read(addr, count, op=None):
+            reads.append((addr, count))
+            return read(addr, count)
+        d.modbus_device.read = record_read
+        write = d.modbus_device.write
+        def clamp_write(addr, data):
+            # the device keeps its own value for ipaddr
+            if addr == 40130:
+                data = b'\x00\x00\x00\x01' + data[4:]
+            return write(addr, data)
+        d.modbus_device.write = clamp_write
+
+        # only the written registers are read back, merged into one request
+        model.points['int16_4'].value = 330
+        model.points['uint16_4'].value = 440
+        if model.write_points(verify=client.VERIFY_RAISE) != []:
+            raise Exception('Unexpected verification mismatch')
+        if reads != [(40079, 7)]:
+            raise Exception('Unexpected verification reads: %s' % (reads))
+
+        # mismatches are reported per point
+        del reads[:]
+        model.points['ipaddr'].value = 0x0a000001
+        model.points['int64'].value = 240
+        mismatches = model.write_points(verify=client.VERIFY_REPORT)
+        if [(point.point_type.id, data) for point, data in mismatches] != [('ipaddr', b'\x00\x00\x00\x01')]:
+            raise Exception('Unexpected mismatches: %s' % (mismatches))
+        if reads != [(40130, 8)]:
+            raise Exception('Unexpected verification reads: %s' % (reads))
+
+        model.points['ipaddr'].value = 0x0a000002
+        with self.assertRaises(client.SunSpecClientError):
+            model.write_points(verify=client.VERIFY_RAISE)
+
+        # no read back without verification
+        del reads[:]
+        model.points['int16_4'].value = 331
+        if model.write_points() != [] or reads:
+            raise Exception('Unexpected verification')
+
+        d.close()
+
     def test_sunspec_client_device_1(self):
         d = client.SunSpecClientDevice(client.MAPPED, slave_id=1,
                                         name='mbmap_test_device_1.xml',
@@ -185,6 +314,376 @@ class TestClientDevice(unittest.TestCase):
 
         d.close()
 
+    def server(self, filename, slave_ids=(1,)):
+        maps = {}
+        for slave_id in slave_ids:
+            maps[slave_id] = mbmap.ModbusMap(slave_id)
+            maps[slave_id].from_xml(filename, self.pathlist)
+        s = server.ModbusTCPServer(maps).start()
+        self.addCleanup(s.stop)
+        return s
+
+    def test_client_device_read_points_coalesced(self):
+        s = self.server('mbmap_test_inverter_3.xml')
+
+        d = client.ClientDevice(client.TCP, slave_id=1, ipaddr=s.ipaddr, ipport=s.ipport)
+        d.scan()
+        if [(m.id, m.addr) for m in d.models_list] != [(1, 40004), (103, 40072), (160, 40124), (160, 40194),
+                                                       (160, 40264)]:
+            raise Exception('Unexpected models: %s' % ([(m.id, m.addr) for m in d.models_list]))
+
+        # 5 models and headers in 330 registers
+        del s.requests[:]
+        d.read_points()
+        if s.requests != [(1, 3, 40002, 125), (1, 3, 40127, 125), (1, 3, 40252, 80)]:
+            raise Exception('Unexpected coalesced requests: %s' % (s.requests))
+
+        dm = client.ClientDevice(client.TCP, slave_id=1, ipaddr=s.ipaddr, ipport=s.ipport)
+        dm.read_coalesce = False
+        dm.scan()
+        del s.requests[:]
+        dm.read_points()
+        if len(s.requests) != 5:
+            raise Exception('Unexpected model requests: %s' % (s.requests))
+
+        for m, mm in zip(d.models_list, dm.models_list):
+            for b, bm in zip(m.blocks, mm.blocks):
+                for name, point in b.points.items():
+                    if point.value_base != bm.points[name].value_base or point.value_sf != bm.points[name].value_sf:
+                        raise Exception('Model %d point %s not equal: %s %s' % (m.id, name, point.value_base,
+                                                                                bm.points[name].value_base))
+
+        d.close()
+        dm.close()
+
+    def test_client_device_read_points_subset(self):
+        s = self.server('mbmap_test_inverter_3.xml')
+
+        d = client.ClientDevice(client.TCP, slave_id=1, ipaddr=s.ipaddr, ipport=s.ipport)
+        d.scan()
+        dm = client.ClientDevice(client.TCP, slave_id=1, ipaddr=s.ipaddr, ipport=s.ipport)
+        dm.scan()
+        dm.read_points()
+
+        # A, PhVphA, and W with the A_SF, V_SF, and W_SF dependencies in a single request
+        del s.requests[:]
+        points = d.read_points_subset([(103, ['W', 'A', 'PhVphA'])])
+        if s.requests != [(1, 3, 40072, 14)]:
+            raise Exception('Unexpected subset requests: %s' % (s.requests))
+        if [point.point_type.id for point in points] != ['W', 'A', 'PhVphA']:
+            raise Exception('Unexpected subset points: %s' % ([point.point_type.id for point in points]))
+        for point in points:
+            expected = dm.models[103][0].points[point.point_type.id]
+            if point.value != expected.value or point.value_sf is None:
+                raise Exception('Point %s not equal: %s %s' % (point.point_type.id, point.value, expected.value))
+        if d.models[103][0].points['Hz'].value_base is not None:
+            raise Exception('Point Hz read')
+
+        # no gap tolerance
+        del s.requests[:]
+        d.read_points_subset([(103, ['W', 'A', 'PhVphA'])], gap=0)
+        if s.requests != [(1, 3, 40072, 1), (1, 3, 40076, 1), (1, 3, 40080, 1), (1, 3, 40083, 3)]:
+            raise Exception('Unexpected subset requests: %s' % (s.requests))
+
+        # repeating block points in every model instance
+        del s.requests[:]
+        points = d.read_points_subset([(160, ['DCW'])], gap=20)
+        if len(points) != 9 or s.requests != [(1, 3, 40126, 58), (1, 3, 40196, 58), (1, 3, 40266, 58)]:
+            raise Exception('Unexpected subset points: %s %s' % (len(points), s.requests))
+
+        try:
+            d.read_points_subset([(103, ['Unknown'])])
+            raise Exception('Unknown point read')
+        except client.SunSpecClientError:
+            pass
+
+        d.close()
+        dm.close()
+
+    def test_client_device_scan_speculative(self):
+        s = self.server('mbmap_test_inverter_3.xml')
+        layout = [(1, 40004, 66), (103, 40072, 50), (160, 40124, 68), (160, 40194, 68), (160, 40264, 68)]
+
+        # model headers are taken from read ahead windows, the last read
+        # ahead fails at the end of the map
+        d = client.ClientDevice(client.TCP, slave_id=1, ipaddr=s.ipaddr, ipport=s.ipport)
+        d.scan()
+        if s.requests != [(1, 3, 40000, 3), (1, 3, 40002, 125), (1, 3, 40192, 125), (1, 3, 40332, 125),
+                          (1, 3, 40332, 2)]:
+            raise Exception('Unexpected speculative scan requests: %s' % (s.requests))
+        if [(m.id, m.addr, m.len) for m in d.models_list] != layout:
+            raise Exception('Unexpected models: %s' % ([(m.id, m.addr, m.len) for m in d.models_list]))
+        if not d.scan_speculative:
+            raise Exception('Speculative scan disabled')
+
+        # a failed read ahead falls back to the model header and shrinks
+        # the later read ahead windows
+        s.max_count = 3
+        del s.requests[:]
+        d = client.ClientDevice(client.TCP, slave_id=1, ipaddr=s.ipaddr, ipport=s.ipport)
+        d.scan()
+        if s.requests != [(1, 3, 40000, 3), (1, 3, 40002, 125), (1, 3, 40002, 2), (1, 3, 40070, 62),
+                          (1, 3, 40070, 2), (1, 3, 40122, 31), (1, 3, 40122, 2), (1, 3, 40192, 15),
+                          (1, 3, 40192, 2), (1, 3, 40262, 7), (1, 3, 40262, 2), (1, 3, 40332, 3),
+                          (1, 3, 40332, 2)]:
+            raise Exception('Unexpected shrinking scan requests: %s' % (s.requests))
+        if [(m.id, m.addr, m.len) for m in d.models_list] != layout:
+            raise Exception('Unexpected models: %s' % ([(m.id, m.addr, m.len) for m in d.models_list]))
+        if not d.scan_speculative:
+            raise Exception('Speculative scan disabled by a failed read ahead')
+
+        # devices rejecting reads of a whole model header fall back to the
+        # per register walk
+        s.max_count = None
+        del s.requests[:]
+        d = client.ClientDevice(client.TCP, slave_id=1, ipaddr=s.ipaddr, ipport=s.ipport)
+        read = d.modbus_device.read
+        def header_read(addr, count, op=None):
+            if addr > 40000 and count > 1:
+                raise modbus.ModbusClientException('Modbus exception 2', modbus.EXCEPT_ILLEGAL_ADDRESS)
+            return read(addr, count)
+        d.modbus_device.read = header_read
+        d.scan()
+        if s.requests[:2] != [(1, 3, 40000, 3), (1, 3, 40003, 1)] or len(s.requests) != 11:
+            raise Exception('Unexpected fallback scan requests: %s' % (s.requests))
+        if [(m.id, m.addr, m.len) for m in d.models_list] != layout:
+            raise Exception('Unexpected models: %s' % ([(m.id, m.addr, m.len) for m in d.models_list]))
+        if d.scan_speculative:
+            raise Exception('Speculative scan not disabled')
+
+        # a short model header read ends the scan
+        for short_addr in (40192, 40193):
+            d = client.ClientDevice(client.TCP, slave_id=1, ipaddr=s.ipaddr, ipport=s.ipport)
+            d.scan_speculative = False
+            read = d.modbus_device.read
+            def short_read(addr, count, op=None):
+                if addr == short_addr:
+                    return b''
+                return read(addr, count)
+            d.modbus_device.read = short_read
+            d.scan()
+            if [(m.id, m.addr, m.len) for m in d.models_list] != layout[:3]:
+                raise Exception('Unexpected models: %s' % ([(m.id, m.addr, m.len) for m in d.models_list]))
+
+    def test_client_device_scan_cache(self):
+        s = self.server('mbmap_test_inverter_3.xml')
+        filename = os.path.join(tempfile.mkdtemp(), 'scan_cache.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(filename))
+
+        # first scan walks the model chain and fills the cache
+        d1 = client.ClientDevice(client.TCP, slave_id=1, ipaddr=s.ipaddr, ipport=s.ipport)
+        d1.scan_cache = scancache.ScanCache(filename)
+        d1.scan()
+        layout = [(m.id, m.addr, m.len) for m in d1.models_list]
+        if not os.path.exists(filename):
+            raise Exception('Scan cache not saved')
+
+        # a new client validates the cached layout with a single read
+        del s.requests[:]
+        d2 = client.ClientDevice(client.TCP, slave_id=1, ipaddr=s.ipaddr, ipport=s.ipport)
+        d2.scan_cache = scancache.ScanCache(filename)
+        d2.scan()
+        if s.requests != [(1, 3, 40000, 70)]:
+            raise Exception('Unexpected cached scan requests: %s' % (s.requests))
+        if [(m.id, m.addr, m.len) for m in d2.models_list] != layout:
+            raise Exception('Unexpected cached models: %s' % ([(m.id, m.addr, m.len) for m in d2.models_list]))
+        if d2.models[1][0].points['SN'].value != d1.models[1][0].points['SN'].value:
+            raise Exception('Common model not set')
+        d2.read_points()
+
+        # firmware version change invalidates the entry
+        vr = d1.models[1][0].points['Vr']
+        s.maps[1].write(vr.addr, b'9.9.9'.ljust(16, b'\0'))
+        del s.requests[:]
+        d3 = client.ClientDevice(client.TCP, slave_id=1, ipaddr=s.ipaddr, ipport=s.ipport)
+        d3.scan_cache = scancache.ScanCache(filename)
+        d3.scan()
+        if len(s.requests) <= 2:
+            raise Exception('Device not rescanned: %s' % (s.requests))
+        if [(m.id, m.addr, m.len) for m in d3.models_list] != layout:
+            raise Exception('Unexpected rescanned models')
+        entry = scancache.ScanCache(filename).get(d3.scan_key())
+        if entry['fingerprint']['Vr'] != '9.9.9':
+            raise Exception('Scan cache entry not updated: %s' % (entry))
+
+        d1.close()
+        d2.close()
+        d3.close()
+
+    def test_client_device_read_points_partial(self):
+        d = client.ClientDevice(client.MAPPED, slave_id=1, name='mbmap_test_inverter_3.xml', pathlist=self.pathlist)
+        d.scan()
+        d.retry_policy = retry.RetryPolicy(backoff=0)
+
+        # fail the reads covering model 103
+        faults = {}
+        requests = []
+        read = d.modbus_device.read
+        def faulty_read(addr, count, op=None):
+            requests.append((addr, count))
+            if addr <= 40072 < addr + count and faults.get('error'):
+                raise faults['error']
+            if addr <= 40072 < addr + count and faults.get('coalesced') and count != 50:
+                raise modbus.ModbusClientException('Modbus exception 2', modbus.EXCEPT_ILLEGAL_ADDRESS)
+            data = read(addr, count)
+            if addr <= 40072 < addr + count and faults.get('short'):
+                data = data[:-2]
+            if addr <= 40194 < addr + count and count > 68 and faults.get('short_span'):
+                data = data[:-20]
+            return data
+        d.modbus_device.read = faulty_read
+
+        faults['error'] = modbus.ModbusClientException('Modbus exception 2', modbus.EXCEPT_ILLEGAL_ADDRESS)
+        with self.assertRaises(client.SunSpecClientError):
+            d.read_points()
+        if not d.read_coalesce:
+            raise Exception('Coalescing disabled although the model read failed')
+
+        failed = d.read_points(partial=True)
+        inverter = d.models[103][0]
+        if failed != [inverter]:
+            raise Exception('Unexpected failed models: %s' % ([m.id for m in failed]))
+        if inverter.status != client.READ_EXCEPTION or inverter.except_code != 2 or inverter.stale:
+            raise Exception('Unexpected model status: %s %s' % (inverter.status, inverter.except_code))
+        for m in d.models_list:
+            if m is not inverter and (m.status != client.READ_OK or m.read_time is None or m.stale):
+                raise Exception('Model %s not read: %s %s' % (m.id, m.status, m.error))
+        if not d.read_coalesce:
+            raise Exception('Coalescing disabled by a failed model')
+
+        # the failed model is read on its own after the coalesced reads of
+        # the others
+        faults.clear()
+        del requests[:]
+        if d.read_points(partial=True) or inverter.status != client.READ_OK:
+            raise Exception('Model not recovered: %s' % (inverter.error))
+        if requests != [(40002, 68), (40122, 121), (40243, 89), (40072, 50)]:
+            raise Exception('Unexpected requests: %s' % (requests))
+        w = inverter.points['W'].value_base
+
+        # last good values are kept and flagged stale
+        faults['error'] = modbus.ModbusClientTimeout('Response timeout')
+        good_time = inverter.good_time
+        d.read_points(partial=True)
+        if inverter.status != client.READ_TIMEOUT or not inverter.stale or inverter.good_time != good_time:
+            raise Exception('Unexpected timeout status: %s %s' % (inverter.status, inverter.stale))
+        if inverter.points['W'].value_base != w:
+            raise Exception('Last good value not kept')
+
+        faults.clear()
+        faults['short'] = True
+        d.read_points(partial=True)
+        if inverter.status != client.READ_SHORT or not inverter.stale:
+            raise Exception('Unexpected short read status: %s' % (inverter.status))
+
+        # coalescing is disabled once the models can be read one at a time
+        faults.clear()
+        faults['coalesced'] = True
+        d.read_points()
+        if d.read_coalesce or inverter.status != client.READ_OK:
+            raise Exception('Coalescing not disabled: %s' % (inverter.status))
+
+        # a short coalesced response fails the models it does not contain
+        d.read_coalesce = True
+        faults.clear()
+        faults['short_span'] = True
+        failed = d.read_points(partial=True)
+        if not failed or [m.id for m in failed] != [160] * len(failed):
+            raise Exception('Unexpected failed models: %s' % ([m.id for m in failed]))
+        for m in d.models_list:
+            status = client.READ_SHORT if m in failed else client.READ_OK
+            if m.status != status:
+                raise Exception('Unexpected model %s status: %s' % (m.id, m.status))
+
+        # without partial mode the models are read one at a time
+        d.read_points()
+        if d.read_coalesce or [m for m in d.models_list if m.status != client.READ_OK]:
+            raise Exception('Short coalesced response not read per model')
+
+        d.close()
+
+    def test_client_device_read_changes(self):
+        d = client.ClientDevice(client.MAPPED, slave_id=1, name='mbmap_test_inverter_3.xml', pathlist=self.pathlist)
+        d.scan()
+        inverter = d.models[103][0]
+        points = inverter.points
+
+        # all points are returned on the first read
+        changed = d.read_changes()
+        count = sum([len(block.points_list) for m in d.models_list for block in m.blocks])
+        count += sum([len(block.points_sf) for m in d.models_list for block in m.blocks])
+        if len(changed) != count:
+            raise Exception('Unexpected first read changes: %s of %s' % (len(changed), count))
+
+        if d.read_changes() != []:
+            raise Exception('Unchanged registers reported as changed')
+
+        # a changed register only decodes its point
+        d.modbus_device.modbus_map.write(40072, b'\x04\xd2')
+        changed = d.read_changes()
+        if changed != [points['A']] or inverter.changed != changed or points['A'].value_base != 1234:
+            raise Exception('Unexpected changes: %s' % ([p.point_type.id for p in changed]))
+
+        # a changed scale factor also updates the points using it
+        d.modbus_device.modbus_map.write(40076, b'\x00\x02')
+        changed = [p.point_type.id for p in inverter.read_points()]
+        if sorted(changed) != ['A', 'A_SF', 'AphA', 'AphB', 'AphC'] or points['A'].value != 123400:
+            raise Exception('Unexpected scale factor changes: %s %s' % (changed, points['A'].value))
+
+        # a modified point that has not been written is restored
+        w = points['W'].value_base
+        points['W'].value = points['W'].value * 2
+        if inverter.read_points() != [points['W']] or points['W'].value_base != w:
+            raise Exception('Modified point not restored: %s' % (points['W'].value_base))
+        if d.read_changes() != []:
+            raise Exception('Restored point reported as changed')
+
+        d.close()
+
+    def test_client_device_read_after_write(self):
+        d = client.ClientDevice(client.MAPPED, slave_id=1, name='mbmap_test_inverter_3.xml', pathlist=self.pathlist)
+        d.scan()
+        d.read_points()
+        m = d.modbus_device.modbus_map
+        common = d.models[1][0]
+        da = common.points['DA']
+        inverter = d.models[103][0]
+        w = inverter.points['W']
+
+        # a register reverted by the device after a device write is read
+        da.value = 77
+        d.write_points()
+        m.write(da.addr, b'\x00\x01')
+        d.read_points()
+        if da.value != 1:
+            raise Exception('Reverted register not read: %s' % (da.value))
+
+        # model write
+        da.value = 77
+        common.write_points()
+        m.write(da.addr, b'\x00\x01')
+        if d.read_changes() != [da] or da.value != 1:
+            raise Exception('Reverted register not read after model write: %s' % (da.value))
+
+        # point write
+        da.value = 77
+        da.write()
+        m.write(da.addr, b'\x00\x01')
+        d.read_points()
+        if da.value != 1:
+            raise Exception('Reverted register not read after point write: %s' % (da.value))
+
+        # a subset read is followed by the next read of the entire model
+        w_base = w.value_base
+        m.write(w.addr, b'\x00\x07')
+        d.read_points_subset([(103, ['W'])])
+        m.write(w.addr, util.u16_to_data(w_base))
+        d.read_points()
+        if w.value_base != w_base:
+            raise Exception('Register read after subset read not set: %s' % (w.value_base))
+
+        d.close()
+
 
 if __name__ == "__main__":
 
@@ -0,0 +1,140 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+import array
+import os
+import threading
+import unittest
+
+import sunspec.core.client as client
+import sunspec.core.columnar as columnar
+import sunspec.core.device as device
+import sunspec.core.util as util
+
+
+class TestColumnar(unittest.TestCase):
+    def setUp(self):
+        path = os.path.abspath(__file__)
+        self.pathlist = util.PathList(['.',
+                                       os.path.join(os.path.dirname(path),
+                                                    'devices')])
+
+        device.check_for_models(pathlist=self.pathlist)
+
+    def device(self, store=None):
+        d = client.ClientDevice(client.MAPPED, slave_id=1, name='mbmap_test_inverter_3.xml', pathlist=self.pathlist)
+        d.store = store
+        d.scan()
+        d.read_points()
+        return d
+
+    def test_fleet_store(self):
+        store = columnar.FleetStore()
+        dp = self.device()
+        d1 = self.device(store)
+        d2 = self.device(store)
+
+        # points are views into the store columns
+        for d in (d1, d2):
+            for m, mp in zip(d.models_list, dp.models_list):
+                for b, bp in zip(m.blocks, mp.blocks):
+                    for pid, point in b.points.items():
+                        if not isinstance(point, client.ColumnPoint):
+                            raise Exception('Point %s is not a column point' % (pid))
+                        if point.value != bp.points[pid].value:
+                            raise Exception('Point %s not equal: %s %s' % (pid, point.value, bp.points[pid].value))
+
+        w = dp.models[103][0].points['W'].value
+        if store.values(103, 'W') != [w, w]:
+            raise Exception('Unexpected W values: %s' % (store.values(103, 'W')))
+        if store.sum(103, 'W') != w * 2:
+            raise Exception('Unexpected W sum: %s' % (store.sum(103, 'W')))
+
+        # numeric points use typed columns with the scale precomputed
+        columns = store.models[103]
+        a = dp.models[103][0].points['A']
+        if not isinstance(columns.base[(0, 'A')], array.array) or columns.integer[(0, 'A')] is not True:
+            raise Exception('A column not typed')
+        if columns.scale[(0, 'A')][0] != columnar.scale(a.value_sf):
+            raise Exception('Unexpected A scale: %s' % (columns.scale[(0, 'A')]))
+        if store.values(103, 'A') != [a.value, a.value] or abs(store.sum(103, 'A') - a.value * 2) > 1e-9:
+            raise Exception('Unexpected A values: %s' % (store.values(103, 'A')))
+        if not isinstance(store.models[1].base[(0, 'Mn')], list):
+            raise Exception('Mn column not a list column')
+        if d1.models[103][0].points['A'].value_base != a.value_base or \
+                not isinstance(d1.models[103][0].points['A'].value_base, int):
+            raise Exception('Unexpected A value_base')
+
+        # repeating block columns, 3 model 160 instances per device
+        dcw = [b.points['DCW'].value for m in dp.models[160] for b in m.blocks[1:2]]
+        if store.values(160, 'DCW', 1) != dcw * 2:
+            raise Exception('Unexpected DCW values: %s' % (store.values(160, 'DCW', 1)))
+
+        d1.models[103][0].points['W'].value_base = None
+        if store.values(103, 'W') != [None, w]:
+            raise Exception('Unexpected W values: %s' % (store.values(103, 'W')))
+
+        # released slots are reused
+        store.release(d1)
+        if store.values(103, 'W') != [None, w]:
+            raise Exception('Unexpected W values: %s' % (store.values(103, 'W')))
+        self.device(store)
+        if store.values(103, 'W') != [w, w] or len(store.models[103].models) != 2:
+            raise Exception('Unexpected W values: %s' % (store.values(103, 'W')))
+
+        # closing a device releases its slots
+        dp.close()
+        d2.close()
+        if store.values(103, 'W') != [w, None] or store.models[103].free != [1]:
+            raise Exception('Unexpected W values: %s' % (store.values(103, 'W')))
+
+    def test_fleet_store_threads(self):
+        store = columnar.FleetStore()
+        errors = []
+        def worker():
+            try:
+                for i in range(5):
+                    self.device(store).close()
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=worker) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            raise Exception('Device load failed: %s' % (errors[0]))
+
+        # all columns hold a value for every slot and all slots are free
+        for columns in store.models.values():
+            count = len(columns.models)
+            for key in columns.base:
+                if (len(columns.base[key]), len(columns.sf[key]), len(columns.scale[key])) != (count, count, count):
+                    raise Exception('Column %s length mismatch in model %s' % (key, columns.model_id))
+            if sorted(columns.free) != list(range(count)):
+                raise Exception('Slots not released in model %s' % (columns.model_id))
+
+
+if __name__ == "__main__":
+
+    unittest.main()
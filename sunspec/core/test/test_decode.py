@@ -0,0 +1,83 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+import os
+import random
+import sys
+import unittest
+
+import sunspec.core.decode as decode
+import sunspec.core.device as device
+import sunspec.core.smdx as smdx
+import sunspec.core.suns as suns
+
+
+def decode_points(block_type, data):
+    # reference per point decode
+    values = {}
+    for point_type in block_type.points_list:
+        if point_type.type != suns.SUNS_TYPE_PAD:
+            offset = int(point_type.offset) * 2
+            value = point_type.data_to(data[offset:offset + int(point_type.len) * 2])
+            if type(value) == bytes and sys.version_info > (3,):
+                value = str(value, 'latin-1')
+            if not point_type.is_impl(value):
+                value = None
+            values[point_type.id] = value
+    return values
+
+
+class TestDecode(unittest.TestCase):
+
+    def test_block_decoder(self):
+        model_ids = []
+        for filename in os.listdir(device.model_type_path_default):
+            model_id = smdx.model_filename_to_id(filename)
+            if model_id is not None:
+                model_ids.append(model_id)
+        if not model_ids:
+            raise Exception('No model definitions found')
+
+        rand = random.Random(1)
+        for model_id in sorted(model_ids):
+            model_type = device.model_type_get(model_id)
+            for block_type in (model_type.fixed_block, model_type.repeating_block):
+                if block_type is None:
+                    continue
+                decoder = decode.block_decoder(block_type)
+                if decode.block_decoder(block_type) is not decoder:
+                    raise Exception('Decoder for model %s not cached' % (model_id))
+                size = int(block_type.len) * 2
+                # random, all unimplemented (0xffff and 0x8000 patterns), and all zero contents
+                for data in (bytes(bytearray(rand.getrandbits(8) for i in range(size))),
+                             b'\xff' * size, b'\x80\x00' * (size // 2), b'\x00' * size):
+                    values = dict(zip(decoder.ids, decoder.decode(b'\x00\x00' + data, 2)))
+                    expected = decode_points(block_type, data)
+                    if values != expected:
+                        raise Exception('Model %s block %s decode mismatch: %s %s' %
+                                        (model_id, block_type.type, values, expected))
+
+
+if __name__ == "__main__":
+
+    unittest.main()
@@ -518,6 +518,21 @@ class TestDevice(unittest.TestCase):
         self.assertEqual(parity_none_symbol.description, 'No Parity')
         self.assertEqual(flow_none_symbol.description, 'No flow control')
 
+    def test_model_load_shared(self):
+        model_1 = device.Model(mid=103, addr=40072)
+        model_1.load()
+        model_2 = device.Model(mid=103, addr=40002)
+        model_2.load()
+
+        # model types are loaded once and shared
+        self.assertIs(model_1.model_type, model_2.model_type)
+
+        point = model_1.points['W']
+        self.assertEqual(point.addr, 40084)
+        self.assertEqual(model_2.points['W'].addr, 40014)
+        self.assertFalse(hasattr(point, '__dict__'))
+        self.assertFalse(hasattr(model_1.blocks[0], '__dict__'))
+
 
 class TestModel(unittest.TestCase):
     def test_block_past_end_of_model(self):
@@ -0,0 +1,285 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import sunspec.core.client as client
+import sunspec.core.device as device
+import sunspec.core.fleet as fleet
+import sunspec.core.scancache as scancache
+import sunspec.core.util as util
+import sunspec.core.modbus.mbmap as mbmap
+import sunspec.core.test.fake.server as server
+
+
+class TestFleet(unittest.TestCase):
+    def setUp(self):
+        path = os.path.abspath(__file__)
+        self.pathlist = util.PathList(['.',
+                                       os.path.join(os.path.dirname(path),
+                                                    'devices')])
+
+        device.check_for_models(pathlist=self.pathlist)
+
+    def test_parse_target(self):
+        t = fleet.parse_target('tcp:192.168.0.10')
+        if (t.type, t.ipaddr, t.ipport, t.slave_id) != (client.TCP, '192.168.0.10', 502, 1):
+            raise Exception('Unexpected target: %s' % (t))
+        t = fleet.parse_target('tcp:192.168.0.10:1502:3')
+        if (t.type, t.ipaddr, t.ipport, t.slave_id) != (client.TCP, '192.168.0.10', 1502, 3):
+            raise Exception('Unexpected target: %s' % (t))
+        t = fleet.parse_target('rtu:/dev/ttyUSB0:7', baudrate=19200)
+        if (t.type, t.name, t.slave_id, t.baudrate, t.bus) != (client.RTU, '/dev/ttyUSB0', 7, 19200, '/dev/ttyUSB0'):
+            raise Exception('Unexpected target: %s' % (t))
+        t = fleet.parse_target('rtu:COM3')
+        if (t.name, t.slave_id) != ('COM3', 1):
+            raise Exception('Unexpected target: %s' % (t))
+
+        for target in ['192.168.0.10', 'udp:192.168.0.10', 'tcp:', 'tcp:host:port', 'rtu:']:
+            try:
+                fleet.parse_target(target)
+                raise Exception('Invalid target parsed: %s' % (target))
+            except client.SunSpecClientError:
+                pass
+
+    def test_fleet_scan(self):
+        maps = {}
+        for slave_id in (1, 2):
+            maps[slave_id] = mbmap.ModbusMap(slave_id)
+            maps[slave_id].from_xml('mbmap_test_inverter_3.xml', self.pathlist)
+        s = server.ModbusTCPServer(maps).start()
+        self.addCleanup(s.stop)
+
+        targets = [fleet.Target(client.TCP, slave_id, ipaddr=s.ipaddr, ipport=s.ipport) for slave_id in (1, 2, 3)]
+        targets.append(fleet.Target(client.MAPPED, 1, name='mbmap_test_device_1.xml', pathlist=self.pathlist))
+        results = fleet.scan(targets, workers=2)
+
+        if [r.target for r in results] != targets:
+            raise Exception('Results not in target order')
+        layout = [(1, 40004, 66), (103, 40072, 50), (160, 40124, 68), (160, 40194, 68), (160, 40264, 68)]
+        for r in results[:2]:
+            if not r.ok or r.models != layout:
+                raise Exception('Unexpected result %s: %s %s' % (r.target, r.error, r.models))
+            if r.start is None or r.elapsed is None or r.elapsed < 0:
+                raise Exception('Result not timed: %s' % (r.target))
+            r.device.read_points()
+            r.device.close()
+        if results[2].ok or results[2].models:
+            raise Exception('Missing slave scanned')
+        if not results[3].ok or not results[3].models:
+            raise Exception('Mapped device not scanned: %s' % (results[3].error))
+
+    def test_fleet_scan_cache(self):
+        maps = {}
+        for slave_id in (1, 2, 3):
+            maps[slave_id] = mbmap.ModbusMap(slave_id)
+            maps[slave_id].from_xml('mbmap_test_inverter_3.xml', self.pathlist)
+        s = server.ModbusTCPServer(maps).start()
+        self.addCleanup(s.stop)
+        filename = os.path.join(tempfile.mkdtemp(), 'scan_cache.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(filename))
+
+        # the cache file is written once after all the scans
+        cache = scancache.ScanCache(filename)
+        saves = []
+        save = cache.save
+        def counted_save():
+            saves.append(os.path.exists(filename))
+            save()
+        cache.save = counted_save
+        targets = [fleet.Target(client.TCP, slave_id, ipaddr=s.ipaddr, ipport=s.ipport) for slave_id in (1, 2, 3)]
+        results = fleet.scan(targets, workers=3, scan_cache=cache)
+        for r in results:
+            if not r.ok:
+                raise Exception('Device not scanned: %s' % (r.error))
+            r.device.close()
+        if saves != [False]:
+            raise Exception('Unexpected scan cache saves: %s' % (saves))
+        if sorted(scancache.ScanCache(filename).entries) != sorted(r.device.scan_key() for r in results):
+            raise Exception('Scan cache entries not saved')
+
+        # updates outside a batch are saved immediately
+        cache.remove(results[0].device.scan_key())
+        if len(scancache.ScanCache(filename).entries) != 2:
+            raise Exception('Scan cache entry removal not saved')
+
+    def test_fleet_run_bus(self):
+        # devices on the same RTU bus are never accessed concurrently
+        targets = []
+        for bus in ('/dev/ttyUSB0', '/dev/ttyUSB1'):
+            for slave_id in range(1, 5):
+                targets.append(fleet.Target(client.RTU, slave_id, name=bus))
+        active = {}
+        overlap = []
+        lock = threading.Lock()
+
+        def func(result):
+            bus = result.target.bus
+            with lock:
+                if active.get(bus):
+                    overlap.append(bus)
+                active[bus] = True
+            time.sleep(0.01)
+            with lock:
+                active[bus] = False
+            if result.target.slave_id == 3:
+                raise client.SunSpecClientError('Timeout')
+
+        results = fleet.run(targets, func, workers=8)
+        if overlap:
+            raise Exception('Concurrent bus access: %s' % (overlap))
+        if [r.ok for r in results] != [True, True, False, True] * 2:
+            raise Exception('Unexpected results: %s' % ([r.error for r in results]))
+        if results[2].error != 'Timeout':
+            raise Exception('Unexpected error: %s' % (results[2].error))
+        # bus jobs run in target order
+        if results[1].start < results[0].start + results[0].elapsed:
+            raise Exception('Bus targets not run in order')
+
+    def test_fleet_write_points(self):
+        maps = {}
+        for slave_id in (1, 2, 3):
+            maps[slave_id] = mbmap.ModbusMap(slave_id)
+            maps[slave_id].from_xml('mbmap_test_inverter_3.xml', self.pathlist)
+        # A_SF of slave 3 differs
+        maps[3].write(40076, b'\xff\xfe')
+        s = server.ModbusTCPServer(maps).start()
+        self.addCleanup(s.stop)
+
+        encode = fleet._encode
+        encoded = []
+        def count_encode(*args):
+            encoded.append(args[3])
+            return encode(*args)
+        fleet._encode = count_encode
+        self.addCleanup(setattr, fleet, '_encode', encode)
+
+        targets = [fleet.Target(client.TCP, slave_id, ipaddr=s.ipaddr, ipport=s.ipport) for slave_id in (1, 2, 3, 4)]
+        scanned = fleet.scan(targets)
+        del s.requests[:]
+        results = fleet.write_points(scanned, 103, {'A': 12.5, 'W': 3000})
+
+        if [r.ok for r in results] != [True, True, True, False] or [r.target for r in results] != targets:
+            raise Exception('Unexpected results: %s' % ([r.error for r in results]))
+        if sorted(encoded) != [(-2, 0), (-1, 0)]:
+            raise Exception('Unexpected encodings: %s' % (encoded))
+        for r in results[:3]:
+            if r.latency is None or r.latency < r.elapsed:
+                raise Exception('Latency not reported: %s' % (r.target))
+        # scale factors read, then one write per device
+        writes = [req for req in s.requests if req[1] == 16]
+        if sorted(writes) != [(1, 16, 40072, 1), (1, 16, 40084, 1), (2, 16, 40072, 1), (2, 16, 40084, 1),
+                              (3, 16, 40072, 1), (3, 16, 40084, 1)]:
+            raise Exception('Unexpected writes: %s' % (writes))
+        for slave_id, data in ((1, b'\x00\x7d'), (3, b'\x04\xe2')):
+            if maps[slave_id].read(40072, 1) != data:
+                raise Exception('Point not written: %s' % (slave_id))
+
+        for r in scanned[:3]:
+            r.device.read_points()
+            inverter = r.device.models[103][0]
+            if inverter.points['A'].value != 12.5 or inverter.points['W'].value != 3000:
+                raise Exception('Unexpected values: %s' % (inverter.points['A'].value))
+
+        # a register reverted by the device after the write is read
+        data = maps[1].read(40084, 1)
+        fleet.write_points(scanned[:1], 103, {'W': 2000})
+        maps[1].write(40084, data)
+        scanned[0].device.read_points()
+        if scanned[0].device.models[103][0].points['W'].value != 3000:
+            raise Exception('Reverted register not read')
+
+        # values are divided by the scale factor before rounding
+        for value, data in ((0.29, b'\x00\x1d'), (0.57, b'\x00\x39'), (1.13, b'\x00\x71')):
+            fleet.write_points(scanned[2:3], 103, {'A': value})
+            if maps[3].read(40072, 1) != data:
+                raise Exception('Unexpected encoding of %s: %s' % (value, maps[3].read(40072, 1)))
+            if scanned[2].device.models[103][0].points['A'].value_base != util.data_to_u16(data):
+                raise Exception('Unexpected value of %s' % (value))
+
+        for r in scanned[:3]:
+            r.device.close()
+
+    def test_fleet_write_points_broadcast(self):
+        class Bus(object):
+            def __init__(self):
+                self.writes = []
+            def write(self, slave_id, addr, data):
+                self.writes.append((slave_id, addr, data))
+
+        # mapped devices standing in for devices on an RTU bus
+        bus = Bus()
+        scanned = []
+        for slave_id in (1, 2, 3):
+            result = fleet.Result(fleet.Target(client.RTU, slave_id, name='bus0'))
+            result.device = client.ClientDevice(client.MAPPED, slave_id=slave_id, name='mbmap_test_inverter_3.xml',
+                                                pathlist=self.pathlist)
+            result.device.modbus_device.client = bus
+            result.device.scan()
+            scanned.append(result)
+        maps = [r.device.modbus_device.modbus_map for r in scanned]
+
+        # all the devices of the bus take the same write
+        results = fleet.write_points(scanned, 103, {'A': 12.5}, broadcast=True)
+        if not all([r.ok for r in results]):
+            raise Exception('Unexpected results: %s' % ([r.error for r in results]))
+        if bus.writes != [(0, 40072, b'\x00\x7d')]:
+            raise Exception('Unexpected broadcast writes: %s' % (bus.writes))
+        for r in scanned:
+            if r.device.models[103][0].points['A'].value != 12.5:
+                raise Exception('Point value not set')
+
+        # two groups on one bus, the devices are written one at a time
+        del bus.writes[:]
+        maps[2].write(40076, b'\xff\xfe')
+        scanned[2].device.read_points()
+        results = fleet.write_points(scanned, 103, {'A': 20}, broadcast=True)
+        if not all([r.ok for r in results]):
+            raise Exception('Unexpected results: %s' % ([r.error for r in results]))
+        if bus.writes:
+            raise Exception('Broadcast to a bus with two groups: %s' % (bus.writes))
+        if [m.read(40072, 1) for m in maps] != [b'\x00\xc8', b'\x00\xc8', b'\x07\xd0']:
+            raise Exception('Points not written: %s' % ([m.read(40072, 1) for m in maps]))
+
+        # a device that can not be prepared, the others are written one at a time
+        maps[2].write(40076, b'\xff\xff')
+        scanned[2].device.read_points()
+        failed = fleet.Result(fleet.Target(client.RTU, 4, name='bus0'))
+        results = fleet.write_points(scanned + [failed], 103, {'A': 30}, broadcast=True)
+        if [r.ok for r in results] != [True, True, True, False]:
+            raise Exception('Unexpected results: %s' % ([r.error for r in results]))
+        if bus.writes:
+            raise Exception('Broadcast with a failed device: %s' % (bus.writes))
+        if [m.read(40072, 1) for m in maps] != [b'\x01\x2c'] * 3:
+            raise Exception('Points not written: %s' % ([m.read(40072, 1) for m in maps]))
+
+
+
+if __name__ == "__main__":
+
+    unittest.main()
@@ -23,10 +23,15 @@
 
 import sys
 import os
+import threading
+import time
 import unittest
 
 import sunspec.core.device as device
+import sunspec.core.util as util
 import sunspec.core.modbus.client as modbus
+import sunspec.core.modbus.mbmap as mbmap
+import sunspec.core.test.fake.server as server
 
 
 class TestModbusClient(unittest.TestCase):
@@ -49,8 +54,82 @@ class TestModbusClient(unittest.TestCase):
         if data != b'SunS':
             raise Exception("Read data mismatch - expected: 'SunS' received: %s") % (data)
 
+        # byte count does not match the request
+        resp = b'\x01\x03\x02\x53\x75'
+        crc = modbus.computeCRC(resp)
+        d.client.serial.in_buf = resp + bytes(bytearray([crc >> 8, crc & 0xff]))
+        try:
+            d.read(40000, 2)
+            raise Exception('Short response not detected')
+        except modbus.ModbusClientError as e:
+            if 'length' not in str(e):
+                raise
+
+        d.close()
+
+    def test_modbus_client_device_rtu_read_timeout(self):
+        d = modbus.ModbusClientDeviceRTU(1, modbus.TEST_NAME, trace_func=None)
+
+        # the port timeout is set at most once per transaction, not for each
+        # part of the response read
+        timeouts = []
+        serial = d.client.serial
+        class Serial(serial.__class__):
+            def __setattr__(self, name, value):
+                if name == 'timeout':
+                    timeouts.append(value)
+                super(Serial, self).__setattr__(name, value)
+            def readinto(self, b):
+                time.sleep(.005)
+                return super(Serial, self).readinto(b)
+        serial.__class__ = Serial
+
+        for i in range(2):
+            del timeouts[:]
+            serial.in_buf = b'\x01\x03\x04\x53\x75\x6E\x53\x96\xF0'
+            if d.read(40000, 2) != b'SunS':
+                raise Exception('Read data mismatch')
+            if len(timeouts) > 1:
+                raise Exception('Serial timeout set %d times in one transaction' % (len(timeouts)))
+
         d.close()
 
+    def test_modbus_client_device_rtu_read_chunked(self):
+        """
+        -> 01 03 9C 40 00 01 AB 8E
+        <- 01 03 02 53 75 45 53
+        -> 01 03 9C 41 00 01 FA 4E
+        <- 01 03 02 6E 53 D4 19
+        """
+
+        trace = []
+        d = modbus.ModbusClientDeviceRTU(1, modbus.TEST_NAME, trace_func=trace.append, max_count=1)
+
+        d.client.serial.in_buf = b'\x01\x03\x02\x53\x75\x45\x53\x01\x03\x02\x6E\x53\xD4\x19'
+        d.client.serial.out_buf = b''
+
+        data = d.read(40000, 2)
+
+        if d.client.serial.out_buf != b'\x01\x03\x9C\x40\x00\x01\xAB\x8E\x01\x03\x9C\x41\x00\x01\xFA\x4E':
+            raise Exception("Modbus request mismatch")
+
+        if data != b'SunS':
+            raise Exception("Read data mismatch - expected: 'SunS' received: %s" % (data))
+
+        if trace[-1] != '%s:1[addr=40001] <--0103026E53D419' % (modbus.TEST_NAME):
+            raise Exception("Trace mismatch: %s" % (trace[-1]))
+
+        # exception response
+        d.client.serial.in_buf = b'\x01\x83\x02\xC0\xF1'
+        with self.assertRaises(modbus.ModbusClientException):
+            d.read(40000, 1)
+
+        # corrupted response
+        d.client.serial.in_buf = b'\x01\x03\x02\x53\x75\x45\x54'
+        with self.assertRaises(modbus.ModbusClientError):
+            d.read(40000, 1)
+
+        d.close()
 
     def test_modbus_client_device_rtu_write(self):
         """
@@ -70,21 +149,156 @@ class TestModbusClient(unittest.TestCase):
 
         d.close()
 
+    def test_modbus_client_rtu_broadcast(self):
+        """
+        -> 00 10 9C 40 00 02 04 41 42 43 44 8F 4E
+        """
+
+        d = modbus.ModbusClientDeviceRTU(1, modbus.TEST_NAME, trace_func=None)
+        rtu = d.client
+        rtu.broadcast_delay = .05
+
+        # broadcast requests are not answered
+        rtu.serial.in_buf = b''
+        rtu.serial.out_buf = b''
+        start = time.time()
+        rtu.write(modbus.BROADCAST_ID, 40000, b'ABCD')
+        if rtu.serial.out_buf != b'\x00\x10\x9C\x40\x00\x02\x04\x41\x42\x43\x44\x8F\x4E':
+            raise Exception("Modbus request mismatch")
+        if time.time() - start < .05:
+            raise Exception('Broadcast delay not applied')
+
+        d.close()
+
+    def test_modbus_client_device_rtu_queue(self):
+        read_req = b'\x01\x03\x9C\x40\x00\x02\xEB\x8F'
+        read_resp = b'\x01\x03\x04\x53\x75\x6E\x53\x96\xF0'
+        write_req = b'\x01\x10\x9C\x40\x00\x02\x04\x41\x42\x43\x44\x8B\xB2'
+        write_resp = b'\x01\x10\x9C\x40\x00\x02\x6E\x4C'
+
+        d = modbus.ModbusClientDeviceRTU(1, modbus.TEST_NAME, trace_func=None)
+        rtu = d.client
+
+        # concurrent reads from several threads
+        rtu.serial.in_buf = read_resp * 40
+        rtu.serial.out_buf = b''
+        results = []
+        def reader():
+            for i in range(10):
+                results.append(d.read(40000, 2))
+        threads = [threading.Thread(target=reader) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if results != [b'SunS'] * 40 or rtu.serial.out_buf != read_req * 40:
+            raise Exception('Concurrent read mismatch')
+
+        # a high priority write preempts queued reads
+        release = threading.Event()
+        blocker = rtu.submit(release.wait, (5,))
+        rtu.serial.in_buf = write_resp + read_resp * 2
+        rtu.serial.out_buf = b''
+        reads = [d.submit_read(40000, 2), d.submit_read(40000, 2, priority=modbus.PRIORITY_LOW)]
+        write = d.submit_write(40000, b'ABCD')
+        if write.done():
+            raise Exception('Request not queued')
+        release.set()
+        write.result(5)
+        if [f.result(5) for f in reads] != [b'SunS', b'SunS'] or not blocker.done():
+            raise Exception('Queued read mismatch')
+        if rtu.serial.out_buf != write_req + read_req * 2:
+            raise Exception('Priority order mismatch: %s' % (rtu.serial.out_buf))
+
+        # errors are returned through the future
+        rtu.serial.in_buf = b'\x01\x83\x02\xC0\xF1'
+        future = d.submit_read(40000, 1)
+        if not isinstance(future.exception(5), modbus.ModbusClientException):
+            raise Exception('Exception not returned')
+
+        # inter-frame gap
+        if abs(modbus.rtu_frame_gap(9600) - .00401) > .00001 or modbus.rtu_frame_gap(38400) != .00175:
+            raise Exception('Frame gap mismatch')
+        rtu.frame_gap = .05
+        rtu.serial.in_buf = read_resp * 2
+        start = time.time()
+        d.read(40000, 2)
+        d.read(40000, 2)
+        if time.time() - start < .05:
+            raise Exception('Frame gap not enforced')
+
+        # queued requests fail when the client is closed
+        release.clear()
+        rtu.submit(release.wait, (5,))
+        future = d.submit_read(40000, 2)
+        closer = threading.Thread(target=d.close)
+        closer.start()
+        release.set()
+        closer.join()
+        if not isinstance(future.exception(5), modbus.ModbusClientError):
+            raise Exception('Queued request not failed')
+
+    def test_modbus_client_device_rtu_timeout(self):
+        read_resp = b'\x01\x03\x04\x53\x75\x6E\x53\x96\xF0'
+
+        d = modbus.ModbusClientDeviceRTU(1, modbus.TEST_NAME, baudrate=9600, timeout=2)
+        rtu = d.client
+
+        # full timeout until the slave latency is known
+        char_time = 11. / 9600
+        if abs(rtu.response_timeout(1, 8, 9, d.timeout) - (2 + 17 * char_time)) > 1e-9:
+            raise Exception('Unknown slave timeout mismatch')
+
+        # fast responses shrink the timeout to the minimum allowance
+        rtu.serial.in_buf = read_resp * 5
+        for i in range(5):
+            d.read(40000, 2)
+        latency = rtu.latency[1]
+        if latency.samples != 5 or latency.mean is None:
+            raise Exception('Latency not measured')
+        timeout = rtu.response_timeout(1, 8, 9, d.timeout)
+        if abs(timeout - (modbus.RTU_LATENCY_MIN + 17 * char_time)) > 1e-9:
+            raise Exception('Adaptive timeout mismatch: %s' % (timeout))
+        # response size is included
+        if rtu.response_timeout(1, 8, 255, d.timeout) <= timeout:
+            raise Exception('Response size not included')
+
+        # a timeout restores the configured timeout
+        rtu.serial.in_buf = b''
+        with self.assertRaises(modbus.ModbusClientTimeout):
+            d.read(40000, 2)
+        if latency.timeouts != 1 or rtu.response_timeout(1, 8, 9, d.timeout) < 2:
+            raise Exception('Timeout not reset')
+
+        # slow slaves keep their own allowance
+        slow = modbus.SlaveLatency()
+        for sample in (.4, .5, .45):
+            slow.update(sample)
+        if not .45 < slow.timeout(2) < 2 or slow.timeout(.3) != .3:
+            raise Exception('Slow slave allowance mismatch: %s' % (slow.timeout(2)))
+
+        rtu.adaptive_timeout = False
+        rtu.serial.in_buf = read_resp
+        d.read(40000, 2)
+        if rtu.response_timeout(1, 8, 9, d.timeout) < 2:
+            raise Exception('Adaptive timeout not disabled')
+
+        d.close()
 
     def test_modbus_client_device_tcp_read(self):
         """
-        -> 00 00 00 00 00 06 01 03 9C 40 00 02
-        <- 00 00 00 00 00 07 01 03 04 53 75 6E 53
+        -> 00 01 00 00 00 06 01 03 9C 40 00 02
+        <- 00 01 00 00 00 07 01 03 04 53 75 6E 53
         """
 
         d = modbus.ModbusClientDeviceTCP(1, ipaddr="127.0.0.1", trace_func=None, test=True)
 
-        d.socket.in_buf = b'\x00\x00\x00\x00\x00\x07\x01\x03\x04\x53\x75\x6E\x53'
+        d.socket.in_buf = b'\x00\x01\x00\x00\x00\x07\x01\x03\x04\x53\x75\x6E\x53'
         d.socket.out_buf = b''
 
         data = d.read(40000, 2)
 
-        if d.socket.out_buf != b'\x00\x00\x00\x00\x00\x06\x01\x03\x9C\x40\x00\x02':
+        if d.socket.out_buf != b'\x00\x01\x00\x00\x00\x06\x01\x03\x9C\x40\x00\x02':
             raise Exception("Modbus request mismatch")
 
         if data != b'SunS':
@@ -95,22 +309,275 @@ class TestModbusClient(unittest.TestCase):
 
     def test_modbus_client_device_tcp_write(self):
         """
-        -> 00 00 00 00 00 0B 01 10 9C 40 00 02 04 41 42 43 44
-        <- 00 00 00 00 00 06 01 10 9C 40 00 02
+        -> 00 01 00 00 00 0B 01 10 9C 40 00 02 04 41 42 43 44
+        <- 00 01 00 00 00 06 01 10 9C 40 00 02
         """
 
         d = modbus.ModbusClientDeviceTCP(1, ipaddr="127.0.0.1", trace_func=None, test=True)
 
-        d.socket.in_buf = b'\x00\x00\x00\x00\x00\x06\x01\x10\x9C\x40\x00\x02'
+        d.socket.in_buf = b'\x00\x01\x00\x00\x00\x06\x01\x10\x9C\x40\x00\x02'
         d.socket.out_buf = b''
 
         d.write(40000, 'ABCD')
 
-        if d.socket.out_buf != b'\x00\x00\x00\x00\x00\x0B\x01\x10\x9C\x40\x00\x02\x04\x41\x42\x43\x44':
+        if d.socket.out_buf != b'\x00\x01\x00\x00\x00\x0B\x01\x10\x9C\x40\x00\x02\x04\x41\x42\x43\x44':
+            raise Exception("Modbus request mismatch")
+
+        d.close()
+
+    def test_modbus_client_device_tcp_read_pipelined(self):
+        """
+        -> 00 01 00 00 00 06 01 03 9C 40 00 02
+        -> 00 02 00 00 00 06 01 03 9C 42 00 01
+        <- 00 02 00 00 00 05 01 03 02 00 01
+        <- 00 01 00 00 00 07 01 03 04 53 75 6E 53
+        """
+
+        d = modbus.ModbusClientDeviceTCP(1, ipaddr="127.0.0.1", trace_func=None, test=True, pipeline=True)
+
+        # responses arrive out of order
+        d.socket.in_buf = b'\x00\x02\x00\x00\x00\x05\x01\x03\x02\x00\x01' \
+                          b'\x00\x01\x00\x00\x00\x07\x01\x03\x04\x53\x75\x6E\x53'
+        d.socket.out_buf = b''
+
+        data = d.read_spans([(40000, 2), (40002, 1)])
+
+        if d.socket.out_buf != b'\x00\x01\x00\x00\x00\x06\x01\x03\x9C\x40\x00\x02' \
+                               b'\x00\x02\x00\x00\x00\x06\x01\x03\x9C\x42\x00\x01':
             raise Exception("Modbus request mismatch")
 
+        if data != [b'SunS', b'\x00\x01']:
+            raise Exception("Read data mismatch - received: %s" % (data))
+
+        d.close()
+
+    def test_modbus_client_device_tcp_read_pipelined_exception(self):
+        """
+        -> 00 01 00 00 00 06 01 03 9C 40 00 02
+        -> 00 02 00 00 00 06 01 03 9C 42 00 01
+        <- 00 01 00 00 00 03 01 83 02
+        <- 00 02 00 00 00 05 01 03 02 00 01
+        -> 00 03 00 00 00 06 01 03 9C 40 00 02
+        <- 00 03 00 00 00 07 01 03 04 53 75 6E 53
+        """
+
+        d = modbus.ModbusClientDeviceTCP(1, ipaddr="127.0.0.1", trace_func=None, test=True, pipeline=True)
+
+        d.socket.in_buf = b'\x00\x01\x00\x00\x00\x03\x01\x83\x02' \
+                          b'\x00\x02\x00\x00\x00\x05\x01\x03\x02\x00\x01' \
+                          b'\x00\x03\x00\x00\x00\x07\x01\x03\x04\x53\x75\x6E\x53'
+        d.socket.out_buf = b''
+
+        try:
+            d.read_spans([(40000, 2), (40002, 1)])
+            raise Exception('Modbus exception not raised')
+        except modbus.ModbusClientException as e:
+            if e.except_code != 2:
+                raise Exception('Unexpected exception code: %s' % (e.except_code))
+
+        # the outstanding response has been drained and the connection kept
+        sock = d.socket
+        data = d.read(40000, 2)
+        if data != b'SunS':
+            raise Exception("Read data mismatch - received: %s" % (data))
+        if d.socket is not sock:
+            raise Exception('Connection reset after drained exception response')
+
+        # exception response with another response still in flight
+        client = d.client
+        req = b'\x00\x04\x00\x00\x00\x06\x01\x03\x9C\x40\x00\x02'
+        def partial():
+            client._send(1, 40000, req)
+            client._send(1, 40000, req)
+            client._recv(1, 40000)
+            client._check(modbus.FUNC_READ_HOLDING, 2)
+        d.socket.in_buf = b'\x00\x04\x00\x00\x00\x03\x01\x83\x02'
+        with self.assertRaises(modbus.ModbusClientException):
+            client._transaction(None, partial)
+        if d.socket is not None:
+            raise Exception('Connection not reset with a response in flight')
+
+        d.close()
+
+    def test_modbus_client_device_tcp_read_validate(self):
+        d = modbus.ModbusClientDeviceTCP(1, ipaddr="127.0.0.1", trace_func=None, test=True)
+
+        # byte count does not match the request
+        d.socket.in_buf = b'\x00\x01\x00\x00\x00\x05\x01\x03\x02\x53\x75'
+        try:
+            d.read(40000, 2)
+            raise Exception('Short response not detected')
+        except modbus.ModbusClientError as e:
+            if isinstance(e, modbus.ModbusClientException):
+                raise
+        if d.socket is not None:
+            raise Exception('Connection not closed after response error')
+
+        # response to another transaction
+        d.client.connect()
+        d.socket.in_buf = b'\x00\x07\x00\x00\x00\x07\x01\x03\x04\x53\x75\x6E\x53'
+        try:
+            d.read(40000, 2)
+            raise Exception('Transaction id mismatch not detected')
+        except modbus.ModbusClientError as e:
+            if isinstance(e, modbus.ModbusClientException):
+                raise
+
         d.close()
 
+    def test_modbus_client_device_tcp_read_pipelined_fallback(self):
+        path = os.path.abspath(__file__)
+        pathlist = util.PathList(['.', os.path.join(os.path.dirname(path), 'devices')])
+        m = mbmap.ModbusMap(1)
+        m.from_xml('mbmap_test_device_1.xml', pathlist)
+        s = server.ModbusTCPServer({1: m}).start()
+
+        try:
+            d = modbus.ModbusClientDeviceTCP(1, s.ipaddr, s.ipport, max_count=50, pipeline=True, pipeline_window=3)
+            data = d.read(40000, 180)
+            if data != m.read(40000, 180):
+                raise Exception('Read data mismatch for pipelined read')
+            if s.requests != [(1, 3, 40000, 50), (1, 3, 40050, 50), (1, 3, 40100, 50), (1, 3, 40150, 30)]:
+                raise Exception('Unexpected pipelined requests: %s' % (s.requests))
+            if d.pipeline is not True:
+                raise Exception('Pipelining unexpectedly disabled')
+
+            # a timeout falls back to one request at a time for that read only
+            read_pipelined = d.client._read_pipelined
+            def timeout_read(*args, **kwargs):
+                d.client._read_pipelined = read_pipelined
+                raise modbus.ModbusClientTimeout('Response timeout')
+            d.client._read_pipelined = timeout_read
+            data = d.read(40000, 180)
+            if data != m.read(40000, 180):
+                raise Exception('Read data mismatch after pipelined read timeout')
+            if d.pipeline is not True:
+                raise Exception('Pipelining disabled after a timeout')
+
+            # device that does not echo transaction ids
+            s.echo_tid = False
+            data = d.read(40000, 180)
+            if data != m.read(40000, 180):
+                raise Exception('Read data mismatch after pipelining fallback')
+            if d.pipeline is not False:
+                raise Exception('Pipelining not disabled after fallback')
+            d.close()
+        finally:
+            s.stop()
+
+    def test_modbus_client_device_tcp_pool(self):
+        path = os.path.abspath(__file__)
+        pathlist = util.PathList(['.', os.path.join(os.path.dirname(path), 'devices')])
+        maps = {}
+        for slave_id in (1, 2):
+            maps[slave_id] = mbmap.ModbusMap(slave_id)
+            maps[slave_id].from_xml('mbmap_test_device_1.xml', pathlist)
+        s = server.ModbusTCPServer(maps).start()
+
+        try:
+            d1 = modbus.ModbusClientDeviceTCP(1, s.ipaddr, s.ipport, pool=True)
+            d2 = modbus.ModbusClientDeviceTCP(2, s.ipaddr, s.ipport, pool=True)
+            if d1.client is not d2.client:
+                raise Exception('Pooled devices not sharing a client')
+            connection = d1.client.connection
+
+            for d in (d1, d2, d1, d2):
+                if d.read(40000, 2) != b'SunS':
+                    raise Exception('Read data mismatch')
+            d2.write(40004, b'ABCD')
+            if maps[2].read(40004, 2) != b'ABCD':
+                raise Exception('Write data mismatch')
+            if s.connections != 1:
+                raise Exception('Expected 1 connection, found %d' % (s.connections))
+
+            # exception responses leave the connection open
+            with self.assertRaises(modbus.ModbusClientException):
+                d1.read(45000, 2)
+            d1.read(40000, 2)
+            if s.connections != 1:
+                raise Exception('Connection not reused after exception response')
+
+            # dropped connection detected by the health check
+            s.drop_connections()
+            if d1.read(40000, 2) != b'SunS':
+                raise Exception('Read data mismatch after reconnect')
+            if s.connections != 2:
+                raise Exception('Expected reconnect, found %d connections' % (s.connections))
+
+            # dropped connection detected by the request itself
+            s.drop_connections()
+            connection.healthy = lambda: connection.socket is not None
+            if d2.read(40000, 2) != b'SunS':
+                raise Exception('Read data mismatch after broken connection')
+            if s.connections != 3:
+                raise Exception('Expected reconnect, found %d connections' % (s.connections))
+
+            # a second pooled device for the same slave id keeps the client
+            d3 = modbus.ModbusClientDeviceTCP(2, s.ipaddr, s.ipport, pool=True)
+            d2.close()
+            d2.close()
+            if connection.socket is None or d3.client.key not in modbus.modbus_tcp_clients:
+                raise Exception('Client closed while still in use')
+            if d3.read(40000, 2) != b'SunS':
+                raise Exception('Read data mismatch')
+
+            d1.close()
+            if connection.socket is None:
+                raise Exception('Connection closed while still in use')
+            d3.close()
+            if connection.socket is not None or d3.client.key in modbus.modbus_tcp_clients:
+                raise Exception('Connection not released from pool')
+        finally:
+            s.stop()
+
+        with self.assertRaises(modbus.ModbusClientError):
+            modbus.ModbusClientDeviceTCP(1, '127.0.0.1', pool=True, test=True)
+
+    def test_modbus_client_tcp_gateway(self):
+        path = os.path.abspath(__file__)
+        pathlist = util.PathList(['.', os.path.join(os.path.dirname(path), 'devices')])
+        maps = {}
+        for slave_id in (1, 2, 3):
+            maps[slave_id] = mbmap.ModbusMap(slave_id)
+            maps[slave_id].from_xml('mbmap_test_device_1.xml', pathlist)
+            maps[slave_id].write(40004, ('slv%d' % (slave_id)).encode())
+        s = server.ModbusTCPServer(maps).start()
+
+        try:
+            c = modbus.modbus_tcp_client(s.ipaddr, s.ipport)
+            if modbus.modbus_tcp_client(s.ipaddr, s.ipport) is not c:
+                raise Exception('Shared TCP client not reused')
+            for slave_id in (1, 2, 3):
+                c.add_device(slave_id, None)
+            c.pipeline = True
+
+            # one pipelined batch for all slaves
+            requests = [(slave_id, 40004, 2) for slave_id in (1, 2, 3)]
+            data = c.read_requests(requests)
+            if data != [b'slv1', b'slv2', b'slv3']:
+                raise Exception('Read data mismatch: %s' % (data))
+            if s.requests != [(1, 3, 40004, 2), (2, 3, 40004, 2), (3, 3, 40004, 2)]:
+                raise Exception('Unexpected requests: %s' % (s.requests))
+
+            c.write(2, 40004, b'ABCD')
+            if c.read(2, 40004, 2) != b'ABCD':
+                raise Exception('Write data mismatch')
+            if s.connections != 1:
+                raise Exception('Expected 1 connection, found %d' % (s.connections))
+
+            with self.assertRaises(modbus.ModbusClientException):
+                c.read(4, 40000, 2)
+
+            for slave_id in (1, 2):
+                c.remove_device(slave_id)
+            if c.key not in modbus.modbus_tcp_clients:
+                raise Exception('TCP client removed while still in use')
+            c.remove_device(3)
+            if c.key in modbus.modbus_tcp_clients or c.connection.socket is not None:
+                raise Exception('TCP client not closed and removed')
+        finally:
+            s.stop()
+
 
 if __name__ == "__main__":
 
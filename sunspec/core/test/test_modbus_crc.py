@@ -0,0 +1,56 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+import unittest
+
+import sunspec.core.modbus.crc as crc
+
+FRAMES = [
+    (b'\x01\x03\x9C\x40\x00\x02', 0xEB8F),
+    (b'\x01\x03\x04\x53\x75\x6E\x53', 0x96F0),
+    (b'\x01\x10\x9C\x40\x00\x02\x04\x41\x42\x43\x44', 0x8BB2),
+    (b'', 0xFFFF),
+]
+
+
+class TestModbusCRC(unittest.TestCase):
+
+    def test_crc16(self):
+        for data, expected in FRAMES:
+            for value in (data, bytearray(data), memoryview(bytearray(data))):
+                self.assertEqual(crc.crc16(value), expected)
+                self.assertEqual(crc.crc16_python(value), expected)
+                self.assertTrue(crc.check(value, expected))
+                self.assertFalse(crc.check(value, expected ^ 1))
+
+    @unittest.skipIf(crc.crc16_crcmod is None, 'crcmod not installed')
+    def test_crc16_crcmod(self):
+        data = bytearray(range(256)) * 2
+        for end in range(0, len(data), 7):
+            self.assertEqual(crc.crc16_crcmod(memoryview(data)[:end]), crc.crc16_python(data[:end]))
+        self.assertEqual(crc.backend, 'crcmod')
+
+
+if __name__ == "__main__":
+
+    unittest.main()
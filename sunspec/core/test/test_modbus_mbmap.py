@@ -105,6 +105,33 @@ class TestModbusMap(unittest.TestCase):
         m1 = mbmap.ModbusMap(base_addr=999, func='holding', mapid=12345)
         m1.regs_add(offset=40072, count=1)
 
+    def test_modbus_mbmap_read_write_index(self):
+        m1 = mbmap.ModbusMap(base_addr=40000)
+        for offset in range(0, 100, 10):
+            m1.regs_add(offset=offset, count=4)
+        # appended registers extend the indexed block
+        m1.regs_add(offset=94, count=2)
+        if len(m1.regs) != 10 or m1.offsets != list(range(0, 100, 10)):
+            raise Exception('Unexpected offset index: %s' % (m1.offsets[:5]))
+
+        m1.write(40050, b'ABCDEFGH')
+        if m1.read(40051, 3) != b'CDEFGH' or m1.read(40094, 2) != b'\0\0\0\0':
+            raise Exception('Register read mismatch')
+        for addr, count in ((40054, 1), (39999, 1), (40053, 2), (40100, 1), (40098, 1)):
+            with self.assertRaises(mbmap.ModbusMapError):
+                m1.read(addr, count)
+        with self.assertRaises(mbmap.ModbusMapError):
+            m1.write(40058, b'AB')
+
+        # adjacent blocks added directly to regs are read and written across
+        # the block boundary
+        m2 = mbmap.ModbusMap(base_addr=0)
+        m2.regs.append(mbmap.ModbusMapRegs(0, 2, b'abcd'))
+        m2.regs.append(mbmap.ModbusMapRegs(2, 2, b'efgh'))
+        m2.write(1, b'WXYZ')
+        if m2.read(0, 4) != b'abWXYZgh' or m2.offsets != [0, 2]:
+            raise Exception('Register read mismatch: %s' % (m2.read(0, 4)))
+
     def test_modbus_mbmap_to_xml(self):
         filename = os.path.join(self.pathlist.path[1], 'mbmap_test_device_1.xml')
 
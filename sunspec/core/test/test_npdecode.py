@@ -0,0 +1,90 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+import math
+import os
+import unittest
+
+import sunspec.core.client as client
+import sunspec.core.device as device
+import sunspec.core.npdecode as npdecode
+import sunspec.core.util as util
+
+
+def equal(value, expected):
+    if expected is None:
+        return math.isnan(value)
+    return abs(value - expected) <= abs(expected) * 1e-6
+
+
+@unittest.skipIf(npdecode.numpy is None, 'numpy not installed')
+class TestNpDecode(unittest.TestCase):
+    def setUp(self):
+        path = os.path.abspath(__file__)
+        self.pathlist = util.PathList(['.',
+                                       os.path.join(os.path.dirname(path),
+                                                    'devices')])
+
+        device.check_for_models(pathlist=self.pathlist)
+
+    def test_model_values(self):
+        d = client.ClientDevice(client.MAPPED, slave_id=1, name='mbmap_test_inverter_3.xml', pathlist=self.pathlist)
+        d.scan()
+        d.read_points()
+
+        model = d.models[103][0]
+        table = npdecode.model_values([model, model])
+        if table.values.shape != (2, len(table.ids)):
+            raise Exception('Unexpected shape: %s' % (table.values.shape,))
+        for pid in table.ids:
+            for value in table.column(pid):
+                if not equal(value, model.points[pid].value):
+                    raise Exception('Point %s not equal: %s %s' % (pid, value, model.points[pid].value))
+
+        # unimplemented values are NaN
+        data = bytearray(model.data)
+        data[0:2] = b'\xff\xff'
+        table = npdecode.decode_models(model.model_type, [bytes(data), None])
+        if not math.isnan(table.column('A')[0]) or not all(math.isnan(v) for v in table.values[1]):
+            raise Exception('Unimplemented values not NaN: %s' % (table.values))
+
+        # repeating blocks with fixed block scale factors
+        models = d.models[160]
+        table = npdecode.model_values(models, repeating=True)
+        if len(table.rows) != sum(len(m.blocks) - 1 for m in models):
+            raise Exception('Unexpected rows: %s' % (table.rows))
+        row = 0
+        for m in models:
+            for block in m.blocks[1:]:
+                for pid in ('DCA', 'DCV', 'DCW', 'Tmp'):
+                    value = table.column(pid)[row]
+                    if not equal(value, block.points[pid].value):
+                        raise Exception('Point %s not equal: %s %s' % (pid, value, block.points[pid].value))
+                row += 1
+
+        d.close()
+
+
+if __name__ == "__main__":
+
+    unittest.main()
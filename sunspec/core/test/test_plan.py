@@ -0,0 +1,93 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+import unittest
+
+import sunspec.core.plan as plan
+from sunspec.core.util import SunSpecError
+
+
+class TestPlan(unittest.TestCase):
+
+    def test_plan_reads(self):
+        # adjacent ranges are merged
+        spans = plan.plan_reads([(40002, 68, None), (40070, 52, None)])
+        self.assertEqual(spans, [(40002, 120)])
+
+        # ranges are only merged across gaps within the gap tolerance
+        ranges = [(0, 10, None), (15, 10, None), (40, 10, None)]
+        self.assertEqual(plan.plan_reads(ranges), [(0, 10), (15, 10), (40, 10)])
+        self.assertEqual(plan.plan_reads(ranges, gap=5), [(0, 25), (40, 10)])
+        self.assertEqual(plan.plan_reads(ranges, gap=15), [(0, 50)])
+
+        # requests are split at cut addresses only
+        spans = plan.plan_reads([(0, 100, [0, 30, 60, 90]), (100, 50, [100, 120, 140])], max_count=70)
+        self.assertEqual(spans, [(0, 60), (60, 60), (120, 30)])
+
+        # ranges without cuts are split at max_count
+        self.assertEqual(plan.plan_reads([(0, 300, None)]), [(0, 125), (125, 125), (250, 50)])
+
+        self.assertEqual(plan.plan_reads([]), [])
+
+    def test_plan_writes(self):
+        writes = [(10, b'cc'), (0, b'aaaa'), (2, b'bb'), (20, b'dddd')]
+
+        # adjacent writes are merged
+        self.assertEqual(plan.plan_writes(writes), [(0, b'aaaabb'), (10, b'cc'), (20, b'dddd')])
+
+        # gaps are only bridged if covered by fill
+        fill = [(3, b'xx'), (4, b'yyyyyyyyyyyy'), (11, b'zzzzzzzzzzzzzzzzzz')]
+        self.assertEqual(plan.plan_writes(writes, fill, gap=7),
+                         [(0, b'aaaabbxxyyyyyyyyyyyycc'), (20, b'dddd')])
+        self.assertEqual(plan.plan_writes(writes, fill, gap=9),
+                         [(0, b'aaaabbxxyyyyyyyyyyyycczzzzzzzzzzzzzzzzzzdddd')])
+        self.assertEqual(plan.plan_writes(writes, fill[1:], gap=9),
+                         [(0, b'aaaabb'), (10, b'cczzzzzzzzzzzzzzzzzzdddd')])
+
+        # fill overlapping the next write is not used
+        self.assertEqual(plan.plan_writes([(0, b'aa'), (3, b'bb')], [(1, b'xxxx')], gap=2), [(0, b'aaxxxxbb')])
+        self.assertEqual(plan.plan_writes([(0, b'aa'), (3, b'bb')], [(1, b'xxxxxx')], gap=2), [(0, b'aa'), (3, b'bb')])
+
+        # writes are split between requests at write boundaries only
+        self.assertEqual(plan.plan_writes(writes, fill, max_count=11, gap=9),
+                         [(0, b'aaaabbxxyyyyyyyyyyyycc'), (20, b'dddd')])
+
+        self.assertEqual(plan.plan_writes([]), [])
+
+    def test_span_data(self):
+        spans = [(0, 2), (2, 2), (10, 1)]
+        data = plan.SpanData(spans, [b'abcd', b'efgh', b'ij'])
+
+        self.assertEqual(data.get(0, 1), b'ab')
+        self.assertEqual(data.get(1, 2), b'cdef')
+        self.assertEqual(data.get(0, 4), b'abcdefgh')
+        self.assertEqual(data.get(10, 1), b'ij')
+
+        for addr, count in ((3, 2), (9, 1), (10, 2), (20, 1)):
+            with self.assertRaises(SunSpecError):
+                data.get(addr, count)
+
+
+if __name__ == "__main__":
+
+    unittest.main()
@@ -0,0 +1,150 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+import os
+import time
+import unittest
+
+import sunspec.core.client as client
+import sunspec.core.device as device
+import sunspec.core.poll as poll
+import sunspec.core.util as util
+import sunspec.core.modbus.client as modbus
+
+
+class TestPoll(unittest.TestCase):
+    def setUp(self):
+        path = os.path.abspath(__file__)
+        self.pathlist = util.PathList(['.',
+                                       os.path.join(os.path.dirname(path),
+                                                    'devices')])
+
+        device.check_for_models(pathlist=self.pathlist)
+
+    def device(self):
+        d = client.ClientDevice(client.MAPPED, slave_id=1, name='mbmap_test_inverter_3.xml', pathlist=self.pathlist)
+        d.scan()
+        d.requests = []
+        read = d.modbus_device.read
+        def counted_read(addr, count, op=None):
+            d.requests.append((addr, count))
+            return read(addr, count)
+        d.modbus_device.read = counted_read
+        self.addCleanup(d.close)
+        return d
+
+    def test_poll_scheduler(self):
+        reads = []
+        s = poll.PollScheduler({103: 1, 160: 1, 1: 10}, early=.1,
+                               on_read=lambda d, models, failed: reads.append([m.id for m in models]))
+        d1 = self.device()
+        d2 = self.device()
+        s.add_device(d1, now=0)
+        s.add_device(d2, now=0)
+        if s.next_due() != 0:
+            raise Exception('Models not due')
+
+        # everything is due at the start, read with coalesced requests
+        if s.poll(now=0) != 2:
+            raise Exception('Devices not polled')
+        if reads != [[1, 103, 160, 160, 160]] * 2 or len(d1.requests) != 3:
+            raise Exception('Unexpected reads: %s %s' % (reads, d1.requests))
+        if s.next_due() != 1:
+            raise Exception('Unexpected next due: %s' % (s.next_due()))
+
+        # nothing due
+        del reads[:]
+        if s.poll(now=.5) != 0 or reads:
+            raise Exception('Models read before due')
+
+        # the slow model is not read with the fast ones
+        del d1.requests[:]
+        s.poll(now=1)
+        if reads[0] != [103, 160, 160, 160]:
+            raise Exception('Unexpected reads: %s' % (reads))
+        if d1.requests[0] != (40070, 125):
+            raise Exception('Unexpected requests: %s' % (d1.requests))
+
+        # a late poll records the drift and the missed intervals
+        s.poll(now=5.25)
+        sched = s.schedules[d1][103]
+        if sched.misses != 3 or sched.drift != 3.25 or sched.due != 6:
+            raise Exception('Unexpected late schedule: %s %s %s' % (sched.misses, sched.drift, sched.due))
+        if sched.max_drift != 3.25 or sched.reads != 3:
+            raise Exception('Unexpected drift stats: %s %s' % (sched.max_drift, sched.reads))
+
+        # a model due shortly joins the read of the models due now
+        del reads[:]
+        s.poll(now=9.5)
+        if reads[0] != [1, 103, 160, 160, 160]:
+            raise Exception('Early model not joined: %s' % (reads))
+        common = s.schedules[d1][1]
+        if common.due != 20 or common.drift != -.5:
+            raise Exception('Unexpected early schedule: %s %s' % (common.due, common.drift))
+
+        # failed reads are counted
+        s.remove_device(d2)
+        def timeout(addr, count, op=None):
+            raise modbus.ModbusClientTimeout('Response timeout')
+        d1.modbus_device.read = timeout
+        d1.retry_count = 0
+        s.poll(now=11)
+        if sched.failures != 1 or d1.models[103][0].status != client.READ_TIMEOUT:
+            raise Exception('Failure not recorded: %s' % (sched.failures))
+        if s.devices != [d1]:
+            raise Exception('Device not removed')
+
+    def test_poll_scheduler_run(self):
+        s = poll.PollScheduler({}, default_interval=.05, workers=4)
+        devices = [self.device() for i in range(3)]
+        for d in devices:
+            s.add_device(d)
+        s.run(duration=.3)
+        for d in devices:
+            reads = s.schedules[d][103].reads
+            if not 3 <= reads <= 8:
+                raise Exception('Unexpected reads: %s' % (reads))
+            if not d.models[103][0].status == client.READ_OK:
+                raise Exception('Model not read')
+
+    def test_poll_scheduler_device_time(self):
+        # each device read is timed from its own start
+        s = poll.PollScheduler({}, default_interval=10)
+        devices = [self.device() for i in range(2)]
+        start = time.time()
+        for d in devices:
+            s.add_device(d, now=start)
+        read = devices[0].modbus_device.read
+        def slow_read(addr, count, op=None):
+            time.sleep(.1)
+            return read(addr, count)
+        devices[0].modbus_device.read = slow_read
+        s.run(duration=.3)
+        drift = s.schedules[devices[1]][103].drift
+        if drift < .1:
+            raise Exception('Device read not timed from its start: %s' % (drift))
+
+
+if __name__ == "__main__":
+
+    unittest.main()
@@ -0,0 +1,187 @@
+
+"""
+    Copyright (C) 2018 SunSpec Alliance
+
+    Permission is hereby granted, free of charge, to any person obtaining a
+    copy of this software and associated documentation files (the "Software"),
+    to deal in the Software without restriction, including without limitation
+    the rights to use, copy, modify, merge, publish, distribute, sublicense,
+    and/or sell copies of the Software, and to permit persons to whom the
+    Software is furnished to do so, subject to the following conditions:
+
+    The above copyright notice and this permission notice shall be included
+    in all copies or substantial portions of the Software.
+
+    THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+    IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+    FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+    THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+    LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+    FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS
+    IN THE SOFTWARE.
+"""
+
+import os
+import unittest
+
+import sunspec.core.client as client
+import sunspec.core.device as device
+import sunspec.core.retry as retry
+import sunspec.core.util as util
+import sunspec.core.modbus.client as modbus
+import sunspec.core.modbus.mbmap as mbmap
+import sunspec.core.test.fake.server as server
+
+
+class Flaky(object):
+    """Request function failing with a sequence of exceptions."""
+
+    def __init__(self, errors, result=b'\0\0'):
+        self.errors = list(errors)
+        self.result = result
+        self.calls = 0
+
+    def __call__(self, *args):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.result
+
+
+class TestRetry(unittest.TestCase):
+    def setUp(self):
+        path = os.path.abspath(__file__)
+        self.pathlist = util.PathList(['.',
+                                       os.path.join(os.path.dirname(path),
+                                                    'devices')])
+
+        device.check_for_models(pathlist=self.pathlist)
+
+    def test_retry_policy(self):
+        policy = retry.RetryPolicy(attempts=3, backoff=0)
+        busy = modbus.ModbusClientException('Modbus exception 6', modbus.EXCEPT_DEVICE_BUSY)
+        illegal = modbus.ModbusClientException('Modbus exception 2', modbus.EXCEPT_ILLEGAL_ADDRESS)
+
+        # timeouts and busy responses are retried
+        f = Flaky([modbus.ModbusClientTimeout('Response timeout'), busy])
+        if policy.call(f) != b'\0\0' or f.calls != 3:
+            raise Exception('Request not retried: %s' % (f.calls))
+
+        # other exception responses are not
+        f = Flaky([illegal])
+        with self.assertRaises(modbus.ModbusClientException):
+            policy.call(f)
+        if f.calls != 1:
+            raise Exception('Illegal address retried')
+
+        # attempts exhausted
+        f = Flaky([busy] * 5)
+        with self.assertRaises(modbus.ModbusClientException):
+            policy.call(f)
+        if f.calls != 3:
+            raise Exception('Unexpected attempts: %s' % (f.calls))
+
+        # attempts default to the device retry count
+        f = Flaky([busy] * 5)
+        with self.assertRaises(modbus.ModbusClientException):
+            retry.RetryPolicy(backoff=0).call(f, retries=1)
+        if f.calls != 2:
+            raise Exception('Unexpected attempts: %s' % (f.calls))
+
+        # exponential backoff with jitter
+        policy = retry.RetryPolicy(backoff=.1, backoff_max=.3, jitter=.5)
+        for attempt, delay in ((1, .1), (2, .2), (3, .3), (6, .3)):
+            for i in range(20):
+                d = policy.delay(attempt)
+                if not delay * .5 <= d <= delay * 1.5:
+                    raise Exception('Delay out of range: %s %s' % (attempt, d))
+        if retry.RetryPolicy(backoff=.1, jitter=0).delay(3) != .4:
+            raise Exception('Delay without jitter mismatch')
+
+    def test_circuit_breaker(self):
+        policy = retry.RetryPolicy(attempts=2, backoff=0, breaker_failures=2, breaker_cooldown=60)
+        breaker = policy.breaker()
+        timeout = modbus.ModbusClientTimeout('Response timeout')
+
+        for i in range(2):
+            with self.assertRaises(modbus.ModbusClientTimeout):
+                policy.call(Flaky([timeout] * 2), breaker=breaker)
+        if breaker.state != retry.BREAKER_OPEN:
+            raise Exception('Breaker not open: %s' % (breaker.state))
+
+        # requests fail without being sent while the breaker is open
+        f = Flaky([])
+        with self.assertRaises(retry.CircuitOpenError):
+            policy.call(f, breaker=breaker)
+        if f.calls != 0:
+            raise Exception('Request sent with open breaker')
+
+        # a successful trial after the cooldown closes the breaker
+        breaker.opened -= 60
+        if breaker.state != retry.BREAKER_HALF_OPEN:
+            raise Exception('Breaker not half open: %s' % (breaker.state))
+        policy.call(f, breaker=breaker)
+        if breaker.state != retry.BREAKER_CLOSED or f.calls != 1:
+            raise Exception('Breaker not closed: %s' % (breaker.state))
+
+        # a failed trial opens it again, exception responses count as success
+        breaker.failure()
+        breaker.failure()
+        breaker.opened -= 60
+        with self.assertRaises(modbus.ModbusClientTimeout):
+            policy.call(Flaky([timeout] * 2), breaker=breaker)
+        if breaker.state != retry.BREAKER_OPEN:
+            raise Exception('Breaker not reopened: %s' % (breaker.state))
+        breaker.opened -= 60
+        with self.assertRaises(modbus.ModbusClientException):
+            policy.call(Flaky([modbus.ModbusClientException('Modbus exception 2', 2)]), breaker=breaker)
+        if breaker.state != retry.BREAKER_CLOSED:
+            raise Exception('Breaker not closed by exception response: %s' % (breaker.state))
+
+        if retry.RetryPolicy().breaker() is not None:
+            raise Exception('Breaker enabled by default')
+
+    def test_client_device_retry(self):
+        m = mbmap.ModbusMap(1)
+        m.from_xml('mbmap_test_inverter_3.xml', self.pathlist)
+        s = server.ModbusTCPServer({1: m}).start()
+        self.addCleanup(s.stop)
+
+        # without a retry policy each request is sent once
+        d = client.ClientDevice(client.TCP, slave_id=1, ipaddr=s.ipaddr, ipport=s.ipport)
+        s.except_code = modbus.EXCEPT_DEVICE_BUSY
+        with self.assertRaises(client.SunSpecClientError):
+            d.read(40000, 2)
+        if len(s.requests) != 1:
+            raise Exception('Request retried without a retry policy: %s' % (s.requests))
+        del s.requests[:]
+
+        # busy responses are retried retry_count times
+        d.retry_policy = retry.RetryPolicy(backoff=0)
+        d.retry_count = 3
+        s.except_code = modbus.EXCEPT_DEVICE_BUSY
+        with self.assertRaises(client.SunSpecClientError):
+            d.read(40000, 2)
+        if len(s.requests) != 4:
+            raise Exception('Unexpected requests: %s' % (s.requests))
+        s.except_code = None
+        if d.read(40000, 2) != b'SunS':
+            raise Exception('Read mismatch')
+
+        # a dead device is skipped once its breaker opens
+        d.retry_policy = retry.RetryPolicy(attempts=1, breaker_failures=2)
+        d.breaker = None
+        f = Flaky([modbus.ModbusClientTimeout('Response timeout')] * 5)
+        d.modbus_device.read = f
+        for i in range(4):
+            with self.assertRaises(client.SunSpecClientError):
+                d.read(40000, 2)
+        if f.calls != 2 or d.breaker.state != retry.BREAKER_OPEN:
+            raise Exception('Breaker not open: %s %s' % (f.calls, d.breaker.state))
+
+        d.close()
+
+
+if __name__ == "__main__":
+
+    unittest.main()